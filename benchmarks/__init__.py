@@ -0,0 +1,3 @@
+"""
+Offline benchmarks, run them from project root, i.e. 'python -m benchmarks.bench_vector_index'.
+"""
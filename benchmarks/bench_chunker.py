@@ -0,0 +1,98 @@
+"""
+Throughput of the native chunker, compared with langchain 'RecursiveCharacterTextSplitter'.
+
+Usage:
+    python -m benchmarks.bench_chunker --megabytes 20
+    python -m benchmarks.bench_chunker --file doc/large.pdf --chunk-size 500 --chunk-overlap 50
+
+Prints one JSON object per chunker. 'boundary_agreement' is the fraction of chunk ends
+also ending a chunk of the other chunker.
+"""
+import sys
+import json
+import time
+import argparse
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+from doc_parser.text_chunker import TextChunker
+from benchmarks.fixtures import CJK_SENTENCES, LATIN_WORDS
+
+def synthetic_segments(megabytes: float, seed: int) -> List[str]:
+    # Pages of mixed Traditional Chinese and English paragraphs, with line breaks inside paragraphs as in PDFs.
+    rng = np.random.default_rng(seed)
+    pages, size = [], 0
+    while size < megabytes * 1024 * 1024:
+        paragraphs = []
+        for _ in range(rng.integers(2, 6)):
+            if rng.random() < 0.5:
+                sentences = [" ".join(rng.choice(LATIN_WORDS, rng.integers(5, 15))).capitalize() + "."
+                             for _ in range(rng.integers(2, 6))]
+                lines = [" ".join(sentences[i:i + 2]) for i in range(0, len(sentences), 2)]
+            else:
+                lines = ["".join(rng.choice(CJK_SENTENCES, rng.integers(1, 4))) for _ in range(rng.integers(1, 4))]
+            paragraphs.append("\n".join(lines))
+        page = "\n\n".join(paragraphs)
+        pages.append(page)
+        size += len(page.encode("utf-8"))
+    return pages
+
+def native_chunks(segments: Iterable[str], chunk_size: int, chunk_overlap: int) -> List[Tuple[int, str]]:
+    return list(TextChunker(chunk_size, chunk_overlap).iter_spans(segments))
+
+def recursive_chunks(segments: Iterable[str], chunk_size: int, chunk_overlap: int) -> List[Tuple[int, str]]:
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True)
+    return [(d.metadata["start_index"], d.page_content) for d in splitter.create_documents(["\n".join(segments)])]
+
+def report(name: str, chunks: List[Tuple[int, str]], seconds: float, text_bytes: int, chunk_size: int, other_ends: set) -> dict:
+    lengths = np.array([len(text) for _, text in chunks])
+    ends = {start + len(text) for start, text in chunks}
+    return {
+        "chunker": name,
+        "chunks": len(chunks),
+        "seconds": round(seconds, 3),
+        "chunks_per_second": round(len(chunks) / seconds, 1) if seconds else 0.0,
+        "megabytes_per_second": round(text_bytes / 1024 / 1024 / seconds, 2) if seconds else 0.0,
+        "mean_length": round(float(lengths.mean()), 1) if len(lengths) else 0.0,
+        "oversized": int((lengths > chunk_size).sum()),
+        "boundary_agreement": round(len(ends & other_ends) / len(ends), 3) if ends and other_ends else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark native chunker against RecursiveCharacterTextSplitter.")
+    parser.add_argument("--file", help="Document to chunk, synthetic text is used if not given")
+    parser.add_argument("--megabytes", type=float, default=10, help="Size of synthetic text")
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--chunk-overlap", type=int, default=25)
+    parser.add_argument("--no-reference", action="store_true", help="Skip RecursiveCharacterTextSplitter")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.file:
+        from doc_parser import create_paeser
+        segments = list(create_paeser(args.file).iter_raw_text())
+    else:
+        segments = synthetic_segments(args.megabytes, args.seed)
+    text_bytes = sum(len(s.encode("utf-8")) for s in segments)
+
+    start = time.perf_counter()
+    native = native_chunks(segments, args.chunk_size, args.chunk_overlap)
+    native_seconds = time.perf_counter() - start
+
+    reference, reference_seconds = [], 0.0
+    if not args.no_reference:
+        start = time.perf_counter()
+        reference = recursive_chunks(segments, args.chunk_size, args.chunk_overlap)
+        reference_seconds = time.perf_counter() - start
+
+    native_ends = {s + len(t) for s, t in native}
+    reference_ends = {s + len(t) for s, t in reference}
+    print(json.dumps(report("native", native, native_seconds, text_bytes, args.chunk_size, reference_ends)))
+    if reference:
+        print(json.dumps(report("recursive", reference, reference_seconds, text_bytes, args.chunk_size, native_ends)))
+    sys.stdout.flush()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Cold-start load time and memory of a shared corpus snapshot, memory-mapped against fully read.
+
+Usage:
+    python -m benchmarks.bench_index_load --num-chunks 100000 --dim 1024
+    python -m benchmarks.bench_index_load --snapshot corpus-index/<snapshot>
+
+Each mode is loaded in a fresh process. 'anon_mb' is the memory private to that process,
+mapped file pages are shared by all processes and counted in 'rss_mb' only.
+Prints one JSON object per mode.
+"""
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+import numpy as np
+
+MODES = ["mmap", "copy"]
+
+def memory_mb() -> dict:
+    # Linux only, resident and anonymous memory of this process.
+    usage = {}
+    with open("/proc/self/smaps_rollup", "r", encoding="utf-8") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if name in ("Rss", "Anonymous"):
+                usage[name] = int(value.split()[0]) / 1024
+    return {"rss_mb": round(usage["Rss"], 1), "anon_mb": round(usage["Anonymous"], 1)}
+
+def write_synthetic_snapshot(folder: Path, num_chunks: int, dim: int, chunk_chars: int, vector_dtype: str, seed: int) -> None:
+    import faiss
+    from langchain_core.documents.base import Document
+    from mmap_store import write_chunks
+    from shared_corpus import INDEX_FILE, MANIFEST_FILE
+    from vector_index import create_faiss_index
+    from webui_config import VectorIndexConfig
+
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((num_chunks, dim), dtype=np.float32)
+    faiss.write_index(create_faiss_index(vectors, VectorIndexConfig(index_type="flat", vector_dtype=vector_dtype)), str(folder / INDEX_FILE))
+
+    words = ["regulation", "form", "A-123", "申請", "書類", "規程", "approval", "budget"]
+    documents = [Document(page_content=" ".join(rng.choice(words, chunk_chars // 8)),
+                          metadata={"source": f"corpus/doc-{i // 100}.pdf", "page": i % 100 + 1, "start_index": 0})
+                 for i in range(num_chunks)]
+    write_chunks(folder, documents)
+    (folder / MANIFEST_FILE).write_text(json.dumps({"documents": {}, "num_chunks": num_chunks}), encoding="utf-8")
+
+def load(snapshot: Path, mode: str, num_queries: int) -> dict:
+    # Imports are done before measuring, only the load itself is timed.
+    import faiss
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from mmap_store import MmapChunks
+    from shared_corpus import INDEX_FILE, SharedCorpus
+
+    before = memory_mb()
+    start = time.perf_counter()
+    if mode == "mmap":
+        corpus = SharedCorpus(snapshot.parent, snapshot.name, embeddings=None)
+        index, docstore = corpus.db.index, corpus.db.docstore
+    else: # Every process holds its own index and chunk objects.
+        index = faiss.read_index(str(snapshot / INDEX_FILE))
+        docstore = InMemoryDocstore({str(i): d for i, d in enumerate(MmapChunks(snapshot))})
+    load_time = time.perf_counter() - start
+    after_load = memory_mb()
+
+    # A few searches, reading top-k chunks as a chat request does.
+    rng = np.random.default_rng(0)
+    for q in rng.standard_normal((num_queries, index.d), dtype=np.float32):
+        _, positions = index.search(q[None, :], 5)
+        _ = [docstore.search(str(i)).page_content for i in positions[0]]
+    after_queries = memory_mb()
+
+    return {
+        "mode": mode,
+        "num_chunks": index.ntotal,
+        "load_seconds": round(load_time, 4),
+        "rss_mb_loaded": round(after_load["rss_mb"] - before["rss_mb"], 1),
+        "anon_mb_loaded": round(after_load["anon_mb"] - before["anon_mb"], 1),
+        "rss_mb_after_queries": round(after_queries["rss_mb"] - before["rss_mb"], 1),
+        "anon_mb_after_queries": round(after_queries["anon_mb"] - before["anon_mb"], 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark snapshot loading, memory-mapped against fully read.")
+    parser.add_argument("--snapshot", help="Snapshot folder, a synthetic one is written if not given")
+    parser.add_argument("--num-chunks", type=int, default=100000, help="Number of synthetic chunks")
+    parser.add_argument("--dim", type=int, default=1024, help="Dimension of synthetic vectors")
+    parser.add_argument("--chunk-chars", type=int, default=400, help="Approximate length of synthetic chunk texts")
+    parser.add_argument("--vector-dtype", choices=["float32", "float16"], default="float32")
+    parser.add_argument("--num-queries", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)  # Internal, load in this process.
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(load(Path(args.snapshot), args.mode, args.num_queries)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot = Path(args.snapshot) if args.snapshot else Path(tmp) / "snapshot-0"
+        if not args.snapshot:
+            snapshot.mkdir()
+            write_synthetic_snapshot(snapshot, args.num_chunks, args.dim, args.chunk_chars, args.vector_dtype, args.seed)
+
+        for mode in MODES:
+            subprocess.run([sys.executable, "-m", "benchmarks.bench_index_load", "--snapshot", str(snapshot),
+                            "--mode", mode, "--num-queries", str(args.num_queries)], check=True)
+            sys.stdout.flush()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Concurrent chat sessions against local mock TEI and TGI servers, to size one frontend and one GPU.
+
+Usage:
+    python -m benchmarks.bench_load --sessions 1 4 8 16 32
+    python -m benchmarks.bench_load --sessions 16 --tokens-per-second 20 --tgi-max-concurrent-requests 2
+
+Each simulated session uploads a document and asks '--turns' questions, going through
+'topk_documents', 'craft_prompt' and 'llm_stream_result' as the web UI does, one thread per session
+as Streamlit runs them. 'ttft' is measured from the question to the first token, 'llm_ttft' from the
+generation call (admission queue included). 'overload_retries' are retries of the client on 429,
+'tgi_rejected' the 429 responses of the mock, which happen when '--client-limit' exceeds the mock limit,
+i.e. several frontends sharing one TGI. With '--tgi-replicas', requests are routed over several mock TGIs
+serving one model.
+Prints one JSON object per number of sessions, also appended to '--output' if given.
+"""
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from typing import List, Sequence
+
+import numpy as np
+
+import metrics
+from benchmarks.fixtures import LATIN_WORDS, write_fixture
+from benchmarks.mock_servers import MockTeiConfig, MockTeiServer, MockTgiConfig, MockTgiServer
+from document_rag_processor import RagParameters, SessionVectorStore, topk_documents
+from embedding_client import TeiEmbeddings
+from llm_connector import LlmGenerationParameters, close_llm_routers, craft_prompt, llm_stream_result, prompt_token_budget
+from webui_config import EmbeddingModelConfig, LlmModelConfig
+
+class RequestResult:
+    def __init__(self) -> None:
+        self.retrieval = None  # Seconds, each timing stays None if the stage was not reached.
+        self.ttft = None
+        self.llm_ttft = None
+        self.total = None
+        self.tokens = 0
+        self.error = None
+
+def run_session(session_id: str, document: Path, turns: int, think_time: float, start_delay: float,
+                embedding_config: EmbeddingModelConfig, embeddings: TeiEmbeddings, llm_configs: Sequence[LlmModelConfig],
+                rag_param: RagParameters, llm_param: LlmGenerationParameters, seed: int, results: List[RequestResult]) -> None:
+    rng = np.random.default_rng(seed)
+    time.sleep(start_delay)
+    vector_store = SessionVectorStore(embedding_config, rag_param.chunk_size, rag_param.chunk_overlap, embeddings=embeddings)
+    llm_config = llm_configs[0]
+    token_budget = prompt_token_budget(llm_config, llm_param.max_new_tokens)
+
+    for turn in range(turns):
+        if turn:
+            time.sleep(rng.exponential(think_time) if think_time else 0)
+        result = RequestResult()
+        results.append(result)
+        question = " ".join(rng.choice(LATIN_WORDS, rng.integers(3, 8))) + "?"
+        start = time.perf_counter()
+        try:
+            docs_score = topk_documents(question, embedding_config, rag_param, [document], vector_store=vector_store)
+            result.retrieval = time.perf_counter() - start
+            prompt = craft_prompt(question, [d for d, _ in docs_score], token_budget=token_budget, tokenizer=llm_config.tokenizer).text
+
+            generation_start = time.perf_counter()
+            for _ in llm_stream_result(prompt, llm_configs, llm_param, session_id=session_id):
+                if result.tokens == 0:
+                    now = time.perf_counter()
+                    result.ttft = now - start
+                    result.llm_ttft = now - generation_start
+                result.tokens += 1
+            result.total = time.perf_counter() - start
+        except Exception as ex:
+            result.error = f"{type(ex).__name__}: {ex}"
+
+def percentiles(values: list, prefix: str) -> dict:
+    values = [v for v in values if v is not None]
+    if not values:
+        return {f"{prefix}_p{q}": None for q in (50, 95, 99)}
+    return {f"{prefix}_p{q}": round(float(np.percentile(values, q)), 4) for q in (50, 95, 99)}
+
+def run_load(sessions: int, args, document: Path) -> dict:
+    tei = MockTeiServer(MockTeiConfig(latency=args.embed_latency, max_batch_size=args.embed_batch_size)).start()
+    tgi_config = MockTgiConfig(first_token_latency=args.first_token_latency, tokens_per_second=args.tokens_per_second,
+                               response_tokens=args.response_tokens, max_concurrent_requests=args.tgi_max_concurrent_requests)
+    tgis = [MockTgiServer(tgi_config).start() for _ in range(args.tgi_replicas)]
+    try:
+        embedding_config = EmbeddingModelConfig(provider="huggingface", endpoint=tei.url, batch_size=args.embed_batch_size)
+        llm_configs = [LlmModelConfig(provider="huggingface", endpoint=tgi.url, max_concurrent_requests=args.client_limit, model="mock")
+                       for tgi in tgis]
+        embeddings = TeiEmbeddings(embedding_config)  # Shared by sessions, as in the web UI.
+        rag_param = RagParameters.new_rag_parameter(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap, top_k=args.top_k)
+        llm_param = LlmGenerationParameters.new_generation_parameter(max_new_tokens=args.response_tokens)
+
+        retries_before = metrics.LLM_OVERLOAD_RETRIES.total()
+        results: List[RequestResult] = []
+        threads = [threading.Thread(target=run_session, args=(f"session-{i}", document, args.turns, args.think_time,
+                                                              args.ramp_up * i / sessions, embedding_config, embeddings,
+                                                              llm_configs, rag_param, llm_param, args.seed + i, results))
+                   for i in range(sessions)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+
+        completed = [r for r in results if r.error is None]
+        errors = [r.error for r in results if r.error is not None]
+        return {
+            "benchmark": "load",
+            "sessions": sessions,
+            "requests": len(results),
+            "completed": len(completed),
+            "errors": len(errors),
+            "first_error": errors[0] if errors else None,
+            "wall_seconds": round(wall, 3),
+            "requests_per_second": round(len(completed) / wall, 3),
+            "tokens_per_second": round(sum(r.tokens for r in completed) / wall, 1),
+            **percentiles([r.ttft for r in results], "ttft"),
+            **percentiles([r.llm_ttft for r in results], "llm_ttft"),
+            **percentiles([r.retrieval for r in results], "retrieval"),
+            **percentiles([r.total for r in completed], "total"),
+            "overload_retries": int(metrics.LLM_OVERLOAD_RETRIES.total() - retries_before),
+            "tgi_replicas": len(tgis),
+            "tgi_rejected": sum(tgi.stats.rejected for tgi in tgis),
+            "tgi_max_in_flight": max(tgi.stats.max_in_flight for tgi in tgis),
+            "tei_requests": tei.stats.requests,
+            "tei_rejected": tei.stats.rejected,
+        }
+    finally:
+        close_llm_routers()  # Routers of this run would keep checking the stopped mock servers.
+        tei.stop()
+        for tgi in tgis:
+            tgi.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the chat pipeline with mock TEI and TGI servers.")
+    parser.add_argument("--sessions", nargs="+", type=int, default=[1, 4, 8, 16], help="Numbers of concurrent sessions to run")
+    parser.add_argument("--turns", type=int, default=3, help="Questions per session")
+    parser.add_argument("--think-time", type=float, default=2.0, help="Mean seconds between questions of a session")
+    parser.add_argument("--ramp-up", type=float, default=2.0, help="Seconds over which sessions start")
+    parser.add_argument("--text-chars", type=int, default=50000, help="Text size of the uploaded document")
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--chunk-overlap", type=int, default=25)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--embed-latency", type=float, default=MockTeiConfig().latency)
+    parser.add_argument("--embed-batch-size", type=int, default=MockTeiConfig().max_batch_size)
+    parser.add_argument("--first-token-latency", type=float, default=MockTgiConfig().first_token_latency)
+    parser.add_argument("--tokens-per-second", type=float, default=MockTgiConfig().tokens_per_second)
+    parser.add_argument("--response-tokens", type=int, default=MockTgiConfig().response_tokens)
+    parser.add_argument("--tgi-max-concurrent-requests", type=int, default=MockTgiConfig().max_concurrent_requests)
+    parser.add_argument("--tgi-replicas", type=int, default=1, help="Mock TGI servers serving the model")
+    parser.add_argument("--client-limit", type=int, default=MockTgiConfig().max_concurrent_requests,
+                        help="Admission limit of this frontend, 'max_concurrent_requests' of config")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Append results to this JSON lines file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        document = write_fixture(Path(tmp), ".docx", args.text_chars, args.seed)
+        for sessions in args.sessions:
+            line = json.dumps(run_load(sessions, args, document))
+            print(line)
+            sys.stdout.flush()
+            if args.output:
+                with open(args.output, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+
+if __name__ == "__main__":
+    main()
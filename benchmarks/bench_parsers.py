@@ -0,0 +1,101 @@
+"""
+Extraction throughput, chunking throughput and peak memory of each parser, on synthetic documents.
+
+Usage:
+    python -m benchmarks.bench_parsers --text-chars 2000000
+    python -m benchmarks.bench_parsers --formats .pdf .docx --output parsers.jsonl
+
+Fixtures are generated from '--seed', so runs with the same arguments parse the same content.
+Each format is measured in a fresh process, 'peak_rss_mb' is the growth of its peak resident memory
+while extracting and chunking, C allocations (lxml, PyPDF2) included. Timings are the best of '--repeat'.
+Prints one JSON object per format, also appended to '--output' if given.
+"""
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+from pathlib import Path
+
+from benchmarks.fixtures import FORMATS, write_fixture
+
+def peak_rss_mb() -> float:
+    # Linux reports kilobytes.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def best_of(repeat: int, fn):
+    # Fastest run and its result, the others include noise of the machine.
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best, result
+
+def measure(path: Path, chunk_size: int, chunk_overlap: int, repeat: int) -> dict:
+    from doc_parser import create_paeser
+    parser_class = type(create_paeser(path))
+    import_peak = peak_rss_mb()  # Parser module is imported, only the work itself is measured.
+
+    extract_seconds, segments = best_of(repeat, lambda: list(create_paeser(path).iter_raw_text()))
+    text_chars = sum(len(s) for s in segments)
+    text_bytes = sum(len(s.encode("utf-8")) for s in segments)
+    del segments
+
+    parse_seconds, chunks = best_of(repeat, lambda: create_paeser(path).parse(chunk_size, chunk_overlap))
+
+    return {
+        "benchmark": "parser",
+        "format": path.suffix,
+        "parser": f"{parser_class.__name__}-{parser_class.version}",
+        "file_bytes": path.stat().st_size,
+        "text_chars": text_chars,
+        "extract_seconds": round(extract_seconds, 4),
+        "extract_mb_per_second": round(text_bytes / 1024 / 1024 / extract_seconds, 2) if extract_seconds else 0.0,
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "chunks": len(chunks),
+        "parse_seconds": round(parse_seconds, 4),
+        "chunks_per_second": round(len(chunks) / parse_seconds, 1) if parse_seconds else 0.0,
+        "peak_rss_mb": round(peak_rss_mb() - import_peak, 1),
+        "python": platform.python_version(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark document parsers on synthetic fixtures.")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=FORMATS)
+    parser.add_argument("--text-chars", type=int, default=1000000, help="Text size of each fixture, in characters")
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--chunk-overlap", type=int, default=25)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fixtures-dir", help="Keep fixtures in this folder, a temporary one is used if not given")
+    parser.add_argument("--output", help="Append results to this JSON lines file")
+    parser.add_argument("--fixture", help=argparse.SUPPRESS)  # Internal, measure this file in this process.
+    args = parser.parse_args()
+
+    if args.fixture:
+        print(json.dumps(measure(Path(args.fixture), args.chunk_size, args.chunk_overlap, args.repeat)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = Path(args.fixtures_dir or tmp)
+        folder.mkdir(parents=True, exist_ok=True)
+        for suffix in args.formats:
+            fixture = write_fixture(folder, suffix, args.text_chars, args.seed)
+            result = subprocess.run([sys.executable, "-m", "benchmarks.bench_parsers", "--fixture", str(fixture),
+                                     "--chunk-size", str(args.chunk_size), "--chunk-overlap", str(args.chunk_overlap),
+                                     "--repeat", str(args.repeat)], check=True, capture_output=True, text=True)
+            line = result.stdout.strip().splitlines()[-1]
+            print(line)
+            sys.stdout.flush()
+            if args.output:
+                with open(args.output, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Vector store build and query time over chunks of synthetic documents, no embedding server needed.
+
+Usage:
+    python -m benchmarks.bench_retrieval --text-chars 2000000
+    python -m benchmarks.bench_retrieval --types flat hnsw --output retrieval.jsonl
+
+Documents of every format are generated and parsed, then embedded with 'HashEmbeddings',
+a deterministic feature-hashing embedding, so results only depend on the arguments.
+Build time covers 'build_vector_store' (index and chunk store) and the BM25 index,
+query time covers a dense search and a hybrid search through the same code as chat requests.
+Prints one JSON object per index type, also appended to '--output' if given.
+"""
+import sys
+import json
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.fake_embeddings import HashEmbeddings
+from benchmarks.fixtures import FORMATS, LATIN_WORDS, write_fixture
+from document_rag_processor import build_vector_store, hybrid_search
+from lexical_index import BM25Index
+from vector_index import INDEX_TYPES
+from webui_config import VectorIndexConfig
+from doc_parser import parse_many
+
+def percentile_ms(latencies: list, q: float) -> float:
+    return round(float(np.percentile(np.array(latencies) * 1000, q)), 4)
+
+def bench_index_type(index_type: str, chunks: list, vectors: np.ndarray, embeddings: HashEmbeddings, queries: list, k: int, vector_dtype: str) -> dict:
+    ids = [str(i) for i in range(len(chunks))]
+    start = time.perf_counter()
+    db = build_vector_store(chunks, vectors, embeddings, ids, VectorIndexConfig(index_type=index_type, vector_dtype=vector_dtype))
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    lexical_index = BM25Index()
+    lexical_index.add_many(zip(ids, [d.page_content for d in chunks]))
+    lexical_seconds = time.perf_counter() - start
+
+    dense, hybrid = [], []
+    for query in queries:
+        start = time.perf_counter()
+        db.similarity_search_with_score(query, k=k)
+        dense.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        hybrid_search(db, lexical_index, embeddings, query, k)
+        hybrid.append(time.perf_counter() - start)
+
+    return {
+        "benchmark": "retrieval",
+        "index_type": index_type,
+        "vector_dtype": vector_dtype,
+        "num_chunks": len(chunks),
+        "dim": vectors.shape[1],
+        "k": k,
+        "build_seconds": round(build_seconds, 4),
+        "bm25_build_seconds": round(lexical_seconds, 4),
+        "dense_query_ms_p50": percentile_ms(dense, 50),
+        "dense_query_ms_p95": percentile_ms(dense, 95),
+        "hybrid_query_ms_p50": percentile_ms(hybrid, 50),
+        "hybrid_query_ms_p95": percentile_ms(hybrid, 95),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vector store build and query with a fake embedding.")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=FORMATS)
+    parser.add_argument("--text-chars", type=int, default=500000, help="Text size of each fixture, in characters")
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--chunk-overlap", type=int, default=25)
+    parser.add_argument("--dim", type=int, default=384, help="Dimension of fake embeddings")
+    parser.add_argument("--types", nargs="+", choices=INDEX_TYPES, default=INDEX_TYPES, help="Index types to benchmark")
+    parser.add_argument("--vector-dtype", choices=["float32", "float16"], default="float32")
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fixtures-dir", help="Keep fixtures in this folder, a temporary one is used if not given")
+    parser.add_argument("--output", help="Append results to this JSON lines file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = Path(args.fixtures_dir or tmp)
+        folder.mkdir(parents=True, exist_ok=True)
+        paths = [write_fixture(folder, suffix, args.text_chars, args.seed) for suffix in args.formats]
+        chunks = parse_many(paths, args.chunk_size, args.chunk_overlap, workers=1)
+
+    embeddings = HashEmbeddings(args.dim)
+    start = time.perf_counter()
+    vectors = embeddings.embed_matrix([d.page_content for d in chunks])
+    embed_seconds = time.perf_counter() - start
+
+    # Queries mix identifiers and plain words, as users ask for form numbers as well as topics.
+    rng = np.random.default_rng(args.seed + 1)
+    queries = [" ".join(rng.choice(LATIN_WORDS, rng.integers(2, 6))) for _ in range(args.num_queries)]
+
+    for index_type in args.types:
+        report = bench_index_type(index_type, chunks, vectors, embeddings, queries, args.k, args.vector_dtype)
+        report["fake_embed_seconds"] = round(embed_seconds, 4)
+        line = json.dumps(report)
+        print(line)
+        sys.stdout.flush()
+        if args.output:
+            with open(args.output, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Import time of the web UI, and check that heavy dependencies are not loaded at startup.
+
+Usage:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --budget-ms 300 --top 20
+
+'webui' is imported in a fresh process, after streamlit which is loaded anyway by the server.
+Exits with status 1 if the import takes longer than the budget, or loads any module of
+'HEAVY_MODULES', those are expected on the first request needing them only.
+Prints one JSON object.
+"""
+import sys
+import json
+import argparse
+import subprocess
+
+IMPORT_BUDGET_MS = 500
+
+HEAVY_MODULES = ["faiss", "numpy", "langchain", "langchain_core", "langchain_community", "text_generation",
+                 "tiktoken", "transformers", "PyPDF2", "openpyxl", "pptx", "odf", "sqlalchemy", "aiohttp", "requests"]
+
+# Run in the child process, imports streamlit first so that only the UI's own cost is measured.
+CHILD_SCRIPT = """
+import sys, json, time
+import streamlit, streamlit_feedback
+before = set(sys.modules)
+start = time.perf_counter()
+import webui
+elapsed = time.perf_counter() - start
+print(json.dumps({"import_ms": elapsed * 1000, "loaded": sorted(set(sys.modules) - before)}))
+"""
+
+def parse_importtime(stderr: str) -> list:
+    # Lines of '-X importtime': "import time: self [us] | cumulative | imported package".
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark web UI import time.")
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS, help="Maximum import time of 'webui'")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest modules to list")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of fresh processes, the fastest is kept")
+    args = parser.parse_args()
+
+    runs = []
+    for _ in range(args.repeat):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD_SCRIPT],
+                                capture_output=True, text=True, check=True)
+        runs.append((json.loads(result.stdout.strip().splitlines()[-1]), result.stderr))
+    # Fastest run, the others include noise of the machine. '-X importtime' adds a small overhead.
+    child, stderr = min(runs, key=lambda x: x[0]["import_ms"])
+
+    loaded = set(child["loaded"])
+    timings = [x for x in parse_importtime(stderr) if x[0].split(".")[0] in {m.split(".")[0] for m in loaded}]
+    slowest = sorted(timings, key=lambda x: x[1], reverse=True)[:args.top]
+    heavy = sorted(m for m in HEAVY_MODULES if m in loaded)
+
+    report = {
+        "import_ms": round(child["import_ms"], 1),
+        "budget_ms": args.budget_ms,
+        "modules_loaded": len(loaded),
+        "heavy_modules_loaded": heavy,
+        "slowest_modules": [{"module": name, "self_ms": round(self_us / 1000, 1), "cumulative_ms": round(cumulative_us / 1000, 1)}
+                            for name, self_us, cumulative_us in slowest],
+    }
+    print(json.dumps(report, ensure_ascii=False))
+    sys.stdout.flush()
+    if heavy or child["import_ms"] > args.budget_ms:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Recall and latency of approximate vector indexes against the flat (exact) baseline.
+
+Usage:
+    python -m benchmarks.bench_vector_index --num-vectors 200000 --dim 1024
+    python -m benchmarks.bench_vector_index --vectors doc/.index/<entry>/vectors.npy
+
+Prints one JSON object per index type.
+"""
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+from webui_config import VectorIndexConfig
+from vector_index import INDEX_TYPES, create_faiss_index
+
+def synthetic_vectors(num_vectors: int, dim: int, seed: int) -> np.ndarray:
+    # Clustered data resembles embeddings better than uniform noise.
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, num_vectors // 100), dim), dtype=np.float32)
+    vectors = centers[rng.integers(0, len(centers), num_vectors)]
+    vectors += 0.3 * rng.standard_normal((num_vectors, dim), dtype=np.float32)
+    return vectors
+
+def recall_at_k(result: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    hits = sum(len(set(r[r != -1]) & set(t)) for r, t in zip(result, truth))
+    return hits / (len(truth) * k)
+
+def bench_index(index_type: str, vectors: np.ndarray, queries: np.ndarray, k: int, index_config: VectorIndexConfig, truth=None) -> dict:
+    start = time.perf_counter()
+    index = create_faiss_index(vectors, index_config, index_type=index_type)
+    build_time = time.perf_counter() - start
+
+    # Single-query latency, as in a chat request.
+    latencies = []
+    results = []
+    for q in queries:
+        start = time.perf_counter()
+        _, ids = index.search(q[None, :], k)
+        latencies.append(time.perf_counter() - start)
+        results.append(ids[0])
+    results = np.array(results)
+    latencies = np.array(latencies) * 1000
+
+    return {
+        "index_type": index_type,
+        "num_vectors": len(vectors),
+        "dim": vectors.shape[1],
+        "k": k,
+        "build_seconds": round(build_time, 4),
+        "query_ms_p50": round(float(np.percentile(latencies, 50)), 4),
+        "query_ms_p95": round(float(np.percentile(latencies, 95)), 4),
+        "recall_at_k": 1.0 if truth is None else round(recall_at_k(results, truth), 4),
+    }, results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vector index types against flat index.")
+    parser.add_argument("--vectors", help="Path to a float32 .npy matrix, synthetic vectors are used if not given")
+    parser.add_argument("--num-vectors", type=int, default=100000, help="Number of synthetic vectors")
+    parser.add_argument("--dim", type=int, default=1024, help="Dimension of synthetic vectors (multilingual-e5-large: 1024)")
+    parser.add_argument("--num-queries", type=int, default=200, help="Number of queries, sampled from vectors with noise")
+    parser.add_argument("--k", type=int, default=10, help="Top-k of each query")
+    parser.add_argument("--types", nargs="+", choices=INDEX_TYPES, default=INDEX_TYPES, help="Index types to benchmark")
+    parser.add_argument("--nprobe", type=int, default=VectorIndexConfig().nprobe)
+    parser.add_argument("--ef-search", type=int, default=VectorIndexConfig().ef_search)
+    parser.add_argument("--vector-dtype", choices=["float32", "float16"], default="float32", help="Precision of stored vectors")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.vectors:
+        vectors = np.load(args.vectors).astype(np.float32)
+    else:
+        vectors = synthetic_vectors(args.num_vectors, args.dim, args.seed)
+
+    rng = np.random.default_rng(args.seed + 1)
+    queries = vectors[rng.integers(0, len(vectors), args.num_queries)]
+    queries = queries + 0.1 * rng.standard_normal(queries.shape, dtype=np.float32)
+
+    index_config = VectorIndexConfig(nprobe=args.nprobe, ef_search=args.ef_search, vector_dtype=args.vector_dtype)
+
+    # Exact float32 flat index is the ground truth.
+    baseline, truth = bench_index("flat", vectors, queries, args.k, index_config._replace(vector_dtype="float32"))
+    if "flat" in args.types:
+        print(json.dumps(baseline))
+    for index_type in args.types:
+        if index_type == "flat":
+            continue
+        report, _ = bench_index(index_type, vectors, queries, args.k, index_config, truth)
+        print(json.dumps(report))
+        sys.stdout.flush()
+
+if __name__ == "__main__":
+    main()
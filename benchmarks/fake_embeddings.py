@@ -0,0 +1,34 @@
+"""
+Deterministic embeddings for offline benchmarks, no embedding server needed.
+"""
+import zlib
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from lexical_index import tokenize
+
+class HashEmbeddings(Embeddings):
+    """
+    Feature hashing of index terms into a normalized vector, texts sharing terms get close vectors.
+    Same interface as 'TeiEmbeddings', including 'embed_matrix'.
+    """
+
+    def __init__(self, dim: int = 384) -> None:
+        self.dim = dim
+
+    def embed_matrix(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for term in tokenize(text):
+                h = zlib.crc32(term.encode("utf-8"))  # Stable across processes, unlike 'hash'.
+                matrix[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_matrix(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_matrix([text])[0].tolist()
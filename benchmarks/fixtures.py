@@ -0,0 +1,151 @@
+"""
+Synthetic documents of controlled text size, one writer per format handled by 'doc_parser'.
+
+Fixtures are generated from a seed, so two runs with the same parameters parse the same content.
+PDF and DOCX are written directly (PDF objects, OOXML parts in a zip), the other formats with the
+libraries the parsers already depend on.
+"""
+import zipfile
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+FORMATS = [".pdf", ".docx", ".xlsx", ".pptx", ".odt"]
+
+LATIN_WORDS = ["the", "budget", "approval", "form", "A-123", "must", "be", "submitted", "before", "deadline",
+               "v1.2", "office", "regulation", "article", "department", "request", "annual", "report"]
+# Traditional Chinese, as in the documents of this application, with the full-width punctuation chunks end at.
+CJK_SENTENCES = ["申請書請於每月最後一個工作日前送交總務處。", "依本局規定第12條辦理，並應經單位主管核准。",
+                 "詳情請洽總務處承辦人員！", "經費核銷程序請依本局規定辦理。", "本案是否符合「政府採購法」第22條規定？",
+                 "差旅費、加班費及誤餐費應檢附單據；逾期者不予受理："]
+
+PARAGRAPHS_PER_PAGE = 6  # Paragraphs per PDF page, PPTX slide and XLSX sheet block.
+
+def synthetic_paragraphs(text_chars: int, seed: int, cjk: bool = True) -> List[str]:
+    """
+    Paragraphs of mixed English and Traditional Chinese sentences, 'text_chars' characters in total at least.
+    """
+    rng = np.random.default_rng(seed)
+    paragraphs, size = [], 0
+    while size < text_chars:
+        if not cjk or rng.random() < 0.5:
+            sentences = [" ".join(rng.choice(LATIN_WORDS, rng.integers(6, 16))).capitalize() + "."
+                         for _ in range(rng.integers(2, 6))]
+            paragraph = " ".join(sentences)
+        else:
+            paragraph = "".join(rng.choice(CJK_SENTENCES, rng.integers(2, 6)))
+        paragraphs.append(paragraph)
+        size += len(paragraph)
+    return paragraphs
+
+def _pages(paragraphs: List[str]) -> Iterator[List[str]]:
+    for i in range(0, len(paragraphs), PARAGRAPHS_PER_PAGE):
+        yield paragraphs[i:i + PARAGRAPHS_PER_PAGE]
+
+def _pdf_string(text: str) -> str:
+    return "(" + text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+def write_pdf(path: Path, paragraphs: List[str]) -> None:
+    # Standard Helvetica font has no CJK glyphs, paragraphs are expected to be Latin text.
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    page_ids = []
+    for page in _pages(paragraphs):
+        lines = []
+        for paragraph in page:
+            words = paragraph.split()
+            lines += [" ".join(words[i:i + 14]) for i in range(0, len(words), 14)] + [""]
+        content = "BT /F1 9 Tf 11 TL 40 800 Td " + " ".join(f"{_pdf_string(line)} ' " for line in lines) + "ET"
+        objects.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(page_ids)} >>"
+
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(data)
+    data += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    data += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    data += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    path.write_bytes(bytes(data))
+
+_DOCX_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>
+</Types>"""
+
+_DOCX_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>
+</Relationships>"""
+
+def write_docx(path: Path, paragraphs: List[str]) -> None:
+    body = "".join(f'<w:p><w:r><w:t xml:space="preserve">{escape(p)}</w:t></w:r></w:p>' for p in paragraphs)
+    document = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                f"<w:body>{body}</w:body></w:document>")
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml", _DOCX_CONTENT_TYPES)
+        z.writestr("_rels/.rels", _DOCX_RELS)
+        z.writestr("word/document.xml", document)
+
+def write_xlsx(path: Path, paragraphs: List[str]) -> None:
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    for number, page in enumerate(_pages(paragraphs), 1):
+        if number % 50 == 1: # A new sheet every 50 blocks.
+            sheet = workbook.create_sheet(f"Sheet{number // 50 + 1}")
+        for i, paragraph in enumerate(page):
+            sheet.append([number * 100 + i, paragraph, float(i) * 1.5])
+    workbook.save(path)
+
+def write_pptx(path: Path, paragraphs: List[str]) -> None:
+    from pptx import Presentation
+    from pptx.util import Inches
+    presentation = Presentation()
+    layout = presentation.slide_layouts[6]  # Blank.
+    for page in _pages(paragraphs):
+        slide = presentation.slides.add_slide(layout)
+        for i, paragraph in enumerate(page):
+            box = slide.shapes.add_textbox(Inches(0.5), Inches(0.5 + i), Inches(9), Inches(1))
+            box.text_frame.text = paragraph
+    presentation.save(path)
+
+def write_odt(path: Path, paragraphs: List[str]) -> None:
+    from odf.opendocument import OpenDocumentText
+    from odf.text import P
+    document = OpenDocumentText()
+    for paragraph in paragraphs:
+        document.text.addElement(P(text=paragraph))
+    document.save(str(path))
+
+FIXTURE_WRITERS: Dict[str, Callable[[Path, List[str]], None]] = {
+    ".pdf": write_pdf,
+    ".docx": write_docx,
+    ".xlsx": write_xlsx,
+    ".pptx": write_pptx,
+    ".odt": write_odt,
+}
+
+def fixture_path(folder: Path, suffix: str, text_chars: int, seed: int) -> Path:
+    # Named after its parameters, so a kept fixture is reused by runs with the same arguments.
+    return Path(folder) / f"fixture-{text_chars}-{seed}{suffix}"
+
+def write_fixture(folder: Path, suffix: str, text_chars: int, seed: int) -> Path:
+    """
+    Write a synthetic document of about 'text_chars' characters of text, unless it already exists.
+    """
+    path = fixture_path(folder, suffix, text_chars, seed)
+    if path.exists():
+        return path
+    paragraphs = synthetic_paragraphs(text_chars, seed, cjk=suffix != ".pdf")
+    FIXTURE_WRITERS[suffix](path, paragraphs)
+    return path
@@ -0,0 +1,209 @@
+"""
+Local stand-ins of the embedding (TEI '/embed') and generation (TGI '/generate_stream') services.
+
+Latency, token rate and limits are configurable, and requests over the concurrency limit are
+rejected with 429 and an 'overloaded' error, as TGI does beyond '--max-concurrent-requests'.
+Used by 'benchmarks.bench_load', or standalone to point a web UI at them:
+
+    python -m benchmarks.mock_servers --tei-port 15820 --tgi-port 15810
+"""
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple
+
+from benchmarks.fake_embeddings import HashEmbeddings
+from benchmarks.fixtures import LATIN_WORDS
+
+OVERLOADED_ERROR = {"error": "Model is overloaded", "error_type": "overloaded"}
+
+class MockTeiConfig(NamedTuple):
+    latency: float = 0.01            # Seconds per request.
+    latency_per_text: float = 0.002  # Seconds per text of a batch.
+    max_batch_size: int = 32         # TEI '--max-client-batch-size', larger batches get 413.
+    max_concurrent_requests: int = 512
+    dim: int = 384
+
+class MockTgiConfig(NamedTuple):
+    first_token_latency: float = 0.2   # Seconds of prefill before the first token.
+    tokens_per_second: float = 30.0    # Decode rate of a request running alone.
+    batch_slowdown: float = 0.1        # Decode slows by this fraction per other running request.
+    response_tokens: int = 200         # Tokens generated, unless 'max_new_tokens' is lower.
+    max_concurrent_requests: int = 4   # TGI '--max-concurrent-requests', as 'text-generation-service.sh'.
+
+class MockStats:
+    """
+    Request counters of a mock server, shared by its handler threads.
+    """
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def enter(self, limit: int) -> bool:
+        # Take a slot, False if the server is at its limit.
+        with self._lock:
+            self.requests += 1
+            if self.in_flight >= limit:
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            return True
+
+    def leave(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {"requests": self.requests, "rejected": self.rejected, "max_in_flight": self.max_in_flight}
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, as clients pool connections.
+
+    def read_json(self) -> dict:
+        return json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+
+    def send_json(self, status: int, body) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+class _TeiHandler(_Handler):
+
+    def do_POST(self) -> None:
+        mock: MockTeiServer = self.server.mock
+        config = mock.config
+        texts = self.read_json().get("inputs", [])
+        if isinstance(texts, str):
+            texts = [texts]
+        if self.path != "/embed":
+            self.send_json(404, {"error": "Not found"})
+            return
+        if len(texts) > config.max_batch_size:
+            self.send_json(413, {"error": f"batch size {len(texts)} > maximum allowed batch size {config.max_batch_size}",
+                                 "error_type": "Validation"})
+            return
+        if not mock.stats.enter(config.max_concurrent_requests):
+            self.send_json(429, OVERLOADED_ERROR)
+            return
+        try:
+            time.sleep(config.latency + config.latency_per_text * len(texts))
+            self.send_json(200, mock.embeddings.embed_matrix(texts).tolist())
+        finally:
+            mock.stats.leave()
+
+class _TgiHandler(_Handler):
+
+    def do_GET(self) -> None:
+        if self.path == "/health": # Polled by 'LlmRouter'.
+            self.send_json(200, {})
+        else:
+            self.send_json(404, {"error": "Not found"})
+
+    def send_chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_POST(self) -> None:
+        mock: MockTgiServer = self.server.mock
+        config = mock.config
+        request = self.read_json()
+        if self.path != "/generate_stream":
+            self.send_json(404, {"error": "Not found"})
+            return
+        if not mock.stats.enter(config.max_concurrent_requests):
+            self.send_json(429, OVERLOADED_ERROR)
+            return
+        try:
+            max_new_tokens = request.get("parameters", {}).get("max_new_tokens") or config.response_tokens
+            num_tokens = min(max_new_tokens, config.response_tokens)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            time.sleep(config.first_token_latency)
+            generated = []
+            for i in range(num_tokens):
+                if i: # Decode step, slower while other requests share the batch.
+                    time.sleep((1 + config.batch_slowdown * (mock.stats.in_flight - 1)) / config.tokens_per_second)
+                text = " " + LATIN_WORDS[i % len(LATIN_WORDS)]
+                generated.append(text)
+                event = {"token": {"id": i, "text": text, "logprob": 0.0, "special": False},
+                         "generated_text": "".join(generated) if i == num_tokens - 1 else None, "details": None}
+                self.send_chunk(b"data:" + json.dumps(event).encode("utf-8") + b"\n\n")
+            self.send_chunk(b"")  # Last chunk.
+        finally:
+            mock.stats.leave()
+
+class _MockServer:
+    handler = _Handler
+
+    def __init__(self, config, port: int = 0, address: str = "127.0.0.1") -> None:
+        self.config = config
+        self.stats = MockStats()
+        self.httpd = ThreadingHTTPServer((address, port), self.handler)
+        self.httpd.daemon_threads = True
+        self.httpd.mock = self
+
+    @property
+    def url(self) -> str:
+        address, port = self.httpd.server_address[:2]
+        return f"http://{address}:{port}"
+
+    def start(self) -> "_MockServer":
+        threading.Thread(target=self.httpd.serve_forever, name=type(self).__name__, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+class MockTeiServer(_MockServer):
+    handler = _TeiHandler
+
+    def __init__(self, config: MockTeiConfig = MockTeiConfig(), port: int = 0, address: str = "127.0.0.1") -> None:
+        super().__init__(config, port, address)
+        self.embeddings = HashEmbeddings(config.dim)
+
+class MockTgiServer(_MockServer):
+    handler = _TgiHandler
+
+    def __init__(self, config: MockTgiConfig = MockTgiConfig(), port: int = 0, address: str = "127.0.0.1") -> None:
+        super().__init__(config, port, address)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run mock TEI and TGI servers.")
+    parser.add_argument("--tei-port", type=int, default=15820)
+    parser.add_argument("--tgi-port", type=int, default=15810)
+    parser.add_argument("--first-token-latency", type=float, default=MockTgiConfig().first_token_latency)
+    parser.add_argument("--tokens-per-second", type=float, default=MockTgiConfig().tokens_per_second)
+    parser.add_argument("--tgi-max-concurrent-requests", type=int, default=MockTgiConfig().max_concurrent_requests)
+    args = parser.parse_args()
+
+    tei = MockTeiServer(port=args.tei_port).start()
+    tgi = MockTgiServer(MockTgiConfig(first_token_latency=args.first_token_latency, tokens_per_second=args.tokens_per_second,
+                                      max_concurrent_requests=args.tgi_max_concurrent_requests), port=args.tgi_port).start()
+    print(f"Mock TEI at {tei.url}, mock TGI at {tgi.url}, Ctrl-C to stop.")
+    try:
+        while True:
+            time.sleep(10)
+            print(json.dumps({"tei": tei.stats.to_dict(), "tgi": tgi.stats.to_dict()}))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
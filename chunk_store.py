@@ -0,0 +1,146 @@
+"""
+Chunk Store
+
+Compact columnar storage of document chunks. Chunk texts live in one UTF-8 arena indexed by
+offset and length arrays, and the metadata written by parsers is stored as integer columns:
+source file (coded against a table of distinct sources), page and start index.
+A langchain 'Document' is built only when a chunk is read, i.e. for the top-k search results,
+instead of one object and one metadata dictionary being kept per chunk.
+"""
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents.base import Document
+
+NO_PAGE = 0          # Pages are numbered from 1.
+NO_START_INDEX = -1
+
+COMPACT_RATIO = 0.5  # Arena is compacted once deleted texts exceed this fraction of it.
+
+def split_metadata(metadata: dict) -> Tuple[str, int, int, Optional[dict]]:
+    """
+    Split chunk metadata into its columns: source, page, start index, and the remaining
+    keys, None if there are none (the usual case for chunks of 'doc_parser').
+    """
+    extra = {k: v for k, v in metadata.items() if k not in ("source", "page", "start_index")}
+    return (str(metadata.get("source", "")), int(metadata.get("page", NO_PAGE)),
+            int(metadata.get("start_index", NO_START_INDEX)), extra or None)
+
+def make_document(text: str, source: str, page: int, start_index: int, extra: Optional[dict] = None) -> Document:
+    # Reverse of 'split_metadata'.
+    metadata = {"source": source}
+    if page != NO_PAGE:
+        metadata["page"] = page
+    if start_index != NO_START_INDEX:
+        metadata["start_index"] = start_index
+    if extra:
+        metadata.update(extra)
+    return Document(page_content=text, metadata=metadata)
+
+class SourceTable:
+    """
+    Distinct source paths, each coded as its position in 'sources'.
+    """
+
+    def __init__(self, sources: Iterable[str] = ()) -> None:
+        self.sources: List[str] = []
+        self.codes: Dict[str, int] = {}
+        for source in sources:
+            self.code(source)
+
+    def code(self, source: str) -> int:
+        code = self.codes.get(source)
+        if code is None:
+            code = self.codes[source] = len(self.sources)
+            self.sources.append(source)
+        return code
+
+class ChunkStore(Docstore, AddableMixin):
+    """
+    In-memory columnar docstore of the chunks of a vector store.
+
+    Deleted chunks leave a hole in the text arena, which is compacted once holes
+    take up too much of it.
+
+    Attributes:
+        positions: Dict[str, int]
+            Row of each chunk, keyed by docstore ID.
+        source_table: SourceTable
+            Distinct sources, referred to by the source column.
+    """
+
+    def __init__(self) -> None:
+        self.positions: Dict[str, int] = {}
+        self.source_table = SourceTable()
+        self._arena = bytearray()
+        self._offsets = array("q")
+        self._lengths = array("i")
+        self._source_codes = array("i")
+        self._pages = array("i")
+        self._start_indexes = array("q")
+        self._extras: Dict[int, dict] = {}  # Rare metadata beyond the columns, keyed by row.
+        self._deleted_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.positions
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        """
+        Add chunks keyed by docstore ID, the given documents are not kept.
+        """
+        overlapping = [doc_id for doc_id in texts if doc_id in self.positions]
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        for doc_id, document in texts.items():
+            self._append(doc_id, document.page_content, *split_metadata(document.metadata))
+
+    def _append(self, doc_id: str, text: str, source: str, page: int, start_index: int, extra: Optional[dict]) -> None:
+        data = text.encode("utf-8")
+        row = len(self._offsets)
+        self._offsets.append(len(self._arena))
+        self._lengths.append(len(data))
+        self._arena += data
+        self._source_codes.append(self.source_table.code(source))
+        self._pages.append(page)
+        self._start_indexes.append(start_index)
+        if extra:
+            self._extras[row] = extra
+        self.positions[doc_id] = row
+
+    def text(self, doc_id: str) -> str:
+        row = self.positions[doc_id]
+        offset = self._offsets[row]
+        return self._arena[offset:offset + self._lengths[row]].decode("utf-8")
+
+    def search(self, search: str) -> Union[str, Document]:
+        row = self.positions.get(search)
+        if row is None:
+            return f"ID {search} not found."
+        return make_document(self.text(search), self.source_table.sources[self._source_codes[row]],
+                             self._pages[row], self._start_indexes[row], self._extras.get(row))
+
+    def delete(self, ids: List) -> None:
+        missing = [doc_id for doc_id in ids if doc_id not in self.positions]
+        if missing:
+            raise ValueError(f"Tried to delete ids that does not exist: {missing}")
+        for doc_id in ids:
+            row = self.positions.pop(doc_id)
+            self._deleted_bytes += self._lengths[row]
+            self._extras.pop(row, None)
+
+        if self._deleted_bytes > COMPACT_RATIO * len(self._arena):
+            self._compact()
+
+    def _compact(self) -> None:
+        # Rewrite live rows only, in their current order.
+        live = sorted(self.positions.items(), key=lambda x: x[1])
+        rows = [(doc_id, self.text(doc_id), self.source_table.sources[self._source_codes[row]],
+                 self._pages[row], self._start_indexes[row], self._extras.get(row)) for doc_id, row in live]
+        self.__init__()
+        for row in rows:
+            self._append(*row)
+
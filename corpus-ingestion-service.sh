@@ -0,0 +1,3 @@
+# Shared corpus ingestion, requires the embedding service and a 'corpus' section in config.yaml.
+source .venv/bin/activate
+python corpus_ingestion.py --config config.yaml
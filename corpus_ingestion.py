@@ -0,0 +1,169 @@
+"""
+Corpus Ingestion Service
+
+Watches the shared corpus folder, parses and embeds new or changed documents, and publishes
+the shared index read by every frontend session. Documents with identical content are embedded once.
+
+Usage:
+    python corpus_ingestion.py [--config config.yaml] [--once]
+"""
+import os
+import time
+import argparse
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+from webui_config import UiConfig
+from index_cache import EmbeddingIndexCache, file_digest
+from document_rag_processor import SessionVectorStore
+from shared_corpus import write_snapshot
+
+from doc_parser import SUPPORTED_EXTENSIONS, configure_pool
+
+class CorpusFile(NamedTuple):
+    mtime: float
+    size: int
+    digest: str
+
+class CorpusIngestion:
+    """
+    Incremental ingestion of a corpus folder.
+
+    Attributes:
+        store: SessionVectorStore
+            Index of the corpus, holding one representative path per distinct content.
+        files: Dict[str, CorpusFile]
+            Known files of the corpus, keyed by path.
+        digest_paths: Dict[str, List[str]]
+            Paths sharing each content hash, the first one is indexed.
+    """
+
+    def __init__(self, config: UiConfig) -> None:
+        self.corpus_config = config.corpus
+        configure_pool(config.parse_workers)
+        index_cache = EmbeddingIndexCache(Path(config.document_folder) / ".index", config.index_cache_size * 1024 * 1024,
+                                          config.vector_index.vector_dtype)
+        self.store = SessionVectorStore(config.embedding_model, self.corpus_config.chunk_size, self.corpus_config.chunk_overlap,
+                                        index_cache=index_cache, index_config=config.vector_index)
+        self.files: Dict[str, CorpusFile] = {}
+        self.digest_paths: Dict[str, List[str]] = {}
+
+    def _list_files(self) -> Dict[str, os.stat_result]:
+        files = {}
+        for path in Path(self.corpus_config.corpus_folder).rglob("*"):
+            if path.suffix in SUPPORTED_EXTENSIONS and path.is_file() and not path.name.startswith("."):
+                try:
+                    files[str(path)] = path.stat()
+                except FileNotFoundError: # Deleted since listed.
+                    pass
+        return files
+
+    def _remove(self, path: str) -> None:
+        digest = self.files.pop(path).digest
+        paths = self.digest_paths[digest]
+        indexed = paths[0] == path
+        paths.remove(path)
+        if not indexed:
+            return
+
+        self.store.remove_document(path)
+        if paths: # Same content remains under another path, re-add it from index cache.
+            self.store.add_documents([paths[0]], [digest])
+        else:
+            del self.digest_paths[digest]
+
+    def scan(self) -> dict:
+        """
+        Apply changes of the corpus folder to the index.
+
+        Returns:
+            dict:
+                Ingestion statistics of this scan.
+        """
+        start = time.perf_counter()
+        current = self._list_files()
+
+        deleted = [p for p in self.files if p not in current]
+        changed = [p for p, st in current.items()
+                   if p not in self.files or (self.files[p].mtime, self.files[p].size) != (st.st_mtime, st.st_size)]
+
+        for path in deleted:
+            self._remove(path)
+
+        new_paths, new_digests = [], []
+        skipped = []
+        for path in changed:
+            if path in self.files:
+                self._remove(path)
+            try:
+                digest = file_digest(path)
+            except FileNotFoundError: # Deleted or renamed since listed, seen again by the next scan if it comes back.
+                skipped.append(path)
+                continue
+            self.files[path] = CorpusFile(mtime=current[path].st_mtime, size=current[path].st_size, digest=digest)
+            paths = self.digest_paths.setdefault(digest, [])
+            paths.append(path)
+            if len(paths) == 1: # Content not indexed yet.
+                new_paths.append(path)
+                new_digests.append(digest)
+
+        chunks_before = self.store.db.index.ntotal if self.store.db is not None else 0
+        self.store.add_documents(new_paths, new_digests)
+        chunks_after = self.store.db.index.ntotal if self.store.db is not None else 0
+
+        elapsed = time.perf_counter() - start
+        ingested_bytes = sum(current[p].st_size for p in new_paths)
+        return {
+            "documents": len(self.files),
+            "distinct_documents": len(self.digest_paths),
+            "changed": len(changed),
+            "skipped": len(skipped),
+            "deleted": len(deleted),
+            "ingested": len(new_paths),
+            "ingested_bytes": ingested_bytes,
+            "chunks": chunks_after,
+            "chunks_delta": chunks_after - chunks_before,
+            "seconds": round(elapsed, 3),
+            "documents_per_second": round(len(new_paths) / elapsed, 3) if elapsed else 0.0,
+            "megabytes_per_second": round(ingested_bytes / 1024 / 1024 / elapsed, 3) if elapsed else 0.0,
+        }
+
+    def publish(self, stats: dict) -> str:
+        manifest = {
+            "documents": {p: f.digest for p, f in self.files.items()},
+            "chunk_size": self.corpus_config.chunk_size,
+            "chunk_overlap": self.corpus_config.chunk_overlap,
+            "stats": stats,
+        }
+        return write_snapshot(self.corpus_config.index_folder, self.store.db, manifest)
+
+    def run(self, once: bool = False) -> None:
+        first = True
+        while True:
+            stats = self.scan()
+            if first or stats["changed"] or stats["deleted"]:
+                snapshot = self.publish(stats)
+                print(f"[+] Published {snapshot}: {stats['ingested']} documents ingested, {stats['deleted']} deleted, "
+                      f"{stats['chunks']} chunks in {stats['seconds']} s "
+                      f"({stats['documents_per_second']} documents/s, {stats['megabytes_per_second']} MB/s).")
+            first = False
+            if once:
+                return
+            time.sleep(self.corpus_config.scan_interval)
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest shared corpus into the index searched by all sessions.")
+    parser.add_argument("--config", default="config.yaml", help="Path to configuration file")
+    parser.add_argument("--once", action="store_true", help="Scan the corpus once and exit")
+    args = parser.parse_args()
+
+    with open(args.config, "r", encoding="utf-8") as f:
+        config = UiConfig.load_config_from_file(f)
+
+    if config.corpus is None:
+        parser.error("No 'corpus' section in configuration.")
+
+    CorpusIngestion(config).run(once=args.once)
+
+if __name__ == "__main__":
+    main()
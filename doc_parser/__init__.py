@@ -1,35 +1,53 @@
 from abc import ABC, abstractmethod
-from typing import List, Union, IO
+from typing import List, Union, IO, Type
 from pathlib import Path
 from langchain_core.documents.base import Document  # For type hinting
 from .parserbase import DocumentParser
 
+# File extensions handled by 'create_paeser'.
+SUPPORTED_EXTENSIONS = [".docx", ".xlsx", ".pptx", ".pdf", ".odt"]
 
-
-def create_paeser(path_like: Union[str, Path]) -> 'DocumentParser':
-
-    if isinstance(path_like, str):
-        path_like = Path(path_like)
+def _parser_class(path_like: Path) -> Type['DocumentParser']:
 
     # Check file extension.
     if path_like.suffix in [".docx"]:  # TODO: Add '.doc'. It should be supported now, but I cannot guarantee.
         from .msoffice_parser import MsDocParser
-        return MsDocParser(path_like)
+        return MsDocParser
     
     elif path_like.suffix in [".xlsx"]:
         from .msoffice_parser import MsExcelParser
-        return MsExcelParser(path_like)
+        return MsExcelParser
     
     elif path_like.suffix in [".pptx"]:
         from .msoffice_parser import MsPptParser
-        return MsPptParser(path_like)
+        return MsPptParser
     
     elif path_like.suffix in [".pdf"]:
         from .misc_parser import PdfParser
-        return PdfParser(path_like)
+        return PdfParser
     
     elif path_like.suffix in [".odt"]: 
         from .opendocument_parser import OdtParser
-        return OdtParser(path_like)
+        return OdtParser
     else:
-        raise ValueError(f"Unsupported file extension: {path_like.suffix}")
\ No newline at end of file
+        raise ValueError(f"Unsupported file extension: {path_like.suffix}")
+
+def create_paeser(path_like: Union[str, Path]) -> 'DocumentParser':
+
+    if isinstance(path_like, str):
+        path_like = Path(path_like)
+
+    return _parser_class(path_like)(path_like)
+
+def parser_id(path_like: Union[str, Path]) -> str:
+    """
+    Identifier of the parser handling the given file, without reading the file.
+    It changes whenever the parser implementation changes, so it can be used as part of a cache key.
+    """
+    if isinstance(path_like, str):
+        path_like = Path(path_like)
+
+    parser_class = _parser_class(path_like)
+    return f"{parser_class.__name__}-{parser_class.version}"
+
+from .batch_parser import parse_many, configure_pool
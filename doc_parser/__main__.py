@@ -2,7 +2,7 @@ import sys
 import argparse
 from pathlib import Path
 
-from . import create_paeser
+from . import create_paeser, parse_many
 
 def valid_file(path):
     if not Path(path).is_file():
@@ -11,26 +11,25 @@ def valid_file(path):
 
 def main():
     parser = argparse.ArgumentParser(description="Demostration of doc_parser package.")
-    group = parser.add_mutually_exclusive_group(required=True)
-    group.add_argument('path', type=valid_file, nargs='?', help="Path to file")
-    group.add_argument('--mode', choices=['extract', 'chunk'], default='extract', help="Select mode")
+    parser.add_argument('path', type=valid_file, nargs='+', help="Path to file")
+    parser.add_argument('--mode', choices=['extract', 'chunk'], default='extract', help="Select mode")
 
     parser.add_argument('--size', type=int, help="Size of each chunk (required for 'chunk' mode)")
     parser.add_argument('--overlap', type=int, help="Overlap between chunks (required for 'chunk' mode)")
+    parser.add_argument('--workers', type=int, help="Number of parsing processes (only for 'chunk' mode, default: number of CPUs)")
 
     args = parser.parse_args()
-    
-    file = args.path
-    file_parser = create_paeser(file)
 
     if args.mode == 'extract':
-        if args.size or args.overlap:
+        if args.size or args.overlap or args.workers:
             parser.error("Additional arguments are not allowed in 'extract' mode.")
-        print(file_parser.extract_raw_text())
+        for file in args.path:
+            file_parser = create_paeser(file)
+            print(file_parser.extract_raw_text())
     elif args.mode == 'chunk':
         if not args.size or not args.overlap:
             parser.error("Both 'size' and 'overlap' are required in 'chunk' mode.")
-        print(file_parser.parse(args.size, args.overlap))
+        print(parse_many(args.path, args.size, args.overlap, workers=args.workers))
 
 if __name__ == "__main__":
     main()
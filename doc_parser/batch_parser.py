@@ -0,0 +1,160 @@
+"""Batch parsing of documents with a process pool."""
+
+# Standard library imports
+import os  # For CPU count
+import collections  # For the window of submitted tasks
+import multiprocessing  # For the start method of worker processes
+import threading  # For guarding the shared process pool
+import time  # For timing parsing tasks
+from concurrent.futures import ProcessPoolExecutor  # For parsing documents in parallel
+from pathlib import Path  # For handling file system paths
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union  # For type hints
+
+# Third-party library imports
+from langchain_core.documents.base import Document  # For type hinting
+
+# Local imports
+from . import create_paeser
+
+PDF_PAGES_PER_TASK = 20  # Large PDFs are split into page ranges of this size.
+
+# Process pool shared by all batches, created on first use and never resized,
+# since batches of other sessions may be submitting to it.
+_executor: Optional[ProcessPoolExecutor] = None
+_pool_size: Optional[int] = None  # Number of processes, number of CPUs if not configured.
+_executor_lock = threading.Lock()  # Sessions parse from their own threads.
+# Workers are not forked from the server process: it runs many threads, and a forked child could
+# deadlock on a lock held by one of them at fork time.
+_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+def configure_pool(workers: Optional[int]) -> None:
+    """
+    Set the number of processes of the shared pool, i.e. from configuration.
+    It applies when the pool is created, a running pool keeps its size until 'shutdown_executor'.
+    """
+    global _pool_size
+    with _executor_lock:
+        _pool_size = workers
+
+def pool_size() -> int:
+    return _pool_size or os.cpu_count() or 1
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=pool_size(), mp_context=multiprocessing.get_context(_START_METHOD))
+        return _executor
+
+def shutdown_executor() -> None:
+    """
+    Shutdown the shared process pool.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
+
+# A parsing task: path, chunk size, chunk overlap and an optional page range.
+ParseTask = Tuple[str, int, int, Optional[Tuple[int, int]]]
+
+def _plan_tasks(paths: List[Union[str, Path]], chunk_size: int, chunk_overlap: int, pages_per_task: int) -> List[ParseTask]:
+    tasks = []
+    for path in paths:
+        path = str(path)
+        if Path(path).suffix == ".pdf":
+            from .misc_parser import PdfParser
+            num_pages = PdfParser(path).page_count()
+            if num_pages > pages_per_task:
+                for start in range(0, num_pages, pages_per_task):
+                    tasks.append((path, chunk_size, chunk_overlap, (start, min(start + pages_per_task, num_pages))))
+                continue
+        tasks.append((path, chunk_size, chunk_overlap, None))
+    return tasks
+
+def _run_task(task: ParseTask) -> Tuple[List[Document], float, int]:
+    # Chunks, seconds spent by the worker, excluding the pool queue and result transfer,
+    # and length of the extracted text of a page range, 0 for a whole document.
+    started = time.perf_counter()
+    path, chunk_size, chunk_overlap, page_range = task
+    parser = create_paeser(path)
+    if page_range is None:
+        return parser.parse(chunk_size, chunk_overlap), time.perf_counter() - started, 0
+
+    # Parse a page range of a paginated document.
+    start, stop = page_range
+    segment_lengths = []
+
+    def measured(segments):
+        for segment in segments:
+            segment_lengths.append(len(segment))
+            yield segment
+
+    segments = measured(parser.iter_raw_text(page_range=range(start, stop)))
+    chunks = parser.chunk_segments(segments, chunk_size, chunk_overlap, first_page=start + 1)
+    text_length = sum(segment_lengths) + max(0, len(segment_lengths) - 1)  # Segments are joined by newlines.
+    return chunks, time.perf_counter() - started, text_length
+
+def _map_bounded(executor: ProcessPoolExecutor, fn: Callable, tasks: Iterable, limit: int) -> Iterator:
+    # Like 'executor.map', results in submission order, with at most 'limit' tasks of this batch
+    # submitted at once, so concurrent batches share the pool.
+    pending = collections.deque()
+    for task in tasks:
+        if len(pending) >= limit:
+            yield pending.popleft().result()
+        pending.append(executor.submit(fn, task))
+    while pending:
+        yield pending.popleft().result()
+
+def parse_many(paths: List[Union[str, Path]], chunk_size: int, chunk_overlap: int, workers: Optional[int] = None, pages_per_task: int = PDF_PAGES_PER_TASK, timings: Optional[List[Tuple[str, float]]] = None) -> List[Document]:
+    """
+    Parse documents into chunks in parallel.
+
+    Files are distributed over a process pool, and large PDFs are split by page range.
+    Chunks do not cross the boundary of a page range, but their 'start_index' is the offset in the
+    extracted text of the whole document, as with 'parse'.
+
+    Parameters:
+        paths: List[Union[str, Path]]
+            Paths to the document files.
+        chunk_size: int
+            The size of each chunk.
+        chunk_overlap: int
+            The overlap between adjacent chunks.
+        workers: Optional[int]
+            Maximum number of tasks of this batch running at once in the shared pool, defaults to the
+            pool size. Parse in current process if it is 1.
+        pages_per_task: int
+            Maximum number of PDF pages parsed by a single task.
+        timings: Optional[List[Tuple[str, float]]]
+            If given, path and parsing seconds of each task are appended to it.
+
+    Returns:
+        List[Document]:
+            Chunks of all documents, in the order of 'paths' then page order.
+            Each chunk carries 'source' and, for paginated documents, 'page' metadata.
+    """
+    workers = workers or pool_size()
+    tasks = _plan_tasks(paths, chunk_size, chunk_overlap, pages_per_task)
+
+    if workers == 1 or len(tasks) <= 1:
+        results = map(_run_task, tasks)
+    else:
+        # Results come in submission order, so output is deterministic.
+        results = _map_bounded(_get_executor(), _run_task, tasks, workers)
+
+    all_chunks = []
+    range_offset = 0  # Extracted text length of the preceding page ranges of the document.
+    for task, (chunks, seconds, text_length) in zip(tasks, results):
+        page_range = task[3]
+        if page_range is None or page_range[0] == 0:
+            range_offset = 0
+        for chunk in chunks:
+            chunk.metadata["start_index"] += range_offset
+        if page_range is not None:
+            range_offset += text_length + 1  # Newline joining the next range.
+        all_chunks += chunks
+        if timings is not None:
+            timings.append((task[0], seconds))
+    return all_chunks
@@ -1,21 +1,19 @@
 """Parser for PDF documents."""
 
 # Standard library imports
-import tempfile  # For creating temporary files and directories
-from typing import List  # For type hints
+from typing import List, Optional, Iterator  # For type hints
 
 # Third-party library imports
-from langchain_community.document_loaders import UnstructuredExcelLoader  # For loading unstructured Excel documents
-from langchain_community.document_loaders import Docx2txtLoader  # For loading text from Word documents
-from pptx import Presentation  # For working with PowerPoint presentations
-from io import BytesIO  # For working with in-memory binary data
 from PyPDF2 import PdfReader # For working with PDF documents.
 
 # Local imports
 from .parserbase import DocumentParser
 
 class PdfParser(DocumentParser):
-    """Parser for Microsoft Word documents."""
+    """Parser for PDF documents."""
+
+    version = "5"
+    paginated = True
 
     def __init__(self, document) -> None:
         """
@@ -27,22 +25,43 @@ class PdfParser(DocumentParser):
         """
         super().__init__(document)
 
-    def extract_raw_text(self) -> List[str]:
+    def page_count(self) -> int:
+        """
+        Get the total number of pages in the PDF.
+        """
+        return len(PdfReader(self.open_stream()).pages)
+
+    def extract_raw_text(self, page_range: Optional[range] = None) -> List[str]:
         """
         Extract raw text from PDF document.
 
+        Parameters:
+            page_range: Optional[range]
+                Zero-based indices of pages to extract, all pages if not given.
+
         Returns:
             List[str]:
-                A list of strings representing the extracted text from the document.
+                A list of strings representing the extracted text from the document, one string per page.
+        """
+        return list(self.iter_raw_text(page_range))
+
+    def iter_raw_text(self, page_range: Optional[range] = None) -> Iterator[str]:
         """
-        file_like = BytesIO(self.buffer)
-        pdf_reader = PdfReader(file_like)
-        all_pages = []
+        Extract raw text from PDF document page by page.
+
+        Parameters:
+            page_range: Optional[range]
+                Zero-based indices of pages to extract, all pages if not given.
+
+        Returns:
+            Iterator[str]:
+                An iterator of strings, one string per page.
+        """
+        pdf_reader = PdfReader(self.open_stream())
         # Get the total number of pages in the PDF
         num_pages = len(pdf_reader.pages)
-        for i in range(num_pages):
+        if page_range is None:
+            page_range = range(num_pages)
+        for i in page_range:
             page = pdf_reader.pages[i]
-            text = page.extract_text()
-            all_pages.append(text)
-
-        return all_pages
\ No newline at end of file
+            yield page.extract_text()
@@ -1,21 +1,39 @@
 """Parser for Microsoft Office documents."""
 
 # Standard library imports
-import tempfile  # For creating temporary files and directories
-from typing import List  # For type hints
+import re  # For ordering header and footer parts
+import zipfile  # For reading Office Open XML packages
+from typing import List, Iterator  # For type hints
+from xml.etree.ElementTree import iterparse  # For streaming XML parsing
 
 # Third-party library imports
-from langchain_community.document_loaders import UnstructuredExcelLoader  # For loading unstructured Excel documents
-from langchain_community.document_loaders import Docx2txtLoader  # For loading text from Word documents
+from openpyxl import load_workbook  # For reading Excel workbooks
 from pptx import Presentation  # For working with PowerPoint presentations
-from io import BytesIO  # For working with in-memory binary data
 
 # Local imports
 from .parserbase import DocumentParser
 
+# WordprocessingML elements.
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_W_PARAGRAPH = _W + "p"
+_W_TEXT = _W + "t"
+_W_TAB = _W + "tab"
+_W_BREAKS = (_W + "br", _W + "cr")
+
+def _part_number(name: str) -> int:
+    match = re.search(r"(\d+)\.xml$", name)
+    return int(match.group(1)) if match else 0
+
+def _cell_text(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))  # Whole numbers are stored as float, display them as integer.
+    return str(value).strip()
+
 class MsDocParser(DocumentParser):
     """Parser for Microsoft Word documents."""
 
+    version = "5"
+
     def __init__(self, document) -> None:
         """
         Initialize the MsDocParser.
@@ -34,20 +52,55 @@ class MsDocParser(DocumentParser):
             List[str]:
                 A list of strings representing the extracted text from the document.
         """
-        with tempfile.NamedTemporaryFile(mode='wb', delete=False) as tmpf:
-            # Write buffer to temporary file.
-            tmpf.write(self.buffer)
-            tmpf.seek(0)
-            # Load document.
-            loader = Docx2txtLoader(tmpf.name)
-            data = loader.load()
-            # Convert list of 'Document' to list of string.
-            return [d.page_content for d in data]
+        return list(self.iter_raw_text())
+
+    def iter_raw_text(self) -> Iterator[str]:
+        """
+        Extract raw text from the Word document paragraph by paragraph, streaming its XML parts
+        from the package: headers, body, then footers as 'docx2txt' did.
 
+        Returns:
+            Iterator[str]:
+                An iterator of strings, one string per paragraph.
+        """
+        with zipfile.ZipFile(self.open_stream()) as package:
+            names = package.namelist()
+            headers = sorted((n for n in names if re.fullmatch(r"word/header\d*\.xml", n)), key=_part_number)
+            footers = sorted((n for n in names if re.fullmatch(r"word/footer\d*\.xml", n)), key=_part_number)
+            for name in headers + ["word/document.xml"] + footers:
+                if name not in names:
+                    continue
+                with package.open(name) as part:
+                    yield from self._iter_paragraphs(part)
+
+    @staticmethod
+    def _iter_paragraphs(part) -> Iterator[str]:
+        paragraphs: List[List[str]] = []  # Texts of open paragraphs, text boxes nest paragraphs.
+        for event, element in iterparse(part, events=("start", "end")):
+            if event == "start":
+                if element.tag == _W_PARAGRAPH:
+                    paragraphs.append([])
+                continue
+            if not paragraphs:
+                continue
+            if element.tag == _W_TEXT:
+                paragraphs[-1].append(element.text or "")
+            elif element.tag == _W_TAB:
+                paragraphs[-1].append("\t")
+            elif element.tag in _W_BREAKS:
+                paragraphs[-1].append("\n")
+            elif element.tag == _W_PARAGRAPH:
+                paragraph = "".join(paragraphs.pop())
+                element.clear()  # Keep memory bounded by one paragraph.
+                if paragraph.strip():
+                    # Blank line after each paragraph, so paragraph boundaries are kept once segments are joined.
+                    yield paragraph + "\n"
 
 class MsExcelParser(DocumentParser):
     """Parser for Microsoft Excel documents."""
 
+    version = "5"
+
     def __init__(self, document) -> None:
         """
         Initialize the MsExcelParser.
@@ -66,15 +119,27 @@ class MsExcelParser(DocumentParser):
             List[str]:
                 A list of strings representing the extracted text from the document.
         """
-        with tempfile.NamedTemporaryFile(mode='wb', delete=False) as tmpf:
-            # Write buffer to temporary file.
-            tmpf.write(self.buffer)
-            tmpf.seek(0)
-            # Load document.
-            loader = UnstructuredExcelLoader(tmpf.name, mode='elements')
-            data = loader.load()
-            # Convert list of 'Document' to list of string.
-            return [d.page_content for d in data]  
+        return list(self.iter_raw_text())
+
+    def iter_raw_text(self) -> Iterator[str]:
+        """
+        Extract raw text from the Excel document row by row. Sheets are streamed in read-only mode,
+        so memory is bounded regardless of the workbook size.
+
+        Returns:
+            Iterator[str]:
+                An iterator of strings, the name of each sheet then one tab-separated string per row.
+        """
+        workbook = load_workbook(self.open_stream(), read_only=True, data_only=True)
+        try:
+            for sheet in workbook.worksheets:
+                yield "\n" + sheet.title  # Blank line between sheets.
+                for row in sheet.iter_rows(values_only=True):
+                    cells = [_cell_text(v) for v in row if v is not None]
+                    if any(cells):
+                        yield "\t".join(cells)
+        finally:
+            workbook.close()
 
 class MsPptParser(DocumentParser):
     """Parser for Microsoft PowerPoint documents."""
@@ -97,13 +162,20 @@ class MsPptParser(DocumentParser):
             List[str]:
                 A list of strings representing the extracted text from the document.
         """
-        parser = Presentation(BytesIO(self.buffer))
-        extracted_text = []
+        return list(self.iter_raw_text())
+
+    def iter_raw_text(self) -> Iterator[str]:
+        """
+        Extract raw text from the PowerPoint document shape by shape.
+
+        Returns:
+            Iterator[str]:
+                An iterator of strings, one string per shape.
+        """
+        parser = Presentation(self.open_stream())
 
         # Extract text from slides.
         for slides in parser.slides:
             for shape in slides.shapes:
                 if hasattr(shape, "text"):
-                    extracted_text.append(shape.text)
-
-        return extracted_text
+                    yield shape.text
@@ -1,13 +1,9 @@
 """Parser for Open Office documents."""
 
 # Standard library imports
-import tempfile  # For creating temporary files and directories
-from typing import List  # For type hints
-from io import BytesIO  # For working with in-memory binary data
+from typing import List, Iterator  # For type hints
 
 # Third-party library imports
-from langchain_community.document_loaders import UnstructuredExcelLoader  # For loading unstructured Excel documents
-from langchain_community.document_loaders import Docx2txtLoader  # For loading text from Word documents
 from odf import text, teletype
 from odf.opendocument import load
 
@@ -35,15 +31,20 @@ class OdtParser(DocumentParser):
             List[str]:
                 A list of strings representing the extracted text from the document.
         """
-        # Load the ODT file
-        doc = load(BytesIO(self.buffer))
+        return list(self.iter_raw_text())
 
-        # Initialize an empty string to store the extracted text
-        extracted_text = []
+    def iter_raw_text(self) -> Iterator[str]:
+        """
+        Extract raw text from ODT document paragraph by paragraph.
+
+        Returns:
+            Iterator[str]:
+                An iterator of strings, one string per paragraph.
+        """
+        # Load the ODT file
+        doc = load(self.open_stream())
 
         # Iterate through all paragraphs in the document
         for para in doc.getElementsByType(text.P):
-            # Extract text from each paragraph and append it to the result
-            extracted_text.append(teletype.extractText(para))
-
-        return extracted_text
+            # Extract text from each paragraph
+            yield teletype.extractText(para)
@@ -1,10 +1,20 @@
 """Base class for document parsers."""
 
+import mmap
 from abc import ABC, abstractmethod
-from typing import List, Union, IO
+from typing import List, Union, IO, Optional, Iterable, Iterator
 from pathlib import Path
 from langchain_core.documents.base import Document  # For type hinting
-from langchain.text_splitter import RecursiveCharacterTextSplitter  # Text splitting utility
+from .text_chunker import TextChunker, page_of
+
+class MappedFile(mmap.mmap):
+    """Read-only memory map usable as a binary file, i.e. by 'zipfile' which checks 'seekable'."""
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
 
 class DocumentParser:
     """
@@ -12,9 +22,18 @@ class DocumentParser:
 
     Attributes:
         buffer: bytes
-            The raw content of the document.
+            The raw content of the document. Loaded on first access, prefer 'open_stream'.
+        source: Optional[str]
+            Path of the document, None if it is loaded from a file-like object.
+        version: str
+            Version of the extraction logic. Bump it whenever the extracted text or its chunks change.
+        paginated: bool
+            Whether each extracted text segment is a page of the document.
     """
 
+    version: str = "4"
+    paginated: bool = False
+
     def __init__(self, document: Union[str, Path, IO[bytes]]) -> None:
         """
         Initialize the DocumentParser.
@@ -23,19 +42,45 @@ class DocumentParser:
             document: Union[str, Path, IO[bytes]]
                 Path to the document file or file-like object containing the document content.
         """
-        # Type checking.
+        self.source = None
+        self._reader = None
+        self._buffer = None
+
+        # Type checking. Document content is not read until extraction.
         if isinstance(document, str):
-            document = Path(document)
-            reader = document.open("rb")
+            self.source = str(Path(document))
         elif isinstance(document, Path):
-            reader = document.open("rb")
-        elif isinstance(document, IO):
-            reader = document
+            self.source = str(document)
+        elif hasattr(document, "read") and hasattr(document, "seek"):
+            self._reader = document
         else:
             raise TypeError(f"Unsupported type: {type(document)}")
 
-        # Load document into buffer.
-        self.buffer = reader.read()
+    @property
+    def buffer(self) -> bytes:
+        if self._buffer is None:
+            stream = self.open_stream()
+            stream.seek(0)
+            self._buffer = stream.read()
+        return self._buffer
+
+    def open_stream(self) -> IO[bytes]:
+        """
+        Open a seekable binary stream over the document content.
+        Files are memory-mapped, so pages are loaded by the OS on demand instead of copied into a buffer.
+
+        Returns:
+            IO[bytes]:
+                A readable and seekable stream positioned at the beginning of the document.
+        """
+        if self.source is None:
+            self._reader.seek(0)
+            return self._reader
+
+        with open(self.source, "rb") as f:
+            if f.seek(0, 2) == 0: # Empty file cannot be memory-mapped.
+                return open(self.source, "rb")
+            return MappedFile(f.fileno(), 0, access=mmap.ACCESS_READ)
 
     def parse(self, chunk_size: int, chunk_overlap: int) -> List[Document]:
         """
@@ -51,11 +96,69 @@ class DocumentParser:
             List[Document]:
                 A list of Document objects representing the parsed chunks.
         """
-        extracted_text_list = self.extract_raw_text()
-        extracted_text = "\n".join(extracted_text_list)
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-        all_splits = text_splitter.create_documents([extracted_text])
-        return all_splits
+        return list(self.iter_parse(chunk_size, chunk_overlap))
+
+    def iter_parse(self, chunk_size: int, chunk_overlap: int) -> Iterator[Document]:
+        """
+        Parse the document into chunks lazily, memory usage is bounded by the chunking window.
+        """
+        return self.iter_chunks(self.iter_raw_text(), chunk_size, chunk_overlap)
+
+    def chunk_segments(self, segments: Iterable[str], chunk_size: int, chunk_overlap: int, first_page: int = 1) -> List[Document]:
+        """
+        Split extracted text segments into chunks, and attach source and page to each chunk.
+
+        Parameters:
+            segments: Iterable[str]
+                Text segments returned by 'extract_raw_text' or 'iter_raw_text'.
+            chunk_size: int
+                The size of each chunk.
+            chunk_overlap: int
+                The overlap between adjacent chunks.
+            first_page: int
+                Page number of the first segment, for paginated documents.
+
+        Returns:
+            List[Document]:
+                A list of Document objects representing the parsed chunks.
+        """
+        return list(self.iter_chunks(segments, chunk_size, chunk_overlap, first_page))
+
+    def iter_chunks(self, segments: Iterable[str], chunk_size: int, chunk_overlap: int, first_page: int = 1) -> Iterator[Document]:
+        """
+        Incrementally split a stream of text segments into chunks.
+
+        Segments are joined by newline and chunked by 'TextChunker' in a single pass over a sliding window.
+        Each chunk records its offset in the joined text as 'start_index', its source, and the page
+        it starts on for paginated documents.
+        """
+        segment_offsets = []  # Offset of each segment in the joined text, for locating the page of a chunk.
+
+        def tracked(segments):
+            text_length = 0
+            for i, segment in enumerate(segments):
+                if i:
+                    text_length += 1  # Newline joining segments.
+                segment_offsets.append(text_length)
+                text_length += len(segment)
+                yield segment
+
+        for span in TextChunker(chunk_size, chunk_overlap).iter_spans(tracked(segments)):
+            metadata = {"source": self.source, "start_index": span.start}
+            if self.paginated and segment_offsets:
+                metadata["page"] = page_of(segment_offsets, span.start, first_page)
+            yield Document(page_content=span.text, metadata=metadata)
+
+    def iter_raw_text(self) -> Iterator[str]:
+        """
+        Extract raw text from the document lazily.
+        Parsers should override it when their format can be read incrementally.
+
+        Returns:
+            Iterator[str]:
+                An iterator of strings representing the extracted text from the document.
+        """
+        yield from self.extract_raw_text()
 
     @abstractmethod
     def extract_raw_text(self) -> List[str]:
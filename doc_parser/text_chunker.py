@@ -0,0 +1,158 @@
+"""
+Native text chunker.
+
+Splits a stream of text segments into chunks of at most 'chunk_size' characters in a single pass.
+Each chunk ends at the best boundary within its size, in this order of preference:
+paragraph, sentence (CJK and Latin), line, clause or word, and a plain character as last resort.
+Adjacent chunks overlap by up to 'chunk_overlap' characters, the next chunk starting at a boundary
+inside the tail of the previous one. Chunks are located by offsets in the joined text,
+so the text is only sliced once per chunk.
+"""
+import re
+import bisect
+from typing import Iterable, Iterator, List, NamedTuple, Tuple
+
+STREAM_WINDOW_CHUNKS = 16  # Text window of incremental chunking, in number of chunks.
+
+# Boundary priorities, lower is preferred.
+PARAGRAPH, SENTENCE, LINE, WORD = range(4)
+
+# A boundary is the offset where a chunk may end, separators are stripped from chunk ends.
+# Each pattern gives boundaries at the start or at the end of its matches.
+_BOUNDARY_PATTERNS = [
+    (PARAGRAPH, re.compile(r"\n[ \t\u3000]*\n"), False),
+    (SENTENCE, re.compile(r"[\u3002\uff01\uff1f\uff0e][\u300d\u300f\uff09\u3011\"'\u201d\u2019)]*"), True),  # 。！？． and closing brackets.
+    (SENTENCE, re.compile(r"[.!?][\"'\u201d\u2019)\]]*(?=\s)"), True),
+    (LINE, re.compile(r"\n"), False),
+    (WORD, re.compile(r"[ \t\u3000]+"), False),
+    (WORD, re.compile(r"[\u3001\uff0c,;\uff1b:\uff1a]"), True),  # 、，,;；:：, stay with the chunk they end.
+]
+_PATTERNS_BY_PRIORITY = [[(pattern, at_end) for p, pattern, at_end in _BOUNDARY_PATTERNS if p == priority]
+                         for priority in (PARAGRAPH, SENTENCE, LINE, WORD)]
+
+# Characters a chunk cannot be cut between, so Latin words and numbers are never split.
+_WORD_CHAR = re.compile(r"[0-9A-Za-z\u00c0-\u024f]")
+
+# CJK ideographs, kana and hangul, any of them may start an overlap when there is no boundary.
+_CJK_CHAR = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]")
+
+class TextSpan(NamedTuple):
+    start: int  # Offset in the joined text.
+    text: str
+
+class TextChunker:
+    """
+    Incremental chunker over text segments joined by newline.
+
+    Attributes:
+        chunk_size: int
+            Maximum length of a chunk.
+        chunk_overlap: int
+            Maximum length shared by adjacent chunks.
+    """
+
+    def __init__(self, chunk_size: int, chunk_overlap: int) -> None:
+        if chunk_overlap > chunk_size:
+            raise ValueError(f"Got a larger chunk overlap ({chunk_overlap}) than chunk size ({chunk_size}), should be smaller.")
+        self.chunk_size = max(1, chunk_size)
+        self.chunk_overlap = max(0, chunk_overlap)
+
+    @staticmethod
+    def _char_boundary(text: str, offset: int) -> bool:
+        return not (_WORD_CHAR.match(text, offset - 1) and _WORD_CHAR.match(text, offset))
+
+    def _chunk_end(self, text: str, start: int, previous_end: int) -> int:
+        # A chunk must go past the previous one, so it is never made of overlap only.
+        limit = start + self.chunk_size
+        if limit >= len(text):
+            return len(text)
+        lowest = max(start, previous_end)
+        for priority in range(len(_PATTERNS_BY_PRIORITY)): # Last boundary of the best priority within the chunk.
+            end = -1
+            for pattern, at_end in _PATTERNS_BY_PRIORITY[priority]:
+                # One character past the limit, for the lookahead of sentence ends.
+                for match in pattern.finditer(text, lowest, limit + 1):
+                    position = match.end() if at_end else match.start()
+                    if lowest < position <= limit:
+                        end = max(end, position)
+            if end > 0:
+                return end
+        for end in range(limit, lowest, -1): # No boundary, cut between characters.
+            if self._char_boundary(text, end):
+                return end
+        return limit
+
+    def _next_start(self, text: str, start: int, end: int) -> int:
+        if self.chunk_overlap == 0:
+            return end
+        lowest = max(start + 1, end - self.chunk_overlap)
+        next_start = end
+        for _, pattern, at_end in _BOUNDARY_PATTERNS: # First boundary of any priority within the overlap.
+            match = pattern.search(text, lowest, end)
+            if match is not None:
+                next_start = min(next_start, match.end() if at_end else match.start())
+        if next_start < end:
+            return next_start
+        for offset in range(lowest, end): # CJK text without punctuation, overlap by characters.
+            if _CJK_CHAR.match(text, offset):
+                return offset
+        return end
+
+    def _split(self, text: str, final: bool) -> Tuple[List[TextSpan], int]:
+        """
+        Chunk 'text'. Unless 'final', stop before the last chunk as the text may continue.
+
+        Returns:
+            Tuple[List[TextSpan], int]:
+                Chunks with their offsets in 'text', and the offset to resume from.
+        """
+        spans = []
+        start = previous_end = 0
+        while True:
+            while start < len(text) and text[start].isspace():
+                start += 1
+            if start >= len(text):
+                return spans, start
+            # One more character is needed to know whether a sentence ends at the limit.
+            if not final and start + self.chunk_size + 1 >= len(text):
+                return spans, start
+
+            end = self._chunk_end(text, start, previous_end)
+            stripped_end = end
+            while stripped_end > start and text[stripped_end - 1].isspace():
+                stripped_end -= 1
+            spans.append(TextSpan(start, text[start:stripped_end]))
+            if end >= len(text):
+                return spans, end
+            start = self._next_start(text, start, end)
+            previous_end = end
+
+    def iter_spans(self, segments: Iterable[str]) -> Iterator[TextSpan]:
+        """
+        Chunk segments joined by newline, holding only a window of a few chunks in memory.
+
+        Returns:
+            Iterator[TextSpan]:
+                Chunks with their offsets in the joined text.
+        """
+        flush_size = self.chunk_size * STREAM_WINDOW_CHUNKS
+        window = ""        # Text not chunked yet.
+        window_offset = 0  # Offset of the window in the joined text.
+
+        for i, segment in enumerate(segments):
+            window = window + "\n" + segment if i else segment
+            if len(window) < flush_size:
+                continue
+            spans, resume = self._split(window, final=False)
+            for span in spans:
+                yield TextSpan(window_offset + span.start, span.text)
+            window = window[resume:]
+            window_offset += resume
+
+        spans, _ = self._split(window, final=True)
+        for span in spans:
+            yield TextSpan(window_offset + span.start, span.text)
+
+def page_of(segment_offsets: List[int], offset: int, first_page: int = 1) -> int:
+    # Page of an offset in the joined text, from the offset of each page segment.
+    return first_page + bisect.bisect_right(segment_offsets, offset) - 1
@@ -1,58 +1,276 @@
 from pathlib import Path
-from typing import List, NamedTuple, IO, Tuple
-from langchain_community.embeddings import HuggingFaceInferenceAPIEmbeddings
+import time
+import uuid
+import hashlib
+from typing import List, NamedTuple, IO, Tuple, Optional, Dict
+import numpy as np
 from langchain_community.vectorstores import FAISS
 from langchain_core.documents.base import Document
-from webui_config import EmbeddingModelConfig
+from langchain_core.embeddings import Embeddings
+from webui_config import EmbeddingModelConfig, VectorIndexConfig
+from index_cache import EmbeddingIndexCache, entry_key, file_digest
+from embedding_client import TeiEmbeddings
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from vector_index import create_faiss_index, needs_rebuild, supports_removal
+from chunk_store import ChunkStore
+from metrics import record, span
 
-from doc_parser import create_paeser
-MAX_EMBEDDING_BATCH_SIZE = 32 # Hard limit for embedding batch size.
+from doc_parser import parse_many, parser_id
+
+HYBRID_FETCH_FACTOR = 4  # Candidates fetched from each index for fusion, in multiples of top-k.
+HYBRID_MIN_FETCH = 20
 
 class RagParameters(NamedTuple):
     chunk_size: int
     chunk_overlap: int
     top_k: int
+    hybrid: bool = True  # Fuse BM25 and vector search results.
     @classmethod
-    def new_rag_parameter(cls, chunk_size, chunk_overlap, top_k=3):
+    def new_rag_parameter(cls, chunk_size, chunk_overlap, top_k=3, hybrid=True):
         return cls(chunk_size=chunk_size,
                    chunk_overlap=chunk_overlap, 
-                   top_k=top_k)
+                   top_k=top_k,
+                   hybrid=hybrid)
+
+def build_vector_store(documents: List[Document], vectors: np.ndarray, embeddings: Embeddings, ids: Optional[List[str]]=None, index_config: Optional[VectorIndexConfig]=None) -> FAISS:
+    # Build the whole index in a single pass from precomputed vectors, no intermediate store and merge.
+    index = create_faiss_index(vectors, index_config or VectorIndexConfig(index_type="flat"))
+
+    document_ids = ids or [uuid.uuid4().hex for _ in documents]
+    docstore = ChunkStore()  # Documents are packed into columns, not kept.
+    docstore.add(dict(zip(document_ids, documents)))
+    index_to_docstore_id = dict(enumerate(document_ids))
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+def load_document_chunks(file_paths: List[str], embedding_config: EmbeddingModelConfig, chunk_size: int, chunk_overlap: int, embeddings: TeiEmbeddings, index_cache: Optional[EmbeddingIndexCache]=None, file_digests: Optional[List[str]]=None) -> List[Tuple[List[Document], np.ndarray]]:
+    # Load chunks and vectors of documents, in the order of 'file_paths'.
+    results: Dict[str, Tuple[List[Document], np.ndarray]] = {}
+    cache_keys: Dict[str, str] = {}
+    if index_cache is not None:
+        file_digests = file_digests or [file_digest(f) for f in file_paths]
+        for file_path, digest in zip(file_paths, file_digests):
+            cache_keys[file_path] = entry_key(digest, parser_id(file_path), chunk_size, chunk_overlap, embedding_config)
+            cached = index_cache.load(cache_keys[file_path])
+            if cached is not None: # Cache hit, no parsing and embedding needed.
+                for d in cached[0]: # Entry may be stored by another session, point chunks to this copy.
+                    d.metadata["source"] = file_path
+                results[file_path] = cached
+
+    # Parse all missing documents in parallel, then embed them document by document.
+    missing = [f for f in file_paths if f not in results]
+    parsed: Dict[str, List[Document]] = {f: [] for f in missing}
+    source_to_path = {str(Path(f)): f for f in missing}  # Parsers record normalized paths as source.
+    timings: List[Tuple[str, float]] = []
+    for chunk in parse_many(missing, chunk_size, chunk_overlap, timings=timings):
+        parsed[source_to_path[chunk.metadata["source"]]].append(chunk)
+    for file_path, seconds in timings: # Measured by the workers, tasks ran in parallel.
+        record("parse", time.perf_counter() - seconds, seconds, document=Path(file_path).suffix)
+
+    for file_path, document_chunks in parsed.items():
+        vectors = embeddings.embed_matrix([d.page_content for d in document_chunks])
+        if file_path in cache_keys:
+            index_cache.store(cache_keys[file_path], document_chunks, vectors)
+        results[file_path] = (document_chunks, vectors)
+
+    return [results[f] for f in file_paths]
+
+class SessionVectorStore:
+    """
+    Vector store of the documents uploaded in one user session.
+
+    Documents are embedded once when added, and their vectors are deleted by ID when removed,
+    so other documents of the session are never re-embedded. The vectors of each document are kept, so an
+    index that must be rebuilt is rebuilt from the original vectors, not from its own lossy codes.
+
+    Attributes:
+        db: Optional[FAISS]
+            The underlying vector store, None if there is no document chunk.
+        lexical_index: BM25Index
+            BM25 index of the same chunks, sharing docstore IDs with 'db'.
+        document_ids: Dict[str, List[str]]
+            Docstore IDs of the chunks of each document, keyed by document path.
+        document_digests: Dict[str, str]
+            Content hash of each document, keyed by document path.
+        document_vectors: Dict[str, np.ndarray]
+            Embedding matrix of the chunks of each document, keyed by document path, in 'document_ids' order.
+    """
+
+    def __init__(self, embedding_config: EmbeddingModelConfig, chunk_size: int, chunk_overlap: int, index_cache: Optional[EmbeddingIndexCache]=None, index_config: Optional[VectorIndexConfig]=None, embeddings: Optional[TeiEmbeddings]=None) -> None:
+        if embedding_config.provider.lower() != "huggingface": raise NotImplemented
+
+        self.embedding_config = embedding_config
+        self.index_config = index_config or VectorIndexConfig()
+        self.embeddings = embeddings or TeiEmbeddings(embedding_config)  # Can be shared by sessions, it holds a connection pool.
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.index_cache = index_cache
+        self.db: Optional[FAISS] = None
+        self.lexical_index = BM25Index()
+        self.document_ids: Dict[str, List[str]] = {}
+        self.document_digests: Dict[str, str] = {}
+        self.document_vectors: Dict[str, np.ndarray] = {}
+
+    @property
+    def documents(self) -> List[str]:
+        return list(self.document_ids)
+
+    @property
+    def document_set_hash(self) -> str:
+        # Identify the set of documents in store, regardless of their names and order.
+        return hashlib.sha256("\x00".join(sorted(self.document_digests.values())).encode("utf-8")).hexdigest()
+
+    def add_documents(self, file_paths, file_digests: Optional[List[str]]=None) -> None:
+        """
+        Add documents, only their own chunks are embedded.
+        Content hashes of the documents can be given if the caller already has them.
+        """
+        known_digests = dict(zip([str(f) for f in file_paths], file_digests or []))
+        file_paths = [str(f) for f in file_paths if str(f) not in self.document_ids]
+        file_paths = list(dict.fromkeys(file_paths))  # Drop duplicates, keep order.
+        if not file_paths:
+            return
+
+        file_digests = [known_digests.get(f) or file_digest(f) for f in file_paths]
+        loaded = load_document_chunks(file_paths, self.embedding_config, self.chunk_size, self.chunk_overlap, self.embeddings, self.index_cache, file_digests)
+        for file_path, digest, (document_chunks, vectors) in zip(file_paths, file_digests, loaded):
+            ids = [uuid.uuid4().hex for _ in document_chunks]
+            self.document_ids[file_path] = ids
+            self.document_digests[file_path] = digest
+            if not document_chunks: # Nothing to index.
+                continue
+
+            self.document_vectors[file_path] = vectors  # Memory-mapped when loaded from the index cache.
+
+            self.lexical_index.add_many(zip(ids, [d.page_content for d in document_chunks]))
+            if self.db is None:
+                self.db = build_vector_store(document_chunks, vectors, self.embeddings, ids, self.index_config)
+            else:
+                self.db.add_embeddings(zip([d.page_content for d in document_chunks], vectors),
+                                       metadatas=[d.metadata for d in document_chunks],
+                                       ids=ids)
+
+        # Switch index type, or retrain it, once the store grows.
+        if self.db is not None and needs_rebuild(self.db.index, self.index_config):
+            self._rebuild_index()
+
+    def _rebuild_index(self) -> None:
+        # Rebuild the index from the kept vectors of the documents, without re-embedding. Vectors are never
+        # reconstructed from the index, IVF-PQ and half precision indexes only hold approximations of them.
+        file_paths = [f for f in self.document_ids if f in self.document_vectors]
+        if not file_paths:
+            self.db = None
+            return
+
+        ids = [doc_id for f in file_paths for doc_id in self.document_ids[f]]
+        vectors = np.vstack([self.document_vectors[f] for f in file_paths])
+        # Chunks stay in the same docstore, only the index is rebuilt.
+        self.db = FAISS(self.embeddings, create_faiss_index(vectors, self.index_config), self.db.docstore, dict(enumerate(ids)))
+
+    def add_document(self, file_path) -> None:
+        """
+        Add a document, only its own chunks are embedded.
+        """
+        self.add_documents([file_path])
+
+    def remove_document(self, file_path) -> None:
+        """
+        Remove a document and delete its vectors by ID, or rebuild the index if it cannot remove vectors in place.
+        """
+        ids = self.document_ids.pop(str(file_path), None)
+        self.document_digests.pop(str(file_path), None)
+        self.document_vectors.pop(str(file_path), None)
+        if not ids or self.db is None:
+            return
+
+        for doc_id in ids:
+            self.lexical_index.remove(doc_id)
+        if not any(self.document_ids.values()): # Last document removed.
+            self.db = None
+        elif supports_removal(self.db.index):
+            self.db.delete(ids)
+        else:
+            self.db.docstore.delete(ids)
+            self._rebuild_index()
+
+    def sync(self, file_paths, file_digests: Optional[List[str]]=None) -> None:
+        """
+        Make the store hold exactly the given documents, adding and removing the difference.
+        """
+        file_paths = [str(f) for f in file_paths]
+        for file_path in set(self.document_ids) - set(file_paths):
+            self.remove_document(file_path)
+        self.add_documents(file_paths, file_digests)
+
+    def set_chunk_parameters(self, chunk_size: int, chunk_overlap: int) -> None:
+        """
+        Change chunk parameters. All documents are re-chunked, which hits the index cache for known parameters.
+        """
+        if (chunk_size, chunk_overlap) == (self.chunk_size, self.chunk_overlap):
+            return
+
+        file_paths = self.documents
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.db = None
+        self.lexical_index = BM25Index()
+        self.document_ids = {}
+        self.document_digests = {}
+        self.document_vectors = {}
+        self.sync(file_paths)
+
+    def similarity_search_with_score(self, query: str, k: int) -> List[Tuple[Document, float]]:
+        if self.db is None:
+            return []
+        return self.db.similarity_search_with_score(query, k=k)
+
+    def hybrid_search_with_score(self, query: str, k: int) -> List[Tuple[Document, float]]:
+        """
+        Fuse vector and BM25 search with reciprocal rank fusion.
+
+        Returns:
+            List[Tuple[Document, float]]:
+                Top-k chunks with their fusion scores, higher is better.
+        """
+        if self.db is None:
+            return []
+        return hybrid_search(self.db, self.lexical_index, self.embeddings, query, k)
 
-def topk_documents(query: str, embedding_config: EmbeddingModelConfig, rag_param: RagParameters, document_path_list:List[str]) -> List[Tuple[Document, float]]:
+def hybrid_search(db: FAISS, lexical_index: BM25Index, embeddings: Embeddings, query: str, k: int) -> List[Tuple[Document, float]]:
+    # Vector and BM25 candidates share docstore IDs, fuse their rankings.
+    fetch_k = max(k * HYBRID_FETCH_FACTOR, HYBRID_MIN_FETCH)
 
-    if embedding_config.provider.lower() != "huggingface": raise NotImplemented
+    # Vector search, by index position then mapped to docstore ID.
+    query_vector = np.asarray([embeddings.embed_query(query)], dtype=np.float32)
+    _, positions = db.index.search(query_vector, min(fetch_k, db.index.ntotal))
+    dense_ids = [db.index_to_docstore_id[i] for i in positions[0] if i != -1]
 
-    # Every elements in 'document_list' is a 'path' to pdf file.
-    all_document = []  # Placeholder for all seprated document segments.
+    lexical_ids = [doc_id for doc_id, _ in lexical_index.search(query, fetch_k)]
 
-    # Load all document.
-    for file_path in document_path_list:
-        p = create_paeser(file_path)
-        document_chunks = p.parse(chunk_size=rag_param.chunk_size, chunk_overlap=rag_param.chunk_overlap)
-        all_document += document_chunks
+    fused = reciprocal_rank_fusion([dense_ids, lexical_ids])[:k]
+    return [(db.docstore.search(doc_id), score) for doc_id, score in fused]
 
-    # Retrive top-k document segments.
-    embeddings = HuggingFaceInferenceAPIEmbeddings(
-        api_key="",  # type: ignore Dummy API key.
-        api_url=embedding_config.endpoint
-    )
+def topk_documents(query: str, embedding_config: EmbeddingModelConfig, rag_param: RagParameters, document_path_list:List[str], index_cache: Optional[EmbeddingIndexCache]=None, vector_store: Optional[SessionVectorStore]=None, shared_corpus=None, document_digests: Optional[List[str]]=None) -> List[Tuple[Document, float]]:
 
-    # NOTE: Current issue: 'FAISS.from_documents' will STUPIDLY throw all segments of document to embedding model.
-    #       So it can cause embedding model dies if batch size is too large.
-    #       In the following strategy, first we divide all segment into 'batches' w.r.t. 'MAX_EMBEDDING_BATCH_SIZE'.
-    #       Then we create an initial 'vector store', for each batch, we create a temporial 'vector store' and merge to the first one.
+    # Without a session store, build a one-off store for this query.
+    if vector_store is None:
+        vector_store = SessionVectorStore(embedding_config, rag_param.chunk_size, rag_param.chunk_overlap, index_cache)
 
-    # Divide vector_store w.r.t. the maxium size of batch size (for not exceeding the max batch size of embedding).
-    cursor = min(MAX_EMBEDDING_BATCH_SIZE, len(all_document))
-    db = FAISS.from_documents(all_document[0:cursor], embeddings) # Initial batch.
+    # Every elements in 'document_list' is a 'path' to document file, only new documents are embedded.
+    with span("sync_documents", documents=len(document_path_list)):
+        vector_store.set_chunk_parameters(rag_param.chunk_size, rag_param.chunk_overlap)
+        vector_store.sync(document_path_list, document_digests)
 
-    while cursor < len(all_document):
-        cursor_next = min(cursor + MAX_EMBEDDING_BATCH_SIZE, len(all_document)) # Calculate next cursoe position.
-        _db_temp = FAISS.from_documents(all_document[cursor:cursor_next], embeddings) # Create temp vector store.
-        db.merge_from(_db_temp) # Merge vector stores.
-        cursor = cursor_next # Move cursor position.
-    
-    docs_score = db.similarity_search_with_score(query, k=rag_param.top_k)
+    # Search session documents, and the shared corpus if there is one.
+    sources = [vector_store] if shared_corpus is None else [vector_store, shared_corpus]
+    docs_score = []
+    for source in sources:
+        with span("search", source="session" if source is vector_store else "corpus", hybrid=rag_param.hybrid):
+            if rag_param.hybrid:
+                docs_score += source.hybrid_search_with_score(query, k=rag_param.top_k)
+            else:
+                docs_score += source.similarity_search_with_score(query, k=rag_param.top_k)
 
-    return docs_score
+    # Fusion scores are higher for better results, L2 distances are lower.
+    docs_score.sort(key=lambda x: x[1], reverse=rag_param.hybrid)
 
+    return docs_score[:rag_param.top_k]
@@ -0,0 +1,113 @@
+"""
+Embedding Client
+
+Client of text-embeddings-inference (TEI) '/embed' API.
+Documents are sent in batches, with several batches in flight over a pooled HTTP connection.
+"""
+import threading
+import collections
+import unicodedata
+from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from langchain_core.embeddings import Embeddings
+
+from webui_config import EmbeddingModelConfig
+from metrics import in_context, span
+
+QUERY_CACHE_SIZE = 1024  # Number of query embeddings kept in process.
+
+# Process-wide LRU cache of query embeddings, keyed by endpoint and normalized query.
+_query_cache: "collections.OrderedDict[Tuple[str, str], List[float]]" = collections.OrderedDict()
+_query_cache_lock = threading.Lock()
+
+def normalize_query(text: str) -> str:
+    # Retried or regenerated questions often differ only in character width or whitespace.
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+class TeiEmbeddings(Embeddings):
+    """
+    LangChain embeddings backed by a TEI endpoint.
+
+    Attributes:
+        embedding_config: EmbeddingModelConfig
+            Endpoint, batch size and concurrency of the embedding service.
+    """
+
+    def __init__(self, embedding_config: EmbeddingModelConfig) -> None:
+        self.embedding_config = embedding_config
+        self.embed_url = embedding_config.endpoint.rstrip("/") + "/embed"
+
+        # Keep-alive connections, one per request in flight.
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, embedding_config.concurrency))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        with span("embed_batch", size=len(texts)):
+            response = self.session.post(self.embed_url, json={"inputs": texts, "truncate": True}, timeout=self.embedding_config.timeout)
+            response.raise_for_status()
+            return response.json()
+
+    def embed_matrix(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts with pipelined batch requests.
+
+        Returns:
+            np.ndarray:
+                A float32 matrix, one row per text, in the same order as 'texts'.
+        """
+        batch_size = max(1, self.embedding_config.batch_size)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        if len(texts) <= batch_size: # Single request, i.e. a query, nothing to pipeline.
+            return np.asarray(self._embed_batch(texts), dtype=np.float32)
+
+        matrix = None  # Allocated once the embedding dimension is known.
+        with ThreadPoolExecutor(max_workers=max(1, self.embedding_config.concurrency)) as executor:
+            embed_batch = in_context(self._embed_batch)  # Batch spans join the trace of the caller.
+            futures = {executor.submit(embed_batch, texts[cursor:cursor + batch_size]): cursor
+                       for cursor in range(0, len(texts), batch_size)}
+            for future in as_completed(futures):
+                batch = np.asarray(future.result(), dtype=np.float32)
+                if matrix is None:
+                    matrix = np.empty((len(texts), batch.shape[1]), dtype=np.float32)
+                cursor = futures[future]
+                matrix[cursor:cursor + len(batch)] = batch  # Fill rows in place, batches may complete out of order.
+
+        return matrix
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_matrix(texts).tolist()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed several queries, cached ones are served from process cache and the rest in batch requests.
+        """
+        keys = [(self.embed_url, normalize_query(t)) for t in texts]
+        results = {}
+        with _query_cache_lock:
+            for key in keys:
+                if key in _query_cache:
+                    _query_cache.move_to_end(key)
+                    results[key] = _query_cache[key]
+
+        missing = list(dict.fromkeys(k for k in keys if k not in results))  # Drop duplicates, keep order.
+        if missing:
+            vectors = self.embed_matrix([text for _, text in missing]).tolist()
+            with _query_cache_lock:
+                for key, vector in zip(missing, vectors):
+                    results[key] = vector
+                    _query_cache[key] = vector
+                    _query_cache.move_to_end(key)
+                while len(_query_cache) > QUERY_CACHE_SIZE:
+                    _query_cache.popitem(last=False)
+
+        return [list(results[key]) for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_queries([text])[0]
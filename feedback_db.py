@@ -1,8 +1,20 @@
-from sqlalchemy import create_engine, MetaData, Table, Column
+import queue
+import atexit
+import threading
+import metrics
+from sqlalchemy import create_engine, event, MetaData, Table, Column
 from sqlalchemy import Integer, String
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
+# Default database URL, configurable with 'feedback-database' in config.yaml, i.e. a PostgreSQL URL.
+DEFAULT_DATABASE_URL = "sqlite:///feedback.db"
+
+# Writer settings.
+FEEDBACK_QUEUE_SIZE = 1024     # Feedbacks waiting to be written, further ones are dropped when it is full.
+FEEDBACK_BATCH_SIZE = 64       # Maximum feedbacks written in one transaction.
+FEEDBACK_FLUSH_INTERVAL = 1.0  # Seconds, the writer waits this long to gather a batch.
+
 # Create a MetaData object for the database tables
 Base = declarative_base()
 
@@ -15,27 +27,113 @@ class UserFeedback(Base):
     user_prompt = Column(String, nullable=False)  # Current prompt given by the user.
     response = Column(String, nullable=False)     # The response generated by the model.
 
+def create_feedback_engine(database_url: str):
+    engine = create_engine(database_url)
+
+    if engine.dialect.name == "sqlite":
+        # WAL lets readers work during writes, and syncing on checkpoints only is safe in WAL mode.
+        @event.listens_for(engine, "connect")
+        def set_sqlite_pragma(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute("PRAGMA busy_timeout=5000")
+            cursor.close()
+
+    # Create the users table
+    Base.metadata.create_all(engine)
+    return engine
+
+class FeedbackWriter:
+    """
+    Background writer of user feedbacks.
+
+    Feedbacks are put into a bounded queue, and a daemon thread writes them in batches,
+    one transaction per batch, so the UI thread never waits for the database.
+    If the database falls behind and the queue is full, new feedbacks are dropped and counted.
+    """
+
+    _STOP = object()  # Sentinel to stop the writer thread.
+
+    def __init__(self, engine) -> None:
+        self.Session = sessionmaker(bind=engine)
+        self.queue: "queue.Queue" = queue.Queue(maxsize=FEEDBACK_QUEUE_SIZE)
+        self.dropped = 0  # Feedbacks dropped because the queue was full.
+        self.thread = threading.Thread(target=self._run, name="feedback-writer", daemon=True)
+        self.thread.start()
+
+    def put(self, feedback: UserFeedback) -> None:
+        # Never blocks the caller, the Streamlit script thread.
+        try:
+            self.queue.put_nowait(feedback)
+        except queue.Full:
+            self.dropped += 1
+            metrics.FEEDBACK_DROPPED.inc()
+
+    def _write(self, batch) -> None:
+        with self.Session() as session:
+            try:
+                session.add_all(batch)
+                session.commit()
+            except Exception as ex:
+                session.rollback()
+                print("Exception caughted while writing feedback: ", ex)
+
+    def _run(self) -> None:
+        while True:
+            item = self.queue.get()
+            stop = item is self._STOP
+            batch = [] if stop else [item]
+
+            # Gather more feedbacks into this batch.
+            while not stop and len(batch) < FEEDBACK_BATCH_SIZE:
+                try:
+                    item = self.queue.get(timeout=FEEDBACK_FLUSH_INTERVAL)
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stop = True
+                else:
+                    batch.append(item)
+
+            if batch:
+                self._write(batch)
+            if stop:
+                return
+
+    def close(self) -> None:
+        """
+        Flush pending feedbacks and stop the writer.
+        """
+        if self.thread.is_alive():
+            self.queue.put(self._STOP)
+            self.thread.join()
+
+# Database engine and its writer, created on first use.
+engine = None
+writer: FeedbackWriter = None
+_init_lock = threading.Lock()
+
+def init_feedback_db(database_url: str = DEFAULT_DATABASE_URL) -> FeedbackWriter:
+    # Create database engine and start background writer once per process, and flush it on shutdown.
+    global engine, writer
+    with _init_lock:
+        if writer is None:
+            engine = create_feedback_engine(database_url)
+            writer = FeedbackWriter(engine)
+            atexit.register(writer.close)
+        return writer
+
 def feedback_insert(feedback: int, feedback_text: str, user_prompt: str, response: str):
-    # Create a session
-    Session = sessionmaker(bind=engine)
-    session = Session()
-
-    # Add a user feedback to the database
-    user = UserFeedback(feedback=feedback, 
-                        feedback_text=feedback_text, 
-                        user_prompt=user_prompt, 
+    # Add a user feedback to the database, written in background.
+    user = UserFeedback(feedback=feedback,
+                        feedback_text=feedback_text,
+                        user_prompt=user_prompt,
                         response=response)
-    
-    session.add(user)
-    session.commit()
-
 
-# Create a SQLite database engine
-engine = create_engine("sqlite:///feedback.db")
+    init_feedback_db().put(user)
 
-# Create the users table
-Base.metadata.create_all(engine)
 
 if __name__ == "__main__":
 
-    pass
\ No newline at end of file
+    pass
@@ -0,0 +1,116 @@
+"""
+Embedding Index Cache
+
+Content-addressed, on-disk cache of embedded document chunks.
+Each entry holds the chunks of one document and their embedding vectors, so a
+document is parsed and embedded only once for a given set of RAG parameters.
+Entries use the memory-mapped format of 'mmap_store', shared by all processes through the page cache.
+"""
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+from langchain_core.documents.base import Document
+
+from webui_config import EmbeddingModelConfig
+from mmap_store import MmapChunks, load_vectors, write_chunks, write_vectors
+
+ENTRY_FORMAT = "3"  # Part of entry keys, so entries of an older layout are never read.
+HASH_BLOCK_SIZE = 1024 * 1024  # Bytes read at once when hashing a file.
+
+def file_digest(path: Union[str, Path]) -> str:
+    # Hash file content in blocks, so large uploads are never fully loaded in memory.
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(HASH_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+def entry_key(file_hash: str, parser_id: str, chunk_size: int, chunk_overlap: int, embedding_config: EmbeddingModelConfig) -> str:
+    # Every component that changes the resulting vectors must be part of the key.
+    components = [ENTRY_FORMAT, file_hash, parser_id, str(chunk_size), str(chunk_overlap), embedding_config.provider, embedding_config.endpoint]
+    return hashlib.sha256("\x00".join(components).encode("utf-8")).hexdigest()
+
+class EmbeddingIndexCache:
+    """
+    Persistent cache of embedded document chunks with LRU eviction.
+
+    Attributes:
+        cache_folder: Path
+            Folder holding one sub-folder per cache entry.
+        max_size: int
+            Upper bound of the total cache size in bytes.
+        vector_dtype: str
+            Precision of stored vectors, 'float32' or 'float16'.
+    """
+
+    def __init__(self, cache_folder: Union[str, Path], max_size: int, vector_dtype: str = "float32") -> None:
+        self.cache_folder = Path(cache_folder)
+        self.max_size = max_size
+        self.vector_dtype = vector_dtype
+        self.cache_folder.mkdir(parents=True, exist_ok=True)
+
+    def load(self, key: str) -> Optional[Tuple[List[Document], np.ndarray]]:
+        """
+        Load an entry from cache.
+
+        Returns:
+            Optional[Tuple[List[Document], np.ndarray]]:
+                Chunks and their memory-mapped embedding matrix, or None on cache miss.
+        """
+        entry = self.cache_folder / key
+        try:
+            vectors = load_vectors(entry)
+            documents = list(MmapChunks(entry))
+            # Mark entry as recently used.
+            now = time.time()
+            os.utime(entry, (now, now))
+        except (FileNotFoundError, ValueError): # Missing, or evicted by another process meanwhile.
+            return None
+
+        return documents, vectors
+
+    def store(self, key: str, documents: List[Document], vectors: np.ndarray) -> None:
+        """
+        Store an entry in cache, then evict least recently used entries if cache is oversized.
+        """
+        # Write into a temporary folder first, then rename it, so concurrent sessions never see a partial entry.
+        staging = Path(tempfile.mkdtemp(prefix=".staging-", dir=self.cache_folder))
+        write_vectors(staging, vectors, self.vector_dtype)
+        write_chunks(staging, documents)
+
+        try:
+            os.replace(staging, self.cache_folder / key)
+        except OSError: # Entry already stored by another session.
+            shutil.rmtree(staging, ignore_errors=True)
+
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Remove least recently used entries until total size fits in 'max_size'.
+        """
+        entries = []
+        total_size = 0
+        for entry in self.cache_folder.iterdir():
+            if not entry.is_dir() or entry.name.startswith(".staging-"):
+                continue
+            try:
+                size = sum(f.stat().st_size for f in entry.iterdir())
+                entries.append((entry.stat().st_mtime, size, entry))
+            except FileNotFoundError: # Removed by another session.
+                continue
+            total_size += size
+
+        # Oldest entry first.
+        entries.sort(key=lambda x: x[0])
+        for _, size, entry in entries:
+            if total_size <= self.max_size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total_size -= size
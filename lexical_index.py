@@ -0,0 +1,228 @@
+"""
+Lexical Index
+
+Incremental BM25 inverted index over document chunks, to find exact identifiers
+(regulation numbers, form codes) that dense embeddings tend to miss.
+CJK text is indexed as character bigrams, so no word segmenter is needed.
+
+The postings of a read-only chunk set, i.e. a shared corpus snapshot, can be written once as
+columns and searched memory-mapped, so processes share them through the page cache:
+
+    bm25_terms.npy         Uint64 hash of each term, sorted.
+    bm25_offsets.npy       Int64 offsets of the postings of term 'i', 'offsets[i]' to 'offsets[i + 1]'.
+    bm25_doc_ids.npy       Int32 chunk position of each posting.
+    bm25_tfs.npy           Int32 term frequency of each posting.
+    bm25_doc_lengths.npy   Int32 number of terms of each chunk.
+"""
+import re
+import math
+import hashlib
+import collections
+import unicodedata
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple, Union
+
+import numpy as np
+
+# BM25 parameters.
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Reciprocal rank fusion constant, damps the weight of top ranks.
+RRF_K = 60
+
+TERMS_FILE = "bm25_terms.npy"
+OFFSETS_FILE = "bm25_offsets.npy"
+DOC_IDS_FILE = "bm25_doc_ids.npy"
+TFS_FILE = "bm25_tfs.npy"
+DOC_LENGTHS_FILE = "bm25_doc_lengths.npy"
+POSTINGS_FILES = [TERMS_FILE, OFFSETS_FILE, DOC_IDS_FILE, TFS_FILE, DOC_LENGTHS_FILE]
+
+# Latin letters and digits form a token together with inner '-', '_', '.', '/', i.e. 'A-123', 'v1.2'.
+# Any other CJK ideograph, kana or hangul is a single character.
+_TOKEN_PATTERN = re.compile(r"[0-9a-z]+(?:[-_./][0-9a-z]+)*|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]")
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into index terms. Latin words are kept whole, runs of CJK characters become
+    overlapping bigrams (a single CJK character stays a unigram).
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    terms = []
+    cjk_run: List[str] = []
+
+    def flush_cjk():
+        if len(cjk_run) == 1:
+            terms.append(cjk_run[0])
+        else:
+            terms.extend(a + b for a, b in zip(cjk_run, cjk_run[1:]))
+        cjk_run.clear()
+
+    last_end = 0
+    for match in _TOKEN_PATTERN.finditer(text):
+        token = match.group()
+        contiguous = match.start() == last_end
+        last_end = match.end()
+        if len(token) == 1 and not token.isascii(): # CJK character.
+            if cjk_run and not contiguous:
+                flush_cjk()
+            cjk_run.append(token)
+            continue
+        if cjk_run:
+            flush_cjk()
+        terms.append(token)
+    if cjk_run:
+        flush_cjk()
+    return terms
+
+class BM25Index:
+    """
+    Inverted index with BM25 scoring. Chunks can be added and removed at any time.
+
+    Attributes:
+        postings: Dict[str, Dict[str, int]]
+            Term frequency of each term in each chunk, keyed by term then chunk ID.
+        doc_terms: Dict[str, Dict[str, int]]
+            Term frequencies of each chunk, for removing it from postings.
+    """
+
+    def __init__(self) -> None:
+        self.postings: Dict[str, Dict[str, int]] = collections.defaultdict(dict)
+        self.doc_terms: Dict[str, Dict[str, int]] = {}
+        self.doc_length: Dict[str, int] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_length)
+
+    def add(self, doc_id: str, text: str) -> None:
+        if doc_id in self.doc_length:
+            self.remove(doc_id)
+        terms = collections.Counter(tokenize(text))
+        for term, tf in terms.items():
+            self.postings[term][doc_id] = tf
+        self.doc_terms[doc_id] = dict(terms)
+        self.doc_length[doc_id] = sum(terms.values())
+        self.total_length += self.doc_length[doc_id]
+
+    def add_many(self, items: Iterable[Tuple[str, str]]) -> None:
+        for doc_id, text in items:
+            self.add(doc_id, text)
+
+    def remove(self, doc_id: str) -> None:
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            posting = self.postings[term]
+            posting.pop(doc_id, None)
+            if not posting:
+                del self.postings[term]
+        self.total_length -= self.doc_length.pop(doc_id)
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """
+        Top-k chunk IDs with their BM25 scores, best first.
+        """
+        if not self.doc_length:
+            return []
+
+        num_docs = len(self.doc_length)
+        avg_length = self.total_length / num_docs or 1.0
+        scores: Dict[str, float] = collections.defaultdict(float)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (num_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, tf in posting.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_length[doc_id] / avg_length)
+                scores[doc_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:k]
+
+def term_hash(term: str) -> int:
+    # Stable across processes, unlike 'hash'. Collisions are negligible at 64 bits.
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+def write_postings(folder: Union[str, Path], texts: Iterable[str]) -> None:
+    """
+    Write the postings of texts, chunk 'i' being the 'i'-th text, as columns searched by 'MmapBM25Index'.
+    """
+    folder = Path(folder)
+    hashes, doc_ids, tfs, doc_lengths = array("Q"), array("i"), array("i"), array("i")
+    for i, text in enumerate(texts):
+        terms = collections.Counter(tokenize(text))
+        for term, tf in terms.items():
+            hashes.append(term_hash(term))
+            doc_ids.append(i)
+            tfs.append(tf)
+        doc_lengths.append(sum(terms.values()))
+
+    hashes = np.frombuffer(hashes, dtype=np.uint64)
+    order = np.argsort(hashes, kind="stable")  # Chunks stay in position order within a term.
+    terms, starts = np.unique(hashes[order], return_index=True)
+    np.save(folder / TERMS_FILE, terms)
+    np.save(folder / OFFSETS_FILE, np.append(starts, len(hashes)).astype(np.int64))
+    np.save(folder / DOC_IDS_FILE, np.frombuffer(doc_ids, dtype=np.int32)[order])
+    np.save(folder / TFS_FILE, np.frombuffer(tfs, dtype=np.int32)[order])
+    np.save(folder / DOC_LENGTHS_FILE, np.frombuffer(doc_lengths, dtype=np.int32))
+
+class MmapBM25Index:
+    """
+    Read-only BM25 index over postings written by 'write_postings', scored like 'BM25Index'.
+    Chunk IDs are chunk positions as strings. Only the postings of query terms are read.
+    """
+
+    def __init__(self, folder: Union[str, Path]) -> None:
+        folder = Path(folder)
+        self.terms = np.load(folder / TERMS_FILE, mmap_mode="r")
+        self.offsets = np.load(folder / OFFSETS_FILE, mmap_mode="r")
+        self.doc_ids = np.load(folder / DOC_IDS_FILE, mmap_mode="r")
+        self.tfs = np.load(folder / TFS_FILE, mmap_mode="r")
+        self.doc_lengths = np.load(folder / DOC_LENGTHS_FILE, mmap_mode="r")
+        self.total_length = int(self.doc_lengths.sum(dtype=np.int64))
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """
+        Top-k chunk IDs with their BM25 scores, best first.
+        """
+        num_docs = len(self.doc_lengths)
+        if not num_docs:
+            return []
+
+        avg_length = self.total_length / num_docs or 1.0
+        matched_ids, matched_scores = [], []
+        for term in set(tokenize(query)):
+            key = np.uint64(term_hash(term))
+            row = int(np.searchsorted(self.terms, key))
+            if row == len(self.terms) or self.terms[row] != key:
+                continue
+            start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+            doc_ids = np.asarray(self.doc_ids[start:end])
+            tfs = np.asarray(self.tfs[start:end], dtype=np.float64)
+            idf = math.log(1 + (num_docs - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc_ids] / avg_length)
+            matched_ids.append(doc_ids)
+            matched_scores.append(idf * tfs * (BM25_K1 + 1) / (tfs + norm))
+        if not matched_ids:
+            return []
+
+        doc_ids, inverse = np.unique(np.concatenate(matched_ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(matched_scores))
+        top = np.argsort(-scores, kind="stable")[:k]
+        return [(str(doc_ids[i]), float(scores[i])) for i in top]
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """
+    Fuse several ranked ID lists, each ID scores the sum of 1 / (k + rank) over the lists it appears in.
+    """
+    scores: Dict[str, float] = collections.defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda x: x[1], reverse=True)
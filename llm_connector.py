@@ -1,22 +1,28 @@
 """
 LLM Connector
 """
-from typing import NamedTuple, List
-from langchain_core.documents.base import Document
-
-# LangChain Libraries.
-#from langchain_openai import OpenAI # LangChain OpenAI Adapter
-from langchain.chains import LLMChain        # LangChain Library
-from langchain.prompts import PromptTemplate # LangChain Library
-from langchain_community.llms import HuggingFaceTextGenInference
+from typing import NamedTuple, List, Dict, Iterator, AsyncIterator, Optional, Callable, Deque, Tuple, Sequence, Union, TYPE_CHECKING
 
 import time
+import json
+import functools
+import hashlib
+import random
+import collections
+import asyncio
+import threading
+import weakref
+import warnings
+
+# HTTP clients (requests, aiohttp), tokenizer (tiktoken) and text generation inference APIs (text_generation)
+# are imported on first use, so importing this module stays cheap on UI startup.
 
-# Text generation inference APIs.
-import text_generation
-import text_generation.errors
+from webui_config import LlmModelConfig, DEFAULT_LLM_TOKENIZER
+import metrics
+from metrics import GenerationTimer
 
-from webui_config import LlmModelConfig
+if TYPE_CHECKING:
+    from langchain_core.documents.base import Document
 
 # Some prompt templates.
 
@@ -58,48 +64,632 @@ class LlmGenerationParameters(NamedTuple):
                    temperature=temperature, 
                    repetition_penalty=repetition_penalty)
 
-#
-def llm_stream_result(prompt: str, llm_model: LlmModelConfig, llm_parameter: LlmGenerationParameters):
-    # Check LLM service provider.
-    if llm_model.provider.lower() == "huggingface":
-        llm = HuggingFaceTextGenInference(
-            inference_server_url=llm_model.endpoint,
-            max_new_tokens=llm_parameter.max_new_tokens,
-            top_k=llm_parameter.top_k,
-            top_p=llm_parameter.top_p,
-            temperature=llm_parameter.temperature,
-            repetition_penalty=llm_parameter.repetition_penalty,
-        )                
-    else:
-        raise NotImplemented("May implement someday lol.")
-    
-    # This is the broker function that handles the limit of concurrent requests.
-    def streamer():
-        
-        while True: # Retry on overload.
-            try:
-                # If we get the resource, we can start streaming.
-                for token in llm.stream(prompt):
+# Overload retry policy, jittered exponential backoff.
+# Admission control keeps requests within the endpoint limit, so it is only a fallback,
+# i.e. when other frontends share the same endpoint.
+OVERLOAD_BACKOFF_BASE = 0.5  # Seconds, backoff of the first retry.
+OVERLOAD_BACKOFF_MAX = 8     # Seconds, upper bound of backoff.
+MAX_OVERLOAD_RETRIES = 20    # Give up after this many retries.
+
+QUEUE_STATUS_INTERVAL = 1.0  # Seconds between queue status callbacks while waiting.
+
+GENERATION_TIMEOUT = 120     # Seconds, same as LangChain's default for TGI.
+TYPICAL_P = 0.95             # LangChain's default for TGI, sent explicitly so outputs stay the same.
+ERROR_BODY_MAX_LENGTH = 500  # Characters of a non-JSON error response kept in the error message.
+
+def _tgi_errors():
+    # Error types of text-generation-inference, importing them loads the whole client library.
+    import text_generation.errors
+    return text_generation.errors
+
+class TgiClient:
+    """
+    Streaming client of text-generation-inference '/generate_stream' API.
+    Connections are kept alive and reused across requests, get instances from 'get_llm_client'.
+    """
+
+    def __init__(self, llm_model: LlmModelConfig) -> None:
+        self.llm_model = llm_model
+        self.stream_url = llm_model.endpoint.rstrip("/") + "/generate_stream"
+        import requests
+        self.session = requests.Session()
+        self._async_sessions = weakref.WeakKeyDictionary()  # One aiohttp session per event loop.
+
+    @staticmethod
+    def _request_body(prompt: str, llm_parameter: LlmGenerationParameters) -> dict:
+        # TGI rejects non-positive top_k/temperature and top_p >= 1, they mean 'disabled' here.
+        parameters = {
+            "max_new_tokens": llm_parameter.max_new_tokens,
+            "top_k": llm_parameter.top_k or None,
+            "top_p": llm_parameter.top_p if 0 < llm_parameter.top_p < 1 else None,
+            "temperature": llm_parameter.temperature or None,
+            "repetition_penalty": llm_parameter.repetition_penalty or None,
+            "typical_p": TYPICAL_P,
+        }
+        return {"inputs": prompt, "parameters": parameters, "stream": True}
+
+    @staticmethod
+    def _error_payload(body: str) -> dict:
+        # TGI answers errors in JSON, a proxy in front of it may answer plain text or HTML.
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            payload = None
+        if isinstance(payload, dict) and "error" in payload:
+            return payload
+        return {"error": body.strip()[:ERROR_BODY_MAX_LENGTH] or "Empty error response."}
+
+    @staticmethod
+    def _parse_event(status: int, line: bytes) -> Optional[str]:
+        # Decode a server-sent event, return token text, or None for non-text events.
+        payload = line.decode("utf-8").strip()
+        if not payload.startswith("data:"):
+            return None
+        event = json.loads(payload[len("data:"):])
+        if "token" not in event: # Error payload.
+            raise _tgi_errors().parse_error(status, event)
+        if event["token"].get("special"):
+            return None
+        return event["token"]["text"]
+
+    def stream(self, prompt: str, llm_parameter: LlmGenerationParameters) -> Iterator[str]:
+        with self.session.post(self.stream_url, json=self._request_body(prompt, llm_parameter), stream=True, timeout=GENERATION_TIMEOUT) as resp:
+            if resp.status_code != 200:
+                raise _tgi_errors().parse_error(resp.status_code, self._error_payload(resp.text))
+            for line in resp.iter_lines():
+                token = self._parse_event(resp.status_code, line)
+                if token is not None:
+                    yield token
+
+    async def astream(self, prompt: str, llm_parameter: LlmGenerationParameters) -> AsyncIterator[str]:
+        import aiohttp
+        loop = asyncio.get_running_loop()
+        session = self._async_sessions.get(loop)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=GENERATION_TIMEOUT))
+            self._async_sessions[loop] = session
+
+        async with session.post(self.stream_url, json=self._request_body(prompt, llm_parameter)) as resp:
+            if resp.status != 200:
+                raise _tgi_errors().parse_error(resp.status, self._error_payload(await resp.text()))
+            async for line in resp.content:
+                token = self._parse_event(resp.status, line)
+                if token is not None:
                     yield token
+
+def overload_backoff(attempt: int) -> float:
+    # Full jitter: a random delay up to the exponential bound, so retrying clients spread out.
+    return random.uniform(0, min(OVERLOAD_BACKOFF_MAX, OVERLOAD_BACKOFF_BASE * (2 ** attempt)))
+
+class AdmissionTicket:
+    """
+    A place in the admission queue of an 'AdmissionScheduler'.
+    """
+
+    def __init__(self, session_id: str) -> None:
+        self.session_id = session_id
+        self.admitted = False
+        self.admitted_at: Optional[float] = None
+        self.event = threading.Event()  # Set on admission, for threads.
+        self.future: Optional[asyncio.Future] = None  # Resolved on admission, for coroutines.
+
+    def _wake(self) -> None:
+        self.admitted = True
+        self.admitted_at = time.monotonic()
+        self.event.set()
+        if self.future is not None:
+            loop = self.future.get_loop()
+            loop.call_soon_threadsafe(lambda f=self.future: f.done() or f.set_result(None))
+
+class AdmissionScheduler:
+    """
+    Client-side admission control in front of an LLM endpoint.
+
+    At most 'limit' requests run at once. Waiting requests are queued per session and admitted
+    round-robin across sessions, so one user sending many requests cannot starve the others.
+    Waiters are woken as soon as a slot frees.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self.limit = max(1, limit)
+        self.active = 0
+        self._lock = threading.Lock()
+        self._queues: Dict[str, Deque[AdmissionTicket]] = {}  # Waiting tickets of each session.
+        self._order: Deque[str] = collections.deque()        # Round-robin order of sessions with waiting tickets.
+        self._service_time = None  # Moving average of request duration, in seconds.
+
+    def _admit_waiters(self) -> None:
+        # Called with lock held.
+        while self.active < self.limit and self._order:
+            session_id = self._order.popleft()
+            queue = self._queues[session_id]
+            ticket = queue.popleft()
+            if queue:
+                self._order.append(session_id)
+            else:
+                del self._queues[session_id]
+            self.active += 1
+            ticket._wake()
+
+    def enqueue(self, session_id: str = "") -> AdmissionTicket:
+        ticket = AdmissionTicket(session_id)
+        with self._lock:
+            if session_id not in self._queues:
+                self._queues[session_id] = collections.deque()
+                self._order.append(session_id)
+            self._queues[session_id].append(ticket)
+            self._admit_waiters()
+        return ticket
+
+    def cancel(self, ticket: AdmissionTicket) -> None:
+        """
+        Leave the queue, or release the slot if the ticket is already admitted.
+        """
+        with self._lock:
+            if ticket.admitted:
+                self.active -= 1
+                ticket.admitted = False  # Release only once.
+                duration = time.monotonic() - ticket.admitted_at
+                self._service_time = duration if self._service_time is None else 0.8 * self._service_time + 0.2 * duration
+            else:
+                queue = self._queues.get(ticket.session_id)
+                if queue is not None and ticket in queue:
+                    queue.remove(ticket)
+                    if not queue:
+                        del self._queues[ticket.session_id]
+                        self._order.remove(ticket.session_id)
+            self._admit_waiters()
+
+    release = cancel
+
+    @property
+    def outstanding(self) -> int:
+        # Running and waiting requests.
+        with self._lock:
+            return self.active + sum(len(queue) for queue in self._queues.values())
+
+    def queue_status(self, ticket: AdmissionTicket) -> Tuple[int, Optional[float]]:
+        """
+        Queue position of a waiting ticket, and estimated wait in seconds (None if unknown yet).
+        Position 0 means the ticket is the next one to be admitted.
+        """
+        with self._lock:
+            if ticket.admitted:
+                return 0, 0.0
+            queue = self._queues.get(ticket.session_id)
+            if queue is None or ticket not in queue:
+                return 0, None
+            rank = queue.index(ticket)  # Full rounds before this ticket.
+            my_turn = self._order.index(ticket.session_id)
+            # Tickets ahead: 'rank' full rounds of every session, plus sessions before us in current round.
+            position = sum(min(len(self._queues[s]), rank + (1 if i < my_turn else 0))
+                           for i, s in enumerate(self._order))
+            service_time = self._service_time
+
+        estimated_wait = None
+        if service_time is not None:
+            estimated_wait = (position // self.limit + 1) * service_time
+        return position, estimated_wait
+
+    def wait(self, ticket: AdmissionTicket, on_wait: Optional[Callable[[int, Optional[float]], None]] = None) -> None:
+        # Block until admitted, report queue status periodically.
+        while not ticket.event.wait(QUEUE_STATUS_INTERVAL):
+            if on_wait is not None:
+                on_wait(*self.queue_status(ticket))
+
+    async def await_admission(self, ticket: AdmissionTicket, on_wait: Optional[Callable[[int, Optional[float]], None]] = None) -> None:
+        # Wait without parking a thread, the scheduler resolves the future on admission.
+        loop = asyncio.get_running_loop()
+        ticket.future = loop.create_future()
+        if ticket.event.is_set(): # Admitted before the future was attached.
+            ticket.future.set_result(None)
+        while True:
+            try:
+                await asyncio.wait_for(asyncio.shield(ticket.future), QUEUE_STATUS_INTERVAL)
                 break
-            except text_generation.errors.OverloadedError: # Overload error.
-                time.sleep(5) # Wait for 5 seconds and continue.
-                continue
-    return streamer() # Return the generator.
-
-def craft_prompt(user_input, rag_content: List[Document]=[]):
-    prompt = PromptTemplate(
-        input_variables=["sys", "user"],
-        template=LLAMA_PROMPT_TEMPLATE,  # TODO: Ability to switch prompt templates.
-        partial_variables={"rag": ""},
-        )
-    # Prompt crafting.
-    user_prompt = prompt.partial(sys=SAMPLE_SYS_PROMPT)  # TODO: User defined system prompt.
+            except asyncio.TimeoutError:
+                if on_wait is not None:
+                    on_wait(*self.queue_status(ticket))
+
+# Process-wide client registry, one client (and connection pool) per model.
+_llm_clients: Dict[LlmModelConfig, TgiClient] = {}
+_llm_schedulers: Dict[LlmModelConfig, AdmissionScheduler] = {}
+_llm_routers: Dict[Tuple[LlmModelConfig, ...], "LlmRouter"] = {}
+_llm_clients_lock = threading.Lock()
+
+def get_llm_client(llm_model: LlmModelConfig) -> TgiClient:
+    # Check LLM service provider.
+    if llm_model.provider.lower() != "huggingface":
+        raise NotImplementedError("May implement someday lol.")
+
+    with _llm_clients_lock:
+        if llm_model not in _llm_clients:
+            _llm_clients[llm_model] = TgiClient(llm_model)
+        return _llm_clients[llm_model]
+
+def get_llm_scheduler(llm_model: LlmModelConfig) -> AdmissionScheduler:
+    with _llm_clients_lock:
+        if llm_model not in _llm_schedulers:
+            _llm_schedulers[llm_model] = AdmissionScheduler(llm_model.max_concurrent_requests)
+        return _llm_schedulers[llm_model]
+
+def get_llm_router(llm_models: Sequence[LlmModelConfig]) -> "LlmRouter":
+    """
+    Router over replicas of one model, shared by all sessions of the process.
+    """
+    llm_models = tuple(llm_models)
+    with _llm_clients_lock:
+        router = _llm_routers.get(llm_models)
+    if router is None: # Created outside the lock, endpoints get their clients from the registry.
+        created = LlmRouter(llm_models)
+        with _llm_clients_lock:
+            router = _llm_routers.setdefault(llm_models, created)
+        if router is not created: # Another session created it meanwhile.
+            created.close()
+    return router
+
+def close_llm_routers() -> None:
+    """
+    Stop the health checks of every router and forget them, i.e. at the end of a test or load run.
+    """
+    with _llm_clients_lock:
+        routers = list(_llm_routers.values())
+        _llm_routers.clear()
+    for router in routers:
+        router.close()
 
+def group_replicas(llm_models: Sequence[LlmModelConfig]) -> Dict[str, List[LlmModelConfig]]:
+    """
+    Endpoints by model name, in configuration order. Unnamed endpoints are replicas of one model.
+    """
+    groups: Dict[str, List[LlmModelConfig]] = {}
+    for llm_model in llm_models:
+        groups.setdefault(llm_model.model or DEFAULT_MODEL_NAME, []).append(llm_model)
+    return groups
+
+# Replica routing.
+DEFAULT_MODEL_NAME = "default"
+HEALTH_CHECK_INTERVAL = 5.0  # Seconds between health checks of an endpoint.
+HEALTH_CHECK_TIMEOUT = 2.0   # Seconds, an endpoint not answering in time is unhealthy.
+LATENCY_AVERAGE_WEIGHT = 0.2 # Weight of the last request in moving averages of endpoint latency.
+
+def _moving_average(average: Optional[float], value: float) -> float:
+    return value if average is None else (1 - LATENCY_AVERAGE_WEIGHT) * average + LATENCY_AVERAGE_WEIGHT * value
+
+class EndpointState:
+    """
+    Health and statistics of one endpoint of an 'LlmRouter'.
+    """
+
+    def __init__(self, llm_model: LlmModelConfig) -> None:
+        self.llm_model = llm_model
+        self.client = get_llm_client(llm_model)
+        self.scheduler = get_llm_scheduler(llm_model)
+        self.healthy = True
+        self.last_error: Optional[str] = None
+        self.requests = 0
+        self.overloads = 0
+        self.failures = 0
+        self.time_to_first_token: Optional[float] = None  # Moving averages in seconds, from admission.
+        self.duration: Optional[float] = None
+        self._lock = threading.Lock()
+        metrics.LLM_ENDPOINT_HEALTHY.set(1, endpoint=llm_model.endpoint)
+
+    @property
+    def load(self) -> float:
+        # Outstanding requests relative to capacity, replicas may have different limits.
+        return self.scheduler.outstanding / self.scheduler.limit
+
+    def set_healthy(self, healthy: bool, error: Optional[str] = None) -> None:
+        with self._lock:
+            self.healthy = healthy
+            if error is not None:
+                self.last_error = error
+        metrics.LLM_ENDPOINT_HEALTHY.set(int(healthy), endpoint=self.llm_model.endpoint)
+
+    def record(self, outcome: str, admitted: Optional[float] = None, first_token: Optional[float] = None) -> None:
+        # Outcome of one attempt: 'ok', 'overloaded' or 'failed'.
+        end = time.monotonic()
+        with self._lock:
+            self.requests += 1
+            if outcome == "overloaded":
+                self.overloads += 1
+            elif outcome == "failed":
+                self.failures += 1
+            else:
+                self.healthy = True  # Reachable again, a single endpoint is not health-checked.
+                if admitted is not None:
+                    self.duration = _moving_average(self.duration, end - admitted)
+            if admitted is not None and first_token is not None:
+                self.time_to_first_token = _moving_average(self.time_to_first_token, first_token - admitted)
+        metrics.LLM_ENDPOINT_REQUESTS.inc(endpoint=self.llm_model.endpoint, outcome=outcome)
+        if outcome == "ok":
+            metrics.LLM_ENDPOINT_HEALTHY.set(1, endpoint=self.llm_model.endpoint)
+        if admitted is not None and first_token is not None:
+            metrics.LLM_ENDPOINT_TIME_TO_FIRST_TOKEN.observe(first_token - admitted, endpoint=self.llm_model.endpoint)
+
+    def update_in_flight(self) -> None:
+        metrics.LLM_ENDPOINT_IN_FLIGHT.set(self.scheduler.outstanding, endpoint=self.llm_model.endpoint)
+
+    def check_health(self) -> None:
+        # TGI answers '/health' with 200 once the model is ready.
+        try:
+            resp = self.client.session.get(self.llm_model.endpoint.rstrip("/") + "/health", timeout=HEALTH_CHECK_TIMEOUT)
+            self.set_healthy(resp.status_code == 200, None if resp.status_code == 200 else f"Health check returned {resp.status_code}")
+        except Exception as ex:
+            self.set_healthy(False, f"{type(ex).__name__}: {ex}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"endpoint": self.llm_model.endpoint, "healthy": self.healthy, "outstanding": self.scheduler.outstanding,
+                    "active": self.scheduler.active, "requests": self.requests, "overloads": self.overloads,
+                    "failures": self.failures, "time_to_first_token": self.time_to_first_token,
+                    "duration": self.duration, "last_error": self.last_error}
+
+class LlmRouter:
+    """
+    Spreads requests over replicas of one model.
+
+    Each request goes to the healthy endpoint with the least outstanding requests, relative to its
+    'max_concurrent_requests', and waits in the admission queue of that endpoint. On overload, or when
+    an endpoint cannot be reached before the first token, the request fails over to another endpoint
+    at once, and backs off only after every endpoint refused it. Endpoints are health-checked in the
+    background, and marked down as soon as a request cannot reach them.
+
+    Attributes:
+        llm_model: LlmModelConfig
+            First endpoint, its limits and tokenizer stand for the model.
+        endpoints: List[EndpointState]
+            Replicas, in configuration order.
+    """
+
+    def __init__(self, llm_models: Sequence[LlmModelConfig]) -> None:
+        if not llm_models:
+            raise ValueError("Got no LLM endpoint to route to.")
+        self.llm_model = llm_models[0]
+        self.endpoints = [EndpointState(m) for m in llm_models]
+        self._stop = threading.Event()
+        self._health_thread: Optional[threading.Thread] = None
+        if len(self.endpoints) > 1: # A single endpoint is tried anyway, no need to check it.
+            self._health_thread = threading.Thread(target=self._health_loop, name="llm-health-check", daemon=True)
+            self._health_thread.start()
+
+    def _health_loop(self) -> None:
+        while not self._stop.is_set():
+            for endpoint in self.endpoints:
+                if self._stop.is_set():
+                    return
+                endpoint.check_health()
+            self._stop.wait(HEALTH_CHECK_INTERVAL)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop health checks, waiting up to 'timeout' seconds for a check in progress.
+        Requests can still be routed afterwards, by the last known health of the endpoints.
+        """
+        self._stop.set()
+        if self._health_thread is not None:
+            self._health_thread.join(timeout)
+
+    def select(self, exclude: Sequence[EndpointState] = ()) -> EndpointState:
+        candidates = [e for e in self.endpoints if e not in exclude] or self.endpoints
+        # If no endpoint is healthy, health may be stale, try them anyway.
+        healthy = [e for e in candidates if e.healthy] or candidates
+        return min(healthy, key=lambda e: (e.load, random.random()))  # Random among equally loaded ones.
+
+    def stats(self) -> List[dict]:
+        """
+        Health, load and latency of each endpoint, for operations.
+        """
+        return [endpoint.stats() for endpoint in self.endpoints]
+
+    def _round_refused(self, tried: List[EndpointState], endpoint: EndpointState) -> bool:
+        # Note a refused attempt, True once every endpoint refused, the request then backs off before a new round.
+        tried.append(endpoint)
+        if len(tried) < len(self.endpoints):
+            return False
+        tried.clear()
+        return True
+
+    def stream(self, prompt: str, llm_parameter: LlmGenerationParameters, session_id: str = "",
+               on_wait: Optional[Callable[[int, Optional[float]], None]] = None) -> Iterator[str]:
+        errors = _tgi_errors()
+        import requests
+        connection_errors = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+        timer = GenerationTimer(self.llm_model.model or self.llm_model.endpoint)
+        tried: List[EndpointState] = []
+        try:
+            for attempt in range(MAX_OVERLOAD_RETRIES):
+                endpoint = self.select(exclude=tried)
+                ticket = endpoint.scheduler.enqueue(session_id)
+                endpoint.update_in_flight()
+                admitted = first_token = None
+                try:
+                    endpoint.scheduler.wait(ticket, on_wait)
+                    admitted = time.monotonic()
+                    timer.on_admitted()
+                    for token in endpoint.client.stream(prompt, llm_parameter):
+                        if first_token is None:
+                            first_token = time.monotonic()
+                        timer.on_token()
+                        yield token
+                    endpoint.record("ok", admitted, first_token)
+                    return
+                except errors.OverloadedError: # Overload error, endpoint is shared with others.
+                    endpoint.record("overloaded", admitted)
+                except connection_errors as ex:
+                    endpoint.record("failed", admitted, first_token)
+                    endpoint.set_healthy(False, f"{type(ex).__name__}: {ex}")
+                    if first_token is not None or not any(e.healthy for e in self.endpoints):
+                        raise # Part of the answer is shown already, or no endpoint to fail over to.
+                finally:
+                    endpoint.scheduler.release(ticket) # Also leaves the queue if the stream is closed while waiting.
+                    endpoint.update_in_flight()
+
+                timer.on_retry()
+                if self._round_refused(tried, endpoint): # Otherwise fail over at once.
+                    time.sleep(overload_backoff(attempt))
+            raise errors.OverloadedError("LLM service is still overloaded after retries.")
+        finally:
+            timer.finish()
+
+    async def astream(self, prompt: str, llm_parameter: LlmGenerationParameters, session_id: str = "",
+                      on_wait: Optional[Callable[[int, Optional[float]], None]] = None) -> AsyncIterator[str]:
+        errors = _tgi_errors()
+        import aiohttp
+        connection_errors = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+        timer = GenerationTimer(self.llm_model.model or self.llm_model.endpoint)
+        tried: List[EndpointState] = []
+        try:
+            for attempt in range(MAX_OVERLOAD_RETRIES):
+                endpoint = self.select(exclude=tried)
+                ticket = endpoint.scheduler.enqueue(session_id)
+                endpoint.update_in_flight()
+                admitted = first_token = None
+                try:
+                    await endpoint.scheduler.await_admission(ticket, on_wait)
+                    admitted = time.monotonic()
+                    timer.on_admitted()
+                    async for token in endpoint.client.astream(prompt, llm_parameter):
+                        if first_token is None:
+                            first_token = time.monotonic()
+                        timer.on_token()
+                        yield token
+                    endpoint.record("ok", admitted, first_token)
+                    return
+                except errors.OverloadedError:
+                    endpoint.record("overloaded", admitted)
+                except connection_errors as ex:
+                    endpoint.record("failed", admitted, first_token)
+                    endpoint.set_healthy(False, f"{type(ex).__name__}: {ex}")
+                    if first_token is not None or not any(e.healthy for e in self.endpoints):
+                        raise
+                finally:
+                    endpoint.scheduler.release(ticket)
+                    endpoint.update_in_flight()
+
+                timer.on_retry()
+                if self._round_refused(tried, endpoint):
+                    await asyncio.sleep(overload_backoff(attempt))
+            raise errors.OverloadedError("LLM service is still overloaded after retries.")
+        finally:
+            timer.finish()
+
+def _router_of(llm_model: Union[LlmModelConfig, Sequence[LlmModelConfig]]) -> LlmRouter:
+    # A single endpoint is routed as a model with one replica.
+    return get_llm_router([llm_model] if isinstance(llm_model, LlmModelConfig) else llm_model)
+
+#
+def llm_stream_result(prompt: str, llm_model: Union[LlmModelConfig, Sequence[LlmModelConfig]], llm_parameter: LlmGenerationParameters, session_id: str = "", on_wait: Optional[Callable[[int, Optional[float]], None]] = None):
+    """
+    Stream generated tokens from an endpoint, or from replicas of a model through their router.
+    The request waits in the admission queue of an endpoint first,
+    'on_wait' is called periodically with queue position and estimated wait in seconds.
+    """
+    router = _router_of(llm_model)
+    return router.stream(prompt, llm_parameter, session_id, on_wait) # Return the generator.
+
+async def allm_stream_result(prompt: str, llm_model: Union[LlmModelConfig, Sequence[LlmModelConfig]], llm_parameter: LlmGenerationParameters, session_id: str = "", on_wait: Optional[Callable[[int, Optional[float]], None]] = None) -> AsyncIterator[str]:
+    """
+    Asynchronous variant of 'llm_stream_result', no thread is parked while waiting for tokens.
+    """
+    router = _router_of(llm_model)
+    async for token in router.astream(prompt, llm_parameter, session_id, on_wait):
+        yield token
+
+# Token counting.
+TOKEN_BUDGET_MARGIN = 0.9  # Local tokenizer differs from the model's, keep some headroom.
+CHUNK_TOKEN_CACHE_SIZE = 4096  # Token counts of RAG chunks kept, by chunk digest.
+
+class PromptTokenUsage(NamedTuple):
+    system: int       # Tokens of system prompt.
+    rag: int          # Tokens of RAG context, including its instructions.
+    user: int         # Tokens of user input.
+    total: int        # Tokens of the whole prompt.
+    budget: Optional[int]  # Prompt token budget, None if unlimited.
+    rag_chunks_used: int     # Number of RAG chunks packed into prompt.
+    rag_chunks_dropped: int  # Number of RAG chunks left out for exceeding the budget.
+
+class CraftedPrompt(NamedTuple):
+    text: str
+    usage: PromptTokenUsage
+    rag_documents: List["Document"]  # RAG chunks packed into prompt, in relevance order.
+
+@functools.lru_cache(maxsize=None)
+def _get_encoding(name: str):
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(name)
+    except Exception as ex: # Encoding files unavailable, i.e. offline deployment.
+        warnings.warn(f"Cannot load tokenizer '{name}', estimating token count by characters: {ex}")
+        return None
+
+def count_tokens(text: str, tokenizer: str = DEFAULT_LLM_TOKENIZER) -> int:
+    encoding = _get_encoding(tokenizer)
+    if encoding is None:
+        return len(text)  # Roughly one token per character for CJK text, over-estimates Latin text.
+    return len(encoding.encode(text, disallowed_special=()))
+
+_chunk_token_counts: "collections.OrderedDict[Tuple[bytes, str], int]" = collections.OrderedDict()
+_chunk_token_counts_lock = threading.Lock()
+
+def _count_chunk_tokens(text: str, tokenizer: str) -> int:
+    # The same chunks are retrieved for many questions. Their counts are cached by digest, so the cache
+    # never keeps chunk texts alive. Prompts and user inputs rarely repeat and are counted every time.
+    key = (hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest(), tokenizer)
+    with _chunk_token_counts_lock:
+        count = _chunk_token_counts.get(key)
+        if count is not None:
+            _chunk_token_counts.move_to_end(key)
+            return count
+    count = count_tokens(text, tokenizer)
+    with _chunk_token_counts_lock:
+        _chunk_token_counts[key] = count
+        if len(_chunk_token_counts) > CHUNK_TOKEN_CACHE_SIZE:
+            _chunk_token_counts.popitem(last=False)  # Least recently used.
+    return count
+
+def prompt_token_budget(llm_model: LlmModelConfig, max_new_tokens: int) -> int:
+    # Prompt must fit in input limit, and leave room for generated tokens in total limit.
+    budget = min(llm_model.max_input_length, llm_model.max_total_tokens - max_new_tokens)
+    return max(0, int(budget * TOKEN_BUDGET_MARGIN))
+
+def craft_prompt(user_input, rag_content: List["Document"]=[], token_budget: Optional[int]=None, tokenizer: str=DEFAULT_LLM_TOKENIZER) -> CraftedPrompt:
+    """
+    Assemble the prompt. RAG chunks are expected in descending relevance, and are packed in that order
+    while they fit in 'token_budget'. Chunks that do not fit are skipped.
+    """
+    # Prompt crafting, same as an f-string PromptTemplate without pulling in langchain.
+    template = LLAMA_PROMPT_TEMPLATE  # TODO: Ability to switch prompt templates.
+    system_prompt = SAMPLE_SYS_PROMPT  # TODO: User defined system prompt.
+
+    rag_documents = []
+    rag_prompt = ""
     if rag_content:
-        rag_documents = "\n".join([x.page_content for x in rag_content])
-        rag_prompt = RAG_STEM + f"<context>\n{rag_documents}\n</context>\n"
-        user_prompt = user_prompt.partial(rag=rag_prompt)
-        
-    prompt = user_prompt.format(user=user_input) 
-    return prompt
\ No newline at end of file
+        if token_budget is None:
+            rag_documents = list(rag_content)
+        else:
+            # Pack chunks into what is left after the prompt without RAG context.
+            remaining = token_budget - count_tokens(template.format(sys=system_prompt, rag="", user=user_input), tokenizer) \
+                        - count_tokens(RAG_STEM + "<context>\n\n</context>\n", tokenizer)
+            for x in rag_content:
+                cost = _count_chunk_tokens(x.page_content + "\n", tokenizer)
+                if cost <= remaining:
+                    rag_documents.append(x)
+                    remaining -= cost
+
+    if rag_documents:
+        rag_text = "\n".join(x.page_content for x in rag_documents)
+        rag_prompt = RAG_STEM + f"<context>\n{rag_text}\n</context>\n"
+
+    prompt = template.format(sys=system_prompt, rag=rag_prompt, user=user_input)
+    usage = PromptTokenUsage(system=count_tokens(system_prompt, tokenizer),
+                             rag=count_tokens(rag_prompt, tokenizer),
+                             user=count_tokens(user_input, tokenizer),
+                             total=count_tokens(prompt, tokenizer),
+                             budget=token_budget,
+                             rag_chunks_used=len(rag_documents),
+                             rag_chunks_dropped=len(rag_content) - len(rag_documents))
+    return CraftedPrompt(text=prompt, usage=usage, rag_documents=rag_documents)
@@ -0,0 +1,291 @@
+"""
+Metrics
+
+Latency instrumentation of the RAG chat pipeline, standard library only.
+
+Stages are timed with 'span' into Prometheus-style histograms, exported in text format by
+'start_metrics_server'. Within a 'trace', spans are also collected per chat request and appended
+as one JSON line to the trace log, if one is configured. Recording is a lock and a few additions,
+cheap enough to be always on.
+"""
+import json
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+METRIC_PREFIX = "lmpoc_"
+
+# Upper bounds in seconds, from a FAISS search to a long generation.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TOKEN_RATE_BUCKETS = (1, 5, 10, 20, 30, 50, 75, 100, 150, 200)
+# Bytes sent to the browser to render one answer, from a short answer to quadratic per-token rendering.
+RENDER_BYTES_BUCKETS = (1000, 4000, 16000, 64000, 256000, 1000000, 4000000, 16000000)
+
+LabelValues = Tuple[str, ...]
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    """
+    Monotonic counter, one value per combination of label values.
+    """
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def total(self) -> float:
+        # Sum over all label values.
+        with self._lock:
+            return sum(self._values.values())
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+class Gauge(Counter):
+    """
+    Value that goes up and down, one per combination of label values.
+    """
+
+    def set(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+class Histogram:
+    """
+    Histogram of observations with fixed bucket bounds, one per combination of label values.
+    """
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, List[float]] = {}  # Bucket counts (not cumulative), then '+Inf', sum and count.
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 3)
+            series[slot] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(key, list(series)) for key, series in sorted(self._series.items())]
+        for key, series in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                bound_label = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, bound_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {series[-1]}")
+        return lines
+
+STAGE_SECONDS = Histogram(METRIC_PREFIX + "stage_seconds", "Duration of pipeline stages.", ["stage"])
+LLM_TIME_TO_FIRST_TOKEN = Histogram(METRIC_PREFIX + "llm_time_to_first_token_seconds",
+                                    "Time from request to first generated token, queue wait included.", ["model"])
+LLM_TOKENS_PER_SECOND = Histogram(METRIC_PREFIX + "llm_tokens_per_second",
+                                  "Generation rate after the first token.", ["model"], TOKEN_RATE_BUCKETS)
+LLM_GENERATED_TOKENS = Counter(METRIC_PREFIX + "llm_generated_tokens_total", "Generated tokens.", ["model"])
+LLM_OVERLOAD_RETRIES = Counter(METRIC_PREFIX + "llm_overload_retries_total", "Generation attempts retried on overload, or failed over to another endpoint.", ["model"])
+CHAT_REQUESTS = Counter(METRIC_PREFIX + "chat_requests_total", "Chat requests, by outcome.", ["outcome"])
+FEEDBACK_DROPPED = Counter(METRIC_PREFIX + "feedback_dropped_total", "User feedbacks dropped because the write queue was full.")
+RESPONSE_RENDER_BYTES = Histogram(METRIC_PREFIX + "response_render_bytes",
+                                  "Markdown bytes sent to the browser to render one streamed answer.", [], RENDER_BYTES_BUCKETS)
+RESPONSE_RENDER_FRAMES = Counter(METRIC_PREFIX + "response_render_frames_total", "Renders of streamed answers.")
+
+# Per endpoint of a replicated model, see 'llm_connector.LlmRouter'.
+LLM_ENDPOINT_REQUESTS = Counter(METRIC_PREFIX + "llm_endpoint_requests_total",
+                                "Generation attempts of an endpoint, by outcome (ok, overloaded, failed).", ["endpoint", "outcome"])
+LLM_ENDPOINT_IN_FLIGHT = Gauge(METRIC_PREFIX + "llm_endpoint_in_flight", "Requests running or waiting for an endpoint.", ["endpoint"])
+LLM_ENDPOINT_HEALTHY = Gauge(METRIC_PREFIX + "llm_endpoint_healthy", "1 if the endpoint passed its last health check.", ["endpoint"])
+LLM_ENDPOINT_TIME_TO_FIRST_TOKEN = Histogram(METRIC_PREFIX + "llm_endpoint_time_to_first_token_seconds",
+                                             "Time from admission to first token of an endpoint.", ["endpoint"])
+
+METRICS = [STAGE_SECONDS, LLM_TIME_TO_FIRST_TOKEN, LLM_TOKENS_PER_SECOND, LLM_GENERATED_TOKENS, LLM_OVERLOAD_RETRIES, CHAT_REQUESTS,
+           RESPONSE_RENDER_BYTES, RESPONSE_RENDER_FRAMES, FEEDBACK_DROPPED,
+           LLM_ENDPOINT_REQUESTS, LLM_ENDPOINT_IN_FLIGHT, LLM_ENDPOINT_HEALTHY, LLM_ENDPOINT_TIME_TO_FIRST_TOKEN]
+
+def render_metrics() -> str:
+    """
+    All metrics in Prometheus text exposition format.
+    """
+    return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
+
+# Per-request traces.
+
+class RequestTrace:
+    """
+    Spans of one chat request. Spans may be recorded from worker threads, see 'in_context'.
+    """
+
+    def __init__(self, request_id: str, attributes: dict) -> None:
+        self.request_id = request_id
+        self.attributes = attributes
+        self.start = time.perf_counter()
+        self.started_at = time.time()
+        self.spans: List[dict] = []
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, start: float, seconds: float, attributes: dict) -> None:
+        span = {"stage": stage, "offset": round(start - self.start, 6), "seconds": round(seconds, 6)}
+        span.update(attributes)
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self) -> dict:
+        return {"request_id": self.request_id, "time": self.started_at, **self.attributes,
+                "seconds": round(time.perf_counter() - self.start, 6), "spans": self.spans}
+
+_current_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar("current_trace", default=None)
+_trace_log: Optional[str] = None
+_trace_log_lock = threading.Lock()
+
+def set_trace_log(path: Optional[str]) -> None:
+    """
+    Append finished traces to 'path' as JSON lines, None to disable.
+    """
+    global _trace_log
+    _trace_log = path
+
+@contextmanager
+def trace(request_id: str, **attributes) -> Iterator[RequestTrace]:
+    """
+    Collect the spans recorded within this block, i.e. of one chat request.
+    """
+    request_trace = RequestTrace(request_id, attributes)
+    token = _current_trace.set(request_trace)
+    try:
+        yield request_trace
+    finally:
+        _current_trace.reset(token)
+        if _trace_log is not None:
+            line = json.dumps(request_trace.to_dict(), ensure_ascii=False)
+            with _trace_log_lock, open(_trace_log, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+def in_context(fn):
+    # Bind 'fn' to the current context, so spans recorded by a worker thread join the current trace.
+    # A context cannot be entered by two threads at once, each call runs in its own copy.
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+def record(stage: str, start: float, seconds: float, **attributes) -> None:
+    """
+    Record a stage that started at 'start' ('time.perf_counter') and lasted 'seconds'.
+    """
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    request_trace = _current_trace.get()
+    if request_trace is not None:
+        request_trace.add(stage, start, seconds, attributes)
+
+@contextmanager
+def span(stage: str, **attributes) -> Iterator[dict]:
+    """
+    Time the block as 'stage'. Attributes only go to the trace, the yielded dictionary can be
+    filled in the block, i.e. with result sizes.
+    """
+    start = time.perf_counter()
+    try:
+        yield attributes
+    finally:
+        record(stage, start, time.perf_counter() - start, **attributes)
+
+class GenerationTimer:
+    """
+    Times a streamed generation: queue wait, time to first token, token rate and retries.
+    """
+
+    def __init__(self, model: str) -> None:
+        self.model = model
+        self.start = time.perf_counter()
+        self.admitted: Optional[float] = None
+        self.first_token: Optional[float] = None
+        self.tokens = 0
+        self.retries = 0
+
+    def on_admitted(self) -> None:
+        self.admitted = time.perf_counter()
+        record("llm_queue_wait", self.start, self.admitted - self.start, model=self.model)
+
+    def on_token(self) -> None:
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+            LLM_TIME_TO_FIRST_TOKEN.observe(self.first_token - self.start, model=self.model)
+        self.tokens += 1
+
+    def on_retry(self) -> None:
+        self.retries += 1
+        LLM_OVERLOAD_RETRIES.inc(model=self.model)
+
+    def finish(self) -> None:
+        end = time.perf_counter()
+        attributes = {"model": self.model, "tokens": self.tokens, "retries": self.retries}
+        if self.first_token is not None:
+            attributes["time_to_first_token"] = round(self.first_token - self.start, 6)
+            if self.tokens > 1 and end > self.first_token:
+                rate = (self.tokens - 1) / (end - self.first_token)
+                attributes["tokens_per_second"] = round(rate, 2)
+                LLM_TOKENS_PER_SECOND.observe(rate, model=self.model)
+        LLM_GENERATED_TOKENS.inc(self.tokens, model=self.model)
+        record("llm_generation", self.start, end - self.start, **attributes)
+
+# Metrics endpoint.
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        pass  # Scraped every few seconds, keep the console clean.
+
+def start_metrics_server(port: int, address: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Serve '/metrics' from a daemon thread of this process.
+    """
+    server = ThreadingHTTPServer((address, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
@@ -0,0 +1,160 @@
+"""
+Memory-mapped Store
+
+Read-only on-disk format of embedded chunks, shared by processes through the page cache
+instead of being deserialized by each of them:
+
+    vectors.npy        Embedding matrix, float32 or float16, one row per chunk.
+    texts.bin          UTF-8 chunk texts, concatenated.
+    offsets.npy        Int64 byte offsets of chunk 'i' text in 'texts.bin', 'offsets[i]' to 'offsets[i + 1]'.
+    sources.json       Distinct source paths.
+    source_ids.npy     Int32 position of each chunk source in 'sources.json'.
+    pages.npy          Int32 page of each chunk, 0 if the document has no pages.
+    start_indexes.npy  Int64 start index of each chunk in its page or document, -1 if unknown.
+    extras.json        Other metadata keys, only for chunks having some.
+
+Files are opened with mmap, so loading is independent of the number of chunks, and only
+the pages of chunks actually read are loaded. Columns follow 'chunk_store'.
+"""
+import json
+import mmap
+from array import array
+from pathlib import Path
+from typing import Iterable, Iterator, List, Mapping, Union
+
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents.base import Document
+
+from chunk_store import SourceTable, make_document, split_metadata
+
+VECTORS_FILE = "vectors.npy"
+TEXTS_FILE = "texts.bin"
+OFFSETS_FILE = "offsets.npy"
+SOURCES_FILE = "sources.json"
+SOURCE_IDS_FILE = "source_ids.npy"
+PAGES_FILE = "pages.npy"
+START_INDEXES_FILE = "start_indexes.npy"
+EXTRAS_FILE = "extras.json"
+
+VECTOR_DTYPES = ["float32", "float16"]
+
+def write_vectors(folder: Union[str, Path], vectors: np.ndarray, dtype: str = "float32") -> None:
+    # Half precision halves disk and page cache usage, the loss is negligible for nearest neighbour search.
+    if dtype not in VECTOR_DTYPES:
+        raise ValueError(f"Unsupported vector dtype: {dtype}")
+    np.save(Path(folder) / VECTORS_FILE, np.ascontiguousarray(vectors, dtype=dtype))
+
+def load_vectors(folder: Union[str, Path]) -> np.ndarray:
+    # Read-only mapping, copied into float32 only by the consumer that needs it.
+    return np.load(Path(folder) / VECTORS_FILE, mmap_mode="r")
+
+def write_chunks(folder: Union[str, Path], documents: Iterable[Document]) -> None:
+    """
+    Write chunk texts into an offset-indexed blob, and their metadata as columns.
+    Documents are consumed one by one, so they can be produced lazily.
+    """
+    folder = Path(folder)
+    offsets = array("q", [0])
+    source_table = SourceTable()
+    source_ids, pages, start_indexes = array("i"), array("i"), array("q")
+    extras = {}
+    with open(folder / TEXTS_FILE, "wb") as f:
+        for i, d in enumerate(documents):
+            data = d.page_content.encode("utf-8")
+            f.write(data)
+            offsets.append(offsets[-1] + len(data))
+            source, page, start_index, extra = split_metadata(d.metadata)
+            source_ids.append(source_table.code(source))
+            pages.append(page)
+            start_indexes.append(start_index)
+            if extra:
+                extras[str(i)] = extra
+
+    np.save(folder / OFFSETS_FILE, np.frombuffer(offsets, dtype=np.int64))
+    np.save(folder / SOURCE_IDS_FILE, np.frombuffer(source_ids, dtype=np.int32))
+    np.save(folder / PAGES_FILE, np.frombuffer(pages, dtype=np.int32))
+    np.save(folder / START_INDEXES_FILE, np.frombuffer(start_indexes, dtype=np.int64))
+    (folder / SOURCES_FILE).write_text(json.dumps(source_table.sources, ensure_ascii=False), encoding="utf-8")
+    if extras:
+        (folder / EXTRAS_FILE).write_text(json.dumps(extras, ensure_ascii=False), encoding="utf-8")
+
+class MmapChunks:
+    """
+    Chunks of a folder written by 'write_chunks', decoded on access.
+
+    Attributes:
+        offsets: np.ndarray
+            Memory-mapped byte offsets of chunk texts.
+        sources: List[str]
+            Distinct source paths, the source of chunk 'i' is 'sources[source_ids[i]]'.
+    """
+
+    def __init__(self, folder: Union[str, Path]) -> None:
+        folder = Path(folder)
+        self.offsets = np.load(folder / OFFSETS_FILE, mmap_mode="r")
+        self.source_ids = np.load(folder / SOURCE_IDS_FILE, mmap_mode="r")
+        self.pages = np.load(folder / PAGES_FILE, mmap_mode="r")
+        self.start_indexes = np.load(folder / START_INDEXES_FILE, mmap_mode="r")
+        self.sources: List[str] = json.loads((folder / SOURCES_FILE).read_text(encoding="utf-8"))
+        try:
+            self.extras = {int(k): v for k, v in json.loads((folder / EXTRAS_FILE).read_text(encoding="utf-8")).items()}
+        except FileNotFoundError:
+            self.extras = {}
+        self._texts = b""
+        if self.offsets[-1] > 0: # mmap cannot map an empty file.
+            with open(folder / TEXTS_FILE, "rb") as f:
+                self._texts = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def text(self, i: int) -> str:
+        return self._texts[int(self.offsets[i]):int(self.offsets[i + 1])].decode("utf-8")
+
+    def __getitem__(self, i: int) -> Document:
+        return make_document(self.text(i), self.sources[self.source_ids[i]], int(self.pages[i]),
+                             int(self.start_indexes[i]), self.extras.get(i))
+
+    def __iter__(self) -> Iterator[Document]:
+        return (self[i] for i in range(len(self)))
+
+class PositionIds(Mapping):
+    """
+    Index position to docstore ID mapping of a store whose IDs are the positions themselves,
+    so no dictionary with one entry per chunk is built.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+
+    def __getitem__(self, position: int) -> str:
+        if not 0 <= position < self.size:
+            raise KeyError(position)
+        return str(position)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(self.size))
+
+class MmapDocstore(Docstore):
+    """
+    Read-only docstore over memory-mapped chunks, IDs are chunk positions as strings.
+    """
+
+    def __init__(self, chunks: MmapChunks) -> None:
+        self.chunks = chunks
+
+    def search(self, search: str) -> Union[str, Document]:
+        try:
+            position = int(search)
+        except ValueError:
+            return f"ID {search} not found."
+        if not 0 <= position < len(self.chunks):
+            return f"ID {search} not found."
+        return self.chunks[position]
+
+    def delete(self, ids: List) -> None:
+        raise NotImplementedError("Memory-mapped docstore is read-only.")
@@ -0,0 +1,164 @@
+"""
+Response Cache
+
+Process-wide cache of generated responses, consulted before calling the LLM.
+Exact entries are keyed by the crafted prompt, generation parameters, model and document set.
+In semantic mode, a query whose embedding is close enough to a cached query over the same
+documents and parameters is answered from cache too. This lookup only needs the query embedding,
+so it is done before RAG retrieval, and a hit skips retrieval and prompt crafting as well.
+"""
+import re
+import time
+import hashlib
+import threading
+import collections
+from pathlib import Path
+from typing import Iterator, List, NamedTuple, Optional, Union
+
+import numpy as np
+
+from webui_config import LlmModelConfig, ResponseCacheConfig
+from llm_connector import LlmGenerationParameters
+
+class CachedResponse(NamedTuple):
+    response: str
+    document_set: str          # Hash of the document set the response is based on.
+    scope: str                 # Hash of model and generation parameters.
+    query_vector: Optional[np.ndarray]  # Normalized query embedding, for semantic lookup.
+    created_at: float
+
+def document_set_hash(document_digests: List[str], corpus_snapshot: Optional[str] = None) -> str:
+    """
+    Identify the documents an answer is grounded on: session documents regardless of their names
+    and order, and the shared corpus snapshot, so answers expire when a new snapshot is published.
+    Empty if there are none.
+    """
+    if not document_digests and corpus_snapshot is None:
+        return ""
+    components = sorted(document_digests) + [f"corpus:{corpus_snapshot or ''}"]
+    return hashlib.sha256("\x00".join(components).encode("utf-8")).hexdigest()
+
+def _scope_hash(llm_model: LlmModelConfig, llm_parameter: LlmGenerationParameters) -> str:
+    # Replicas of a named model give the same answers, unnamed endpoints are told apart by address.
+    components = [llm_model.provider, llm_model.model or llm_model.endpoint] + [repr(x) for x in llm_parameter]
+    return hashlib.sha256("\x00".join(components).encode("utf-8")).hexdigest()
+
+def replay_stream(response: str) -> Iterator[str]:
+    """
+    Replay a cached response as a token stream, so it goes through the same rendering path as generation.
+    """
+    for token in re.findall(r"\S+\s*|\s+", response):
+        yield token
+
+class ResponseCache:
+    """
+    LRU cache of responses with TTL.
+
+    Attributes:
+        cache_config: ResponseCacheConfig
+            Size, TTL and semantic threshold of the cache.
+        invalidation_file: Optional[Path]
+            Touch this file to clear the cache in every process, for administrators.
+    """
+
+    def __init__(self, cache_config: ResponseCacheConfig, invalidation_file: Optional[Union[str, Path]] = None) -> None:
+        self.cache_config = cache_config
+        self.invalidation_file = Path(invalidation_file) if invalidation_file else None
+        self._entries: "collections.OrderedDict[str, CachedResponse]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._invalidation_mtime = self._read_invalidation_mtime()
+
+    def _read_invalidation_mtime(self) -> Optional[float]:
+        if self.invalidation_file is None:
+            return None
+        try:
+            return self.invalidation_file.stat().st_mtime
+        except FileNotFoundError:
+            return None
+
+    def _check_invalidation(self) -> None:
+        # Called with lock held.
+        mtime = self._read_invalidation_mtime()
+        if mtime != self._invalidation_mtime:
+            self._invalidation_mtime = mtime
+            self._entries.clear()
+
+    def _is_expired(self, entry: CachedResponse) -> bool:
+        return time.time() - entry.created_at > self.cache_config.ttl
+
+    @staticmethod
+    def make_key(prompt: str, llm_model: LlmModelConfig, llm_parameter: LlmGenerationParameters, document_set: str) -> str:
+        components = [prompt, _scope_hash(llm_model, llm_parameter), document_set]
+        return hashlib.sha256("\x00".join(components).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Exact lookup by the key from 'make_key'.
+        """
+        with self._lock:
+            self._check_invalidation()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._is_expired(entry):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry.response
+
+    def get_similar(self, query_vector: List[float], llm_model: LlmModelConfig, llm_parameter: LlmGenerationParameters, document_set: str) -> Optional[str]:
+        """
+        Semantic lookup, returns the response of the most similar cached query over the same documents and parameters,
+        if its cosine similarity reaches the threshold. Always misses when semantic mode is disabled.
+        """
+        threshold = self.cache_config.semantic_threshold
+        if threshold is None:
+            return None
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        scope = _scope_hash(llm_model, llm_parameter)
+
+        with self._lock:
+            self._check_invalidation()
+            best_key, best_score = None, threshold
+            for key, entry in self._entries.items():
+                if entry.query_vector is None or entry.scope != scope or entry.document_set != document_set:
+                    continue
+                if self._is_expired(entry):
+                    continue
+                score = float(np.dot(entry.query_vector, query))
+                if score >= best_score:
+                    best_key, best_score = key, score
+
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            return self._entries[best_key].response
+
+    def put(self, key: str, response: str, llm_model: LlmModelConfig, llm_parameter: LlmGenerationParameters, document_set: str, query_vector: Optional[List[float]] = None) -> None:
+        if query_vector is not None:
+            query_vector = np.asarray(query_vector, dtype=np.float32)
+            query_vector = query_vector / (np.linalg.norm(query_vector) or 1.0)
+
+        entry = CachedResponse(response=response,
+                               document_set=document_set,
+                               scope=_scope_hash(llm_model, llm_parameter),
+                               query_vector=query_vector,
+                               created_at=time.time())
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.cache_config.max_entries:
+                self._entries.popitem(last=False) # Least recently used.
+
+    def invalidate(self, document_set: Optional[str] = None) -> None:
+        """
+        Drop all entries, or only those based on the given document set.
+        """
+        with self._lock:
+            if document_set is None:
+                self._entries.clear()
+                return
+            for key in [k for k, e in self._entries.items() if e.document_set == document_set]:
+                del self._entries[key]
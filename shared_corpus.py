@@ -0,0 +1,137 @@
+"""
+Shared Corpus
+
+Read-only view of the organization-wide document index, written by the ingestion service
+('corpus_ingestion.py') as immutable snapshots:
+
+    <index_folder>/CURRENT              Name of the latest snapshot.
+    <index_folder>/<snapshot>/index.faiss
+    <index_folder>/<snapshot>/texts.bin, offsets.npy, ...  Chunk columns, see 'mmap_store'.
+    <index_folder>/<snapshot>/bm25_terms.npy, ...          BM25 postings, see 'lexical_index'.
+    <index_folder>/<snapshot>/manifest.json
+
+The FAISS index, whose vectors are stored contiguously in float32 or float16, the chunk texts and
+the BM25 postings are memory-mapped, so frontend processes share them through the page cache instead
+of each holding its own copy. Chunk 'i' of the snapshot is vector 'i' of the index.
+"""
+import json
+import time
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import faiss
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents.base import Document
+from langchain_core.embeddings import Embeddings
+
+from lexical_index import POSTINGS_FILES, BM25Index, MmapBM25Index, write_postings
+from document_rag_processor import hybrid_search
+from mmap_store import MmapChunks, MmapDocstore, PositionIds, write_chunks
+
+SNAPSHOT_POINTER = "CURRENT"
+INDEX_FILE = "index.faiss"
+MANIFEST_FILE = "manifest.json"
+KEEP_SNAPSHOTS = 3  # Older snapshots are removed, readers may still map the previous ones.
+
+def current_snapshot(index_folder: Union[str, Path]) -> Optional[str]:
+    try:
+        return (Path(index_folder) / SNAPSHOT_POINTER).read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+def write_snapshot(index_folder: Union[str, Path], db: Optional[FAISS], manifest: dict) -> str:
+    """
+    Write the index, its chunks and a manifest as a new snapshot, then point CURRENT to it.
+
+    Returns:
+        str:
+            Name of the new snapshot.
+    """
+    index_folder = Path(index_folder)
+    index_folder.mkdir(parents=True, exist_ok=True)
+    name = f"snapshot-{time.time_ns()}"
+    snapshot = index_folder / name
+    snapshot.mkdir()
+
+    num_chunks = 0
+    if db is not None:
+        faiss.write_index(db.index, str(snapshot / INDEX_FILE))
+        num_chunks = db.index.ntotal
+    # Chunks in index order, so position 'i' of the index is chunk 'i'.
+    write_chunks(snapshot, (db.docstore.search(db.index_to_docstore_id[i]) for i in range(num_chunks)))
+    chunks = MmapChunks(snapshot)
+    write_postings(snapshot, (chunks.text(i) for i in range(num_chunks)))
+    (snapshot / MANIFEST_FILE).write_text(json.dumps(dict(manifest, num_chunks=num_chunks), ensure_ascii=False), encoding="utf-8")
+
+    # Switch readers to the new snapshot atomically.
+    pointer = index_folder / (SNAPSHOT_POINTER + ".tmp")
+    pointer.write_text(name, encoding="utf-8")
+    pointer.replace(index_folder / SNAPSHOT_POINTER)
+
+    # Remove old snapshots.
+    snapshots = sorted(p for p in index_folder.iterdir() if p.is_dir() and p.name.startswith("snapshot-"))
+    for old in snapshots[:-KEEP_SNAPSHOTS]:
+        shutil.rmtree(old, ignore_errors=True)
+
+    return name
+
+def _read_index(path: Path) -> faiss.Index:
+    # Memory-map index data where the index type supports it.
+    mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+    try:
+        return faiss.read_index(str(path), mmap_flag | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        return faiss.read_index(str(path))
+
+class SharedCorpus:
+    """
+    Read-only search over a snapshot of the shared corpus.
+
+    Attributes:
+        snapshot: str
+            Name of the loaded snapshot.
+        manifest: dict
+            Documents and ingestion statistics of the snapshot.
+        chunks: MmapChunks
+            Memory-mapped chunks, in index order.
+        lexical_index: Union[MmapBM25Index, BM25Index]
+            Memory-mapped BM25 postings of the chunks.
+    """
+
+    def __init__(self, index_folder: Union[str, Path], snapshot: str, embeddings: Embeddings) -> None:
+        snapshot_folder = Path(index_folder) / snapshot
+        self.snapshot = snapshot
+        self.embeddings = embeddings
+        self.manifest = json.loads((snapshot_folder / MANIFEST_FILE).read_text(encoding="utf-8"))
+        self.chunks = MmapChunks(snapshot_folder)
+
+        self.db: Optional[FAISS] = None
+        if all((snapshot_folder / f).exists() for f in POSTINGS_FILES):
+            self.lexical_index: Union[MmapBM25Index, BM25Index] = MmapBM25Index(snapshot_folder)
+        else: # Snapshot of an older ingestion service, built here rather than on the first request.
+            self.lexical_index = BM25Index()
+            self.lexical_index.add_many((str(i), self.chunks.text(i)) for i in range(len(self.chunks)))
+        if not len(self.chunks): # Empty corpus.
+            return
+
+        # Docstore IDs are index positions, nothing is materialized per chunk.
+        self.db = FAISS(embeddings, _read_index(snapshot_folder / INDEX_FILE),
+                        MmapDocstore(self.chunks), PositionIds(len(self.chunks)))
+
+    @classmethod
+    def load_current(cls, index_folder: Union[str, Path], embeddings: Embeddings) -> Optional["SharedCorpus"]:
+        snapshot = current_snapshot(index_folder)
+        if snapshot is None: # Nothing ingested yet.
+            return None
+        return cls(index_folder, snapshot, embeddings)
+
+    def similarity_search_with_score(self, query: str, k: int) -> List[Tuple[Document, float]]:
+        if self.db is None:
+            return []
+        return self.db.similarity_search_with_score(query, k=k)
+
+    def hybrid_search_with_score(self, query: str, k: int) -> List[Tuple[Document, float]]:
+        if self.db is None:
+            return []
+        return hybrid_search(self.db, self.lexical_index, self.embeddings, query, k)
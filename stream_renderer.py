@@ -0,0 +1,125 @@
+"""
+Stream Renderer
+
+Throttled rendering of a streamed answer into a Streamlit placeholder. Every 'markdown' call sends
+the whole string to the browser, which renders it again, so rendering each token of an answer costs
+bytes quadratic in its length. Tokens are coalesced into frames, rendered at most 'fps' times per
+second or once 'max_tokens' tokens are pending, and completed paragraphs are frozen into their own
+element, so a frame only sends the paragraph being written. The complete answer is rendered once as
+a whole, as a single markdown document.
+"""
+import time
+from typing import List, Optional
+
+import metrics
+from webui_config import StreamingConfig
+
+CODE_FENCE = "```"
+PARAGRAPH_BREAK = "\n\n"
+
+def _utf8_size(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+def frozen_length(text: str) -> int:
+    """
+    Length of the completed paragraphs at the start of 'text', which render the same on their own.
+    A paragraph break inside an open code fence does not complete a paragraph.
+    """
+    end = text.rfind(PARAGRAPH_BREAK)
+    while end > 0 and text.count(CODE_FENCE, 0, end) % 2:
+        end = text.rfind(PARAGRAPH_BREAK, 0, end)
+    return end + len(PARAGRAPH_BREAK) if end > 0 else 0
+
+class StreamRenderer:
+    """
+    Renders a token stream into a placeholder, frame by frame.
+
+    Attributes:
+        placeholder:
+            'st.empty()' element receiving the answer, replaced by the complete answer on 'finish'.
+        config: StreamingConfig
+            Frame rate and pending tokens threshold.
+        cursor: str
+            Appended to the paragraph being written while streaming.
+        text: str
+            Answer received up to the last frame.
+        bytes_sent: int
+            Markdown bytes sent to the browser for this answer.
+        unthrottled_bytes: int
+            Bytes that rendering every token in full would have sent, for comparison.
+        frames: int
+            Render calls for this answer.
+    """
+
+    def __init__(self, placeholder, config: StreamingConfig = StreamingConfig(), cursor: str = "❖") -> None:
+        self.placeholder = placeholder
+        self.config = config
+        self.cursor = cursor
+        self.text = ""
+        self.bytes_sent = 0
+        self.unthrottled_bytes = 0
+        self.frames = 0
+        self.tokens = 0
+        self._text_bytes = 0   # UTF-8 size of 'text', kept up to date instead of encoding it for every token.
+        self._cursor_bytes = _utf8_size(cursor)
+        self._frozen = 0       # Length of the text rendered in frozen elements.
+        self._pending: List[str] = []  # Tokens received since the last frame, joined into 'text' once per frame.
+        self._last_frame = 0.0
+        self._container = None
+        self._live = None      # Element of the paragraph being written.
+        self._start = time.perf_counter()
+
+    def _render(self, element, text: str) -> None:
+        element.markdown(text)
+        self.bytes_sent += _utf8_size(text)
+        self.frames += 1
+
+    def _join_pending(self) -> None:
+        # Appending every token to 'text' would copy the whole answer each time.
+        self.text += "".join(self._pending)
+        self._pending.clear()
+
+    def write(self, token: Optional[str]) -> None:
+        """
+        Add a token, rendered with the next frame.
+        """
+        if not token:
+            return
+        self._pending.append(token)
+        self.tokens += 1
+        self._text_bytes += _utf8_size(token)
+        self.unthrottled_bytes += self._text_bytes + self._cursor_bytes
+        now = time.monotonic()
+        if len(self._pending) >= self.config.max_tokens or now - self._last_frame >= 1 / self.config.fps:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Render pending tokens, only sending the text after the last frozen paragraph.
+        """
+        if self._container is None: # Replaces queue status shown in the placeholder.
+            self._container = self.placeholder.container()
+            self._live = self._container.empty()
+        self._join_pending()
+        live_text = self.text[self._frozen:]
+        completed = frozen_length(live_text)
+        if completed:
+            # Completed paragraphs stay in the current element, new text goes to a new one below.
+            self._render(self._live, live_text[:completed])
+            self._frozen += completed
+            self._live = self._container.empty()
+            live_text = live_text[completed:]
+        self._render(self._live, live_text + self.cursor)
+        self._last_frame = time.monotonic()
+
+    def finish(self) -> str:
+        """
+        Render the complete answer as a whole, record bytes sent, and return the answer.
+        """
+        self._join_pending()
+        self._render(self.placeholder, self.text)
+        metrics.RESPONSE_RENDER_BYTES.observe(self.bytes_sent)
+        metrics.RESPONSE_RENDER_FRAMES.inc(self.frames)
+        metrics.record("render", self._start, time.perf_counter() - self._start, tokens=self.tokens, frames=self.frames,
+                       bytes_sent=self.bytes_sent, unthrottled_bytes=self.unthrottled_bytes)
+        return self.text
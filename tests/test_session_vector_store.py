@@ -0,0 +1,64 @@
+"""
+Removal of documents from a session vector store, for every index type.
+"""
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("langchain_community")
+
+from benchmarks.fake_embeddings import HashEmbeddings
+from benchmarks.fixtures import LATIN_WORDS, write_fixture
+from document_rag_processor import SessionVectorStore
+from vector_index import INDEX_TYPES
+from webui_config import EmbeddingModelConfig, VectorIndexConfig
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_remove_then_search_and_add(tmp_path, index_type):
+    documents = [write_fixture(tmp_path, ".docx", 20000, seed) for seed in range(3)]
+    store = SessionVectorStore(EmbeddingModelConfig(provider="huggingface", endpoint="http://127.0.0.1:1"), 100, 25,
+                               index_config=VectorIndexConfig(index_type=index_type), embeddings=HashEmbeddings(64))
+    store.add_documents(documents[:2])
+    store.remove_document(documents[0])
+
+    # Every hit must resolve to a chunk of the remaining document.
+    remaining = set(store.document_ids[str(documents[1])])
+    hits = store.db.similarity_search_with_score("budget approval form", k=50)
+    assert hits and all(doc.metadata["source"] == str(documents[1]) for doc, _ in hits)
+    assert set(store.db.index_to_docstore_id.values()) == remaining
+
+    store.add_document(documents[2])
+    assert store.db.index.ntotal == len(store.db.index_to_docstore_id)
+    sources = {doc.metadata["source"] for doc, _ in store.db.similarity_search_with_score("budget approval form", k=store.db.index.ntotal)}
+    assert sources == {str(documents[1]), str(documents[2])}
+
+def _recall(store, queries, k=10):
+    # Share of the exact k nearest chunks, by L2 over their original vectors, that the index also returns.
+    ids = [store.db.index_to_docstore_id[i] for i in range(store.db.index.ntotal)]
+    vectors = store.embeddings.embed_matrix([store.db.docstore.search(doc_id).page_content for doc_id in ids])
+    query_vectors = store.embeddings.embed_matrix(queries)
+    distances = ((query_vectors[:, None, :] - vectors[None, :, :]) ** 2).sum(axis=2)
+    exact = np.argsort(distances, axis=1, kind="stable")[:, :k]
+    _, found = store.db.index.search(query_vectors, k)
+    return np.mean([len(set(e) & set(f)) / k for e, f in zip(exact, found)])
+
+@pytest.mark.parametrize("index_type, vector_dtype", [("ivf_pq", "float32"), ("ivf_flat", "float16"), ("hnsw", "float16")])
+def test_recall_kept_after_remove_and_add(tmp_path, index_type, vector_dtype):
+    documents = [write_fixture(tmp_path, ".docx", 20000, seed) for seed in range(3)]
+    queries = [" ".join(words) for words in zip(LATIN_WORDS, LATIN_WORDS[3:], LATIN_WORDS[7:])]
+    def new_store():
+        return SessionVectorStore(EmbeddingModelConfig(provider="huggingface", endpoint="http://127.0.0.1:1"), 100, 25,
+                                  index_config=VectorIndexConfig(index_type=index_type, vector_dtype=vector_dtype),
+                                  embeddings=HashEmbeddings(64))
+
+    # Each removal rebuilds the index, which must not degrade the vectors it is rebuilt from.
+    store = new_store()
+    store.add_documents(documents)
+    for document in documents * 2:
+        store.remove_document(document)
+        store.add_document(document)
+    store.remove_document(documents[0])
+
+    fresh = new_store()
+    fresh.add_documents(documents[1:])
+    assert _recall(store, queries) >= _recall(fresh, queries)
@@ -0,0 +1,77 @@
+"""
+Upload Store
+
+Files of the Streamlit uploader, written into the document folder once per upload instead of on
+every rerun of the script. Uploads are tracked by uploader file ID, and files are named after their
+content hash, so an unchanged file is never hashed or written again, and files removed from the
+uploader are deleted.
+"""
+import os
+import hashlib
+import tempfile
+from pathlib import Path
+from typing import IO, Dict, Iterable, List, NamedTuple, Union
+
+class StoredUpload(NamedTuple):
+    path: Path    # File in the document folder, given to parsers.
+    digest: str   # SHA-256 of the content, same as 'index_cache.file_digest'.
+
+class UploadStore:
+    """
+    Uploaded files of one session.
+
+    Attributes:
+        folder: Path
+            Document folder the files are written into.
+        prefix: str
+            Prefix of file names, i.e. the session ID, so sessions never share a file.
+        uploads: Dict[str, StoredUpload]
+            Stored file of each upload, keyed by uploader file ID.
+    """
+
+    def __init__(self, folder: Union[str, Path], prefix: str) -> None:
+        self.folder = Path(folder)
+        self.prefix = prefix
+        self.uploads: Dict[str, StoredUpload] = {}
+
+    def _store(self, uploaded_file: IO[bytes]) -> StoredUpload:
+        # Uploads are held in memory by Streamlit, hash and write from a view of that buffer, without a copy.
+        buffer = uploaded_file.getbuffer()
+        digest = hashlib.sha256(buffer).hexdigest()
+        path = self.folder / f"{self.prefix}-{digest[:16]}-{uploaded_file.name}"
+        if not path.exists():
+            # Written under a temporary name, so a file at 'path' is always complete.
+            fd, tmp = tempfile.mkstemp(dir=self.folder, prefix=".upload-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(buffer)
+                os.replace(tmp, path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        return StoredUpload(path, digest)
+
+    def sync(self, uploaded_files: Iterable) -> List[StoredUpload]:
+        """
+        Store new uploads and delete the files of uploads no longer present.
+
+        Parameters:
+            uploaded_files: Iterable
+                Current files of the uploader, Streamlit 'UploadedFile' objects.
+
+        Returns:
+            List[StoredUpload]:
+                Stored files, in the order of 'uploaded_files'.
+        """
+        current = {}
+        for uploaded_file in uploaded_files:
+            stored = self.uploads.get(uploaded_file.file_id)
+            current[uploaded_file.file_id] = stored if stored is not None else self._store(uploaded_file)
+
+        kept_paths = {stored.path for stored in current.values()}
+        for stored in self.uploads.values():
+            if stored.path not in kept_paths:
+                stored.path.unlink(missing_ok=True)
+
+        self.uploads = current
+        return list(current.values())
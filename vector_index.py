@@ -0,0 +1,129 @@
+"""
+Vector Index
+
+Creation of FAISS indexes for the configured index type.
+Flat index is exact and fine for a few documents. IVF and HNSW indexes are approximate,
+and keep search time sub-linear for large document sets.
+Flat, IVF-Flat and HNSW indexes can store vectors in half precision, halving their memory.
+"""
+import math
+
+import faiss
+import numpy as np
+
+from webui_config import VectorIndexConfig
+
+INDEX_TYPES = ["flat", "ivf_flat", "ivf_pq", "hnsw"]
+
+MIN_POINTS_PER_CENTROID = 39  # FAISS warns when training k-means with fewer points per centroid.
+
+def resolve_index_type(index_config: VectorIndexConfig, num_vectors: int) -> str:
+    # 'auto' switches from exact to approximate search above the threshold.
+    if index_config.index_type == "auto":
+        return index_config.auto_ann_type if num_vectors >= index_config.auto_threshold else "flat"
+    return index_config.index_type
+
+def _num_lists(index_config: VectorIndexConfig, num_vectors: int) -> int:
+    nlist = index_config.nlist or int(4 * math.sqrt(num_vectors))  # Common rule of thumb.
+    # Keep enough training points per centroid.
+    return max(1, min(nlist, num_vectors // MIN_POINTS_PER_CENTROID))
+
+def _fp16(index_config: VectorIndexConfig) -> bool:
+    return index_config.vector_dtype == "float16"
+
+def create_faiss_index(vectors: np.ndarray, index_config: VectorIndexConfig, index_type: str = None) -> faiss.Index:
+    """
+    Create, train and fill a FAISS index with L2 metric.
+
+    Parameters:
+        vectors: np.ndarray
+            Float32 matrix, one row per vector.
+        index_config: VectorIndexConfig
+            Index type and its training and search parameters.
+        index_type: str
+            Override the type resolved from 'index_config'.
+
+    Returns:
+        faiss.Index:
+            An index holding all vectors, ready for search.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    num_vectors, dim = vectors.shape
+    index_type = index_type or resolve_index_type(index_config, num_vectors)
+
+    if index_type == "flat":
+        if _fp16(index_config):
+            index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_L2)
+        else:
+            index = faiss.IndexFlatL2(dim)
+
+    elif index_type == "ivf_flat":
+        nlist = _num_lists(index_config, num_vectors)
+        if _fp16(index_config):
+            index = faiss.IndexIVFScalarQuantizer(faiss.IndexFlatL2(dim), dim, nlist, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_L2)
+        else:
+            index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, nlist)
+        index.nprobe = min(index_config.nprobe, nlist)
+
+    elif index_type == "ivf_pq":
+        nlist = _num_lists(index_config, num_vectors)
+        # Number of sub-quantizers must divide the dimension.
+        pq_m = max(m for m in range(1, min(index_config.pq_m, dim) + 1) if dim % m == 0)
+        # Each sub-quantizer codebook needs training points too.
+        pq_bits = min(index_config.pq_bits, max(1, int(math.log2(max(2, num_vectors // MIN_POINTS_PER_CENTROID)))))
+        index = faiss.IndexIVFPQ(faiss.IndexFlatL2(dim), dim, nlist, pq_m, pq_bits)
+        index.nprobe = min(index_config.nprobe, nlist)
+
+    elif index_type == "hnsw":
+        if _fp16(index_config):
+            index = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_fp16, index_config.hnsw_m)
+        else:
+            index = faiss.IndexHNSWFlat(dim, index_config.hnsw_m)
+        index.hnsw.efConstruction = index_config.ef_construction
+        index.hnsw.efSearch = index_config.ef_search
+
+    else:
+        raise ValueError(f"Unsupported index type: {index_type}")
+
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+def index_type_of(index: faiss.Index) -> str:
+    # Reverse of 'create_faiss_index', for deciding whether an index should be rebuilt.
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+def vector_dtype_of(index: faiss.Index) -> str:
+    # Precision of the stored vectors, IVF-PQ codes are neither and keep the configured one.
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    if isinstance(index, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return "float16"
+    return "float32"
+
+def needs_rebuild(index: faiss.Index, index_config: VectorIndexConfig) -> bool:
+    """
+    Whether an index filled incrementally should be rebuilt: its type or vector precision no longer matches
+    the configuration for its size, or it is IVF trained on far fewer vectors than it holds now.
+    """
+    index_type = index_type_of(index)
+    if index_type != resolve_index_type(index_config, index.ntotal):
+        return True
+    if index_type != "ivf_pq" and vector_dtype_of(index) != index_config.vector_dtype:
+        return True
+    if isinstance(index, faiss.IndexIVF):
+        return _num_lists(index_config, index.ntotal) >= 2 * index.nlist
+    return False
+
+def supports_removal(index: faiss.Index) -> bool:
+    # HNSW graphs cannot remove vectors, such index must be rebuilt instead.
+    # IVF indexes keep the labels of remaining vectors on removal, while the FAISS wrapper renumbers
+    # its positions from 0, they would no longer match, so IVF indexes are rebuilt too.
+    return not isinstance(index, (faiss.IndexHNSW, faiss.IndexIVF))
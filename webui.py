@@ -3,7 +3,9 @@
 ##########################
 
 # Python Standard Library Imports
+import os  # File modification time
 import uuid  # Universally Unique Identifier generation
+import warnings  # Non-fatal configuration problems
 from pathlib import Path  # Handling file system paths
 
 # Third-Party Library Imports
@@ -11,14 +13,75 @@ import streamlit as st  # UI Framework for creating web applications
 from streamlit_feedback import streamlit_feedback # Feedback widget for Streamlit
 
 # Local Imports
+# Only light modules are imported here. Modules loading FAISS, langchain, numpy or the database driver
+# are imported on the code path that needs them, so the first page is served without waiting for them.
 from webui_config import UiConfig  # Configuration settings for the web UI
-from llm_connector import llm_stream_result, LlmGenerationParameters, craft_prompt
-from document_rag_processor import topk_documents, RagParameters
-
-from feedback_db import feedback_insert
-
-
-def feedback_callback(user_prompt, response):
+from llm_connector import llm_stream_result, LlmGenerationParameters, craft_prompt, prompt_token_budget, group_replicas
+from upload_store import UploadStore  # Uploaded files written to the document folder.
+from stream_renderer import StreamRenderer  # Throttled rendering of streamed answers.
+import metrics  # Stage latency spans and Prometheus endpoint.
+
+# Touch this file in document folder to clear response cache of all frontend processes.
+RESPONSE_CACHE_INVALIDATION_FILE = ".response-cache-invalidate"
+
+# Process-wide singletons, created once and shared by all sessions of this process.
+# LLM clients and tokenizers are cached by 'llm_connector' itself.
+
+@st.cache_resource
+def load_config(config_path: str, mtime: float) -> UiConfig:
+    # Parsed again only when the file changes.
+    with open(config_path, "r", encoding="utf-8") as f:
+        return UiConfig.load_config_from_file(f)
+
+@st.cache_resource
+def start_metrics(metrics_config):
+    # Stage timings are recorded in any case, the endpoint only exports them.
+    metrics.set_trace_log(metrics_config.trace_log)
+    if metrics_config.port is not None:
+        try:
+            return metrics.start_metrics_server(metrics_config.port, metrics_config.address)
+        except OSError as ex: # Port taken, i.e. by another Streamlit process with the same configuration.
+            warnings.warn(f"Cannot serve metrics on {metrics_config.address}:{metrics_config.port}, exporter disabled: {ex}")
+
+@st.cache_resource
+def get_embeddings(embedding_config):
+    from embedding_client import TeiEmbeddings
+    return TeiEmbeddings(embedding_config)
+
+@st.cache_resource
+def get_index_cache(cache_folder: str, max_size: int, vector_dtype: str):
+    from index_cache import EmbeddingIndexCache
+    return EmbeddingIndexCache(cache_folder, max_size, vector_dtype)
+
+@st.cache_resource
+def get_response_cache(cache_config, invalidation_file):
+    from response_cache import ResponseCache
+    return ResponseCache(cache_config, invalidation_file)
+
+@st.cache_resource(max_entries=2)
+def get_shared_corpus(index_folder, snapshot, embedding_config):
+    # Loaded once per snapshot, read-only.
+    from shared_corpus import SharedCorpus
+    return SharedCorpus(index_folder, snapshot, get_embeddings(embedding_config))
+
+def get_vector_store(config: UiConfig):
+    # Session-scoped vector store, only newly uploaded documents are embedded.
+    # Created on first use, so sessions without documents never load the vector index modules.
+    if "vector_store" not in st.session_state:
+        from document_rag_processor import SessionVectorStore
+        from doc_parser import configure_pool
+        configure_pool(config.parse_workers)  # Takes effect when the shared pool is first created.
+        index_cache = get_index_cache(str(Path(config.document_folder) / ".index"), config.index_cache_size * 1024 * 1024,
+                                      config.vector_index.vector_dtype)
+        st.session_state.vector_store = SessionVectorStore(config.embedding_model,
+                                                           chunk_size=st.session_state.get("rag_chunk_size", 100),
+                                                           chunk_overlap=st.session_state.get("rag_chunk_overlap", 25),
+                                                           index_cache=index_cache,
+                                                           index_config=config.vector_index,
+                                                           embeddings=get_embeddings(config.embedding_model))
+    return st.session_state.vector_store
+
+def feedback_callback(user_prompt, response, database_url):
     def inner(*args):
 
         feedback_info = args[0]
@@ -35,6 +98,8 @@ def feedback_callback(user_prompt, response):
             raise NotImplementedError(f"Feedback type {feedback_type} is not supported.")
 
         try:
+            from feedback_db import feedback_insert, init_feedback_db
+            init_feedback_db(database_url)  # Once per process.
             feedback_insert(feedback_score, feedback_text, user_prompt, response)
         except Exception as ex:
             print("Exception caughted while inserting feedback: ", ex)
@@ -49,6 +114,7 @@ def main_ui_logic(config: UiConfig):
     document_folder = Path(config.document_folder)
     # TODO: Logger: display warning.
     document_folder.mkdir(exist_ok=True)
+    start_metrics(config.metrics)
 
     ### States
     if "messages" not in st.session_state:
@@ -56,6 +122,7 @@ def main_ui_logic(config: UiConfig):
 
     if "documents" not in st.session_state:
         st.session_state.documents = []
+        st.session_state.document_digests = []
 
     if "rag_reference" not in st.session_state:
         st.session_state.rag_reference = ""
@@ -79,6 +146,13 @@ def main_ui_logic(config: UiConfig):
             st.markdown("Chunk Size: 文章分割的大小")
             st.markdown("Chunk Overlap: 文章分割的重疊大小")
             st.markdown("Top K: 保留機率最高的前 K 個文章")
+            st.markdown("Hybrid Search: 結合關鍵字 (BM25) 與語意檢索，提升條號、表單編號等精確比對")
+
+        # Endpoints serving the same model are replicas, requests are routed among them.
+        model_groups = group_replicas(config.llm_models)
+        model_name = next(iter(model_groups))
+        if len(model_groups) > 1:
+            model_name = st.selectbox("模型", list(model_groups), key="model_name")
 
         st.markdown("### LLM 生成參數")
         model_topk = st.slider("Top K", 0, 200, 10, key="model_topk")
@@ -91,6 +165,7 @@ def main_ui_logic(config: UiConfig):
         rag_chunk_size = st.slider("Chunk Size", 0, 500, 100, key="rag_chunk_size")
         rag_chunk_overlap = st.slider("Chunk Overlap", 0, 100, 25, key="rag_chunk_overlap")
         rag_topk = st.slider("Top K", 0, 100, 3, key="rag_topk")
+        rag_hybrid = st.toggle("Hybrid Search", True, key="rag_hybrid")
 
 
     # File upload interface
@@ -98,16 +173,12 @@ def main_ui_logic(config: UiConfig):
         uploaded_files = st.file_uploader("選擇參考文件(.pdf .odt .docx .pptx .xlsx)", accept_multiple_files=True)
 
         if uploaded_files is not None:
-
-            all_document_full_names = []
-            for _file in uploaded_files:
-                file_full_name = f"{st.session_state.session_id}-{_file.name}"  # Create file name.
-                bytes_data = _file.getvalue() # Get raw data.
-                doc_output = document_folder / file_full_name # Destination file.
-                doc_output.write_bytes(bytes_data) # Write file to document folder.
-                all_document_full_names.append(doc_output.absolute()) # Append current file to list.
-
-            st.session_state.documents = all_document_full_names
+            # Only new uploads are written, this block runs on every rerun.
+            if "upload_store" not in st.session_state:
+                st.session_state.upload_store = UploadStore(document_folder, st.session_state.session_id)
+            stored_uploads = st.session_state.upload_store.sync(uploaded_files)
+            st.session_state.documents = [u.path.absolute() for u in stored_uploads]
+            st.session_state.document_digests = [u.digest for u in stored_uploads]
 
     # Display chat messages from history on app rerun
     for message in st.session_state.messages:
@@ -119,70 +190,120 @@ def main_ui_logic(config: UiConfig):
     #      I haven't trace the internal source code yet, but we may figure out some better solutions.
     if len(st.session_state.messages) >= 1:
         streamlit_feedback(feedback_type="thumbs",
-                                            on_submit=feedback_callback(st.session_state.messages[-2]["content"], st.session_state.messages[-1]["content"]),
+                                            on_submit=feedback_callback(st.session_state.messages[-2]["content"], st.session_state.messages[-1]["content"], config.feedback_database),
                                             optional_text_label="[可選] 提供您的回饋或建議",
                                             key=f"feedback_{int(len(st.session_state.messages)) // 2}")
 
     # React to user input
     if user_input := st.chat_input("How can I help you today?"):
 
-        # TODO: User model selection.
-        llm_model_conf = config.llm_models[0]
-        embedding_conf = config.embedding_model
-
-        llm_param = LlmGenerationParameters.new_generation_parameter(
-            top_k=model_topk,
-            top_p=model_topp,
-            temperature=model_temperature,
-            repetition_penalty=model_repetition_penalty,
-        )
-
-        rag_param = RagParameters.new_rag_parameter(
-            chunk_size=rag_chunk_size,
-            chunk_overlap=rag_chunk_overlap,
-            top_k=rag_topk,
-        )
-
-        # Display user message in chat message container
-        st.chat_message("user").markdown(user_input)
-
-        # Add user message to chat history
-        st.session_state.messages.append({"role": "user", "content": user_input})
-
-        # Display assistant response in chat message container
-        with st.chat_message("assistant"):
-            message_placeholder = st.empty()
-            full_response = ""
-
-        ## RAG     
-        rag_docs = []
-        if st.session_state["documents"]:   # Document list is not null, invoke RAG.
-            topk_doc_score = topk_documents(user_input, embedding_conf, rag_param, st.session_state["documents"])
-            rag_docs = [x for x, _ in topk_doc_score]
-            rag_reference = ""
-            for d, score in topk_doc_score:
-                rag_reference += "```\n"
-                rag_reference += d.page_content
-                rag_reference += "\n"
-                rag_reference += "```\n"
-                st.session_state.rag_reference = rag_reference
-        else:
+        # Stage timings of this request, exported as metrics and to the trace log.
+        with metrics.trace(uuid.uuid4().hex, session_id=st.session_state.session_id):
+            llm_replicas = model_groups[model_name]
+            llm_model_conf = llm_replicas[0]  # Limits and tokenizer of the model.
+            embedding_conf = config.embedding_model
+
+            llm_param = LlmGenerationParameters.new_generation_parameter(
+                top_k=model_topk,
+                top_p=model_topp,
+                temperature=model_temperature,
+                repetition_penalty=model_repetition_penalty,
+            )
+
+            # Display user message in chat message container
+            st.chat_message("user").markdown(user_input)
+
+            # Add user message to chat history
+            st.session_state.messages.append({"role": "user", "content": user_input})
+
+            # Display assistant response in chat message container
+            with st.chat_message("assistant"):
+                message_placeholder = st.empty()
+
+            shared_corpus, snapshot = None, None
+            if config.corpus is not None:
+                from shared_corpus import current_snapshot
+                snapshot = current_snapshot(config.corpus.index_folder)
+                if snapshot is not None:
+                    shared_corpus = get_shared_corpus(config.corpus.index_folder, snapshot, embedding_conf)
+
+            ## Response cache, answer repeated questions over the same documents without generation.
+            response_cache = get_response_cache(config.response_cache, str(document_folder / RESPONSE_CACHE_INVALIDATION_FILE)) if config.response_cache.enabled else None
+            cached_response, query_vector = None, None
+            if response_cache is not None:
+                from response_cache import document_set_hash
+                document_set = document_set_hash(st.session_state["document_digests"], snapshot)
+                # Similar questions are looked up by query embedding, before retrieval.
+                if config.response_cache.semantic_threshold is not None:
+                    query_vector = get_embeddings(embedding_conf).embed_query(user_input)
+                    cached_response = response_cache.get_similar(query_vector, llm_model_conf, llm_param, document_set)
+
+            ## RAG     
+            rag_docs = []
+            if cached_response is None and (st.session_state["documents"] or shared_corpus is not None):   # Document list is not null, invoke RAG.
+                from document_rag_processor import topk_documents, RagParameters
+                rag_param = RagParameters.new_rag_parameter(
+                    chunk_size=rag_chunk_size,
+                    chunk_overlap=rag_chunk_overlap,
+                    top_k=rag_topk,
+                    hybrid=rag_hybrid,
+                )
+                topk_doc_score = topk_documents(user_input, embedding_conf, rag_param, st.session_state["documents"], vector_store=get_vector_store(config), shared_corpus=shared_corpus,
+                                                document_digests=st.session_state["document_digests"])
+                rag_docs = [x for x, _ in topk_doc_score]
+
+            # Prompt crafting, within the input limit of model and leaving room for generated tokens.
             st.session_state.rag_reference = ""
-
-        # Prompt crafting.
-        prompt = craft_prompt(user_input, rag_docs)
-
-        # Simulating bot typing.
-        for response in llm_stream_result(prompt, llm_model_conf, llm_param):
-            cursor = "❖"
-            full_response += (response or "")
-            message_placeholder.markdown(full_response + cursor)
-
-        # While complete, display full bot response.
-        message_placeholder.markdown(full_response)
-
-        # Add assistant response to chat history
-        st.session_state.messages.append({"role": "assistant", "content": full_response})
+            if cached_response is None:
+                token_budget = prompt_token_budget(llm_model_conf, llm_param.max_new_tokens)
+                with metrics.span("craft_prompt") as span_attributes:
+                    crafted_prompt = craft_prompt(user_input, rag_docs, token_budget=token_budget, tokenizer=llm_model_conf.tokenizer)
+                    span_attributes.update(crafted_prompt.usage._asdict())  # Token usage goes to the trace log.
+                prompt = crafted_prompt.text
+
+                # Reference only the chunks packed into the prompt, not those left out by the budget.
+                rag_reference = ""
+                for d in crafted_prompt.rag_documents:
+                    rag_reference += "```\n"
+                    rag_reference += d.page_content
+                    rag_reference += "\n"
+                    rag_reference += "```\n"
+                st.session_state.rag_reference = rag_reference
+                if crafted_prompt.usage.total > token_budget:
+                    st.warning("輸入內容過長，可能超出模型長度限制。")
+
+                # Same prompt over the same documents.
+                if response_cache is not None:
+                    cache_key = response_cache.make_key(prompt, llm_model_conf, llm_param, document_set)
+                    cached_response = response_cache.get(cache_key)
+
+            # Show queue position while waiting for an available LLM slot.
+            def show_queue_status(position, estimated_wait):
+                status = f"⏳ 排隊中，前方還有 {position} 個請求"
+                if estimated_wait is not None:
+                    status += f"，預估等待 {estimated_wait:.0f} 秒"
+                message_placeholder.markdown(status)
+
+            metrics.CHAT_REQUESTS.inc(outcome="cached" if cached_response is not None else "generated")
+            if cached_response is not None:
+                from response_cache import replay_stream
+                token_stream = replay_stream(cached_response)
+            else:
+                token_stream = llm_stream_result(prompt, llm_replicas, llm_param, session_id=st.session_state.session_id, on_wait=show_queue_status)
+
+            # Simulating bot typing, rendered at a bounded frame rate.
+            renderer = StreamRenderer(message_placeholder, config.streaming)
+            for response in token_stream:
+                renderer.write(response)
+
+            # While complete, display full bot response.
+            full_response = renderer.finish()
+
+            if response_cache is not None and cached_response is None and full_response:
+                response_cache.put(cache_key, full_response, llm_model_conf, llm_param, document_set, query_vector)
+
+            # Add assistant response to chat history
+            st.session_state.messages.append({"role": "assistant", "content": full_response})
         st.rerun()
     
     if st.session_state.rag_reference:
@@ -195,7 +316,6 @@ if __name__ == "__main__":
     st.set_page_config(page_title="LMPoC 對話介面")
 
     # Load config.
-    with open("config.yaml", "r", encoding="utf-8") as f:
-        config = UiConfig.load_config_from_file(f)
-    
+    config = load_config("config.yaml", os.path.getmtime("config.yaml"))
+
     main_ui_logic(config=config)
\ No newline at end of file
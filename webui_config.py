@@ -1,10 +1,19 @@
-from typing import NamedTuple, List, IO, Union
+from typing import NamedTuple, List, IO, Union, Optional
+from pathlib import Path
 import yaml
 
+# Default embedding request limits, match them to TEI '--max-client-batch-size' and '--max-concurrent-requests'.
+DEFAULT_EMBEDDING_BATCH_SIZE = 32
+DEFAULT_EMBEDDING_CONCURRENCY = 4
+DEFAULT_EMBEDDING_TIMEOUT = 60.0  # Seconds.
+
 # Embedding model configuration.
 class EmbeddingModelConfig(NamedTuple):
     provider: str  # Provider of the embedding model i.e. huggingface
     endpoint: str  # Endpoint for the embedding model.
+    batch_size: int = DEFAULT_EMBEDDING_BATCH_SIZE    # Maximum number of texts per embedding request.
+    concurrency: int = DEFAULT_EMBEDDING_CONCURRENCY  # Maximum number of embedding requests in flight.
+    timeout: float = DEFAULT_EMBEDDING_TIMEOUT        # Seconds to wait for an embedding response.
 
     # Create a new embedding model configuration from a dictionary.
     @classmethod
@@ -13,16 +22,30 @@ class EmbeddingModelConfig(NamedTuple):
             # Extract provider and endpoint from the config dictionary.
             model_provider = config["provider"].lower()  # Ensure lowercase provider name.
             model_endpoint = config["endpoint"]
+            batch_size = int(config.get("batch_size", DEFAULT_EMBEDDING_BATCH_SIZE))
+            concurrency = int(config.get("concurrency", DEFAULT_EMBEDDING_CONCURRENCY))
+            timeout = float(config.get("timeout", DEFAULT_EMBEDDING_TIMEOUT))
         except ValueError as ex:
             raise ValueError("Error while parsing config") from ex
         
         # Return a new instance of EmbeddingModelConfig.
-        return cls(provider=model_provider, endpoint=model_endpoint)
+        return cls(provider=model_provider, endpoint=model_endpoint, batch_size=batch_size, concurrency=concurrency, timeout=timeout)
+
+# Default LLM limits, same as TGI '--max-concurrent-requests', '--max-input-length' and '--max-total-tokens'.
+DEFAULT_LLM_MAX_CONCURRENT_REQUESTS = 4
+DEFAULT_LLM_MAX_INPUT_LENGTH = 2048
+DEFAULT_LLM_MAX_TOTAL_TOKENS = 4096
+DEFAULT_LLM_TOKENIZER = "cl100k_base"  # tiktoken encoding used to count prompt tokens locally.
 
 # LLM model configuration.
 class LlmModelConfig(NamedTuple):
     provider: str  # Provider of the LLM model. i.e. huggingface tgi
     endpoint: str  # Endpoint for the LLM model.
+    max_concurrent_requests: int = DEFAULT_LLM_MAX_CONCURRENT_REQUESTS  # Requests admitted to the endpoint at once.
+    max_input_length: int = DEFAULT_LLM_MAX_INPUT_LENGTH  # Maximum prompt length in tokens.
+    max_total_tokens: int = DEFAULT_LLM_MAX_TOTAL_TOKENS  # Maximum prompt plus generated length in tokens.
+    tokenizer: str = DEFAULT_LLM_TOKENIZER
+    model: str = ""  # Name of the served model, endpoints of the same name are replicas sharing the traffic.
     
     # Create a new LLM model configuration from a dictionary.
     @classmethod
@@ -31,12 +54,130 @@ class LlmModelConfig(NamedTuple):
             # Extract provider and endpoint from the config dictionary.
             model_provider = config["provider"].lower()  # Ensure lowercase provider name.
             model_endpoint = config["endpoint"]
+            max_concurrent_requests = int(config.get("max_concurrent_requests", DEFAULT_LLM_MAX_CONCURRENT_REQUESTS))
+            max_input_length = int(config.get("max_input_length", DEFAULT_LLM_MAX_INPUT_LENGTH))
+            max_total_tokens = int(config.get("max_total_tokens", DEFAULT_LLM_MAX_TOTAL_TOKENS))
+            tokenizer = config.get("tokenizer", DEFAULT_LLM_TOKENIZER)
+            model = str(config.get("model", ""))
         except ValueError as ex:
             raise ValueError("Error while parsing config") from ex
         
         # Return a new instance of LlmModelConfig.
-        return cls(provider=model_provider, endpoint=model_endpoint)
+        return cls(provider=model_provider, endpoint=model_endpoint, max_concurrent_requests=max_concurrent_requests,
+                   max_input_length=max_input_length, max_total_tokens=max_total_tokens, tokenizer=tokenizer, model=model)
     
+# Vector index configuration.
+class VectorIndexConfig(NamedTuple):
+    index_type: str = "auto"      # One of 'auto', 'flat', 'ivf_flat', 'ivf_pq' and 'hnsw'.
+    auto_threshold: int = 50000   # In 'auto' mode, chunks count to switch from flat to approximate index.
+    auto_ann_type: str = "hnsw"   # Approximate index type used in 'auto' mode.
+    nlist: int = 0                # IVF: number of inverted lists, 0 to derive from number of vectors.
+    nprobe: int = 16              # IVF: lists visited per query, trades recall for speed.
+    pq_m: int = 16                # IVF-PQ: number of sub-quantizers.
+    pq_bits: int = 8              # IVF-PQ: bits per sub-quantizer code.
+    hnsw_m: int = 32              # HNSW: neighbours per node.
+    ef_construction: int = 80     # HNSW: candidate list size while building.
+    ef_search: int = 64           # HNSW: candidate list size while searching, trades recall for speed.
+    vector_dtype: str = "float32" # 'float32' or 'float16', precision of vectors stored in index and on disk.
+
+    # Create a new vector index configuration from a dictionary.
+    @classmethod
+    def new_vector_index_config(cls, config: dict):
+        try:
+            fields = {k: type(cls._field_defaults[k])(v) for k, v in config.items() if k in cls._field_defaults}
+        except ValueError as ex:
+            raise ValueError("Error while parsing config") from ex
+
+        index_config = cls(**fields)
+        if index_config.index_type not in ["auto", "flat", "ivf_flat", "ivf_pq", "hnsw"]:
+            raise ValueError(f"Unsupported index type: {index_config.index_type}")
+        if index_config.vector_dtype not in ["float32", "float16"]:
+            raise ValueError(f"Unsupported vector dtype: {index_config.vector_dtype}")
+        return index_config
+
+# Shared corpus configuration.
+class CorpusConfig(NamedTuple):
+    corpus_folder: str        # Folder watched by ingestion service, documents in it are visible to all sessions.
+    index_folder: str         # Folder of the shared index snapshots.
+    chunk_size: int = 100
+    chunk_overlap: int = 25
+    scan_interval: int = 60   # Seconds between corpus scans.
+
+    # Create a new shared corpus configuration from a dictionary.
+    @classmethod
+    def new_corpus_config(cls, config: dict):
+        try:
+            corpus_folder = config["corpus_folder"]
+            index_folder = config.get("index_folder", str(Path(corpus_folder) / ".corpus-index"))
+            chunk_size = int(config.get("chunk_size", 100))
+            chunk_overlap = int(config.get("chunk_overlap", 25))
+            scan_interval = int(config.get("scan_interval", 60))
+        except (KeyError, ValueError) as ex:
+            raise ValueError("Error while parsing config") from ex
+
+        return cls(corpus_folder=corpus_folder, index_folder=index_folder, chunk_size=chunk_size,
+                   chunk_overlap=chunk_overlap, scan_interval=scan_interval)
+
+# Response cache configuration.
+class ResponseCacheConfig(NamedTuple):
+    enabled: bool = True
+    max_entries: int = 1024  # Entries kept, least recently used are evicted.
+    ttl: int = 86400         # Seconds before an entry expires.
+    semantic_threshold: Optional[float] = None  # Cosine similarity for semantic matching, None to match prompts exactly.
+
+    # Create a new response cache configuration from a dictionary.
+    @classmethod
+    def new_response_cache_config(cls, config: dict):
+        try:
+            enabled = bool(config.get("enabled", True))
+            max_entries = int(config.get("max_entries", 1024))
+            ttl = int(config.get("ttl", 86400))
+            semantic_threshold = config.get("semantic_threshold", None)
+            if semantic_threshold is not None:
+                semantic_threshold = float(semantic_threshold)
+        except ValueError as ex:
+            raise ValueError("Error while parsing config") from ex
+
+        return cls(enabled=enabled, max_entries=max_entries, ttl=ttl, semantic_threshold=semantic_threshold)
+
+# Metrics endpoint and request trace log configuration.
+class MetricsConfig(NamedTuple):
+    port: Optional[int] = None       # Port of the Prometheus '/metrics' endpoint, None to disable it.
+    address: str = "127.0.0.1"
+    trace_log: Optional[str] = None  # File receiving one JSON line per chat request, None to disable it.
+
+    # Create a new metrics configuration from a dictionary.
+    @classmethod
+    def new_metrics_config(cls, config: dict):
+        try:
+            port = config.get("port", None)
+            if port is not None:
+                port = int(port)
+            address = str(config.get("address", "127.0.0.1"))
+            trace_log = config.get("trace_log", None)
+        except ValueError as ex:
+            raise ValueError("Error while parsing config") from ex
+
+        return cls(port=port, address=address, trace_log=trace_log)
+
+# Rendering of streamed answers in the chat UI.
+class StreamingConfig(NamedTuple):
+    fps: float = 10.0     # Renders per second at most while tokens stream in.
+    max_tokens: int = 50  # Render once this many tokens are pending, even within a frame.
+
+    # Create a new streaming configuration from a dictionary.
+    @classmethod
+    def new_streaming_config(cls, config: dict):
+        try:
+            fps = float(config.get("fps", 10.0))
+            max_tokens = int(config.get("max_tokens", 50))
+        except ValueError as ex:
+            raise ValueError("Error while parsing config") from ex
+
+        if fps <= 0 or max_tokens < 1:
+            raise ValueError("Streaming fps must be positive and max_tokens at least 1.")
+        return cls(fps=fps, max_tokens=max_tokens)
+
 # UI configuration
 class UiConfig:
     def __init__(self, config: dict):
@@ -62,6 +203,34 @@ class UiConfig:
             self.llm_models.append(LlmModelConfig.new_llm_config(_llm))
 
         self.document_folder: str = config.get("document-folder", "doc")
+
+        # Size limit of the embedding index cache in document folder, in megabytes.
+        self.index_cache_size: int = int(config.get("index-cache-size", 1024))
+
+        # Processes of the document parsing pool shared by sessions, number of CPUs if not set.
+        parse_workers = config.get("parse-workers", None)
+        self.parse_workers: Optional[int] = int(parse_workers) if parse_workers is not None else None
+
+        # Database of user feedbacks, SQLAlchemy URL.
+        self.feedback_database: str = config.get("feedback-database", "sqlite:///feedback.db")
+
+        # Shared organization-wide corpus, disabled if not configured.
+        self.corpus: Optional[CorpusConfig] = None
+        _corpus_config = config.get("corpus", None)
+        if _corpus_config:
+            self.corpus = CorpusConfig.new_corpus_config(_corpus_config)
+
+        # Vector index type and its parameters.
+        self.vector_index = VectorIndexConfig.new_vector_index_config(config.get("vector-index", None) or {})
+
+        # Response cache, enabled with default settings if not configured.
+        self.response_cache = ResponseCacheConfig.new_response_cache_config(config.get("response-cache", None) or {})
+
+        # Stage latency metrics are always recorded, the endpoint and trace log are optional.
+        self.metrics = MetricsConfig.new_metrics_config(config.get("metrics", None) or {})
+
+        # Throttled rendering of streamed answers, enabled with default settings if not configured.
+        self.streaming = StreamingConfig.new_streaming_config(config.get("streaming", None) or {})
         
     # Method to load UI configuration from a file
     @classmethod